@@ -0,0 +1,111 @@
+"""
+紧凑输出格式基准测试
+对比完整格式与紧凑格式的补全token数，并按解码速率估算生成延迟。
+延迟是推算值（token差÷解码速率），没有实际调用模型计时；token数也是按字符估算的，
+样本取自输出目录中已有的完整大纲JSON，样本很少时结果只反映这几份大纲
+
+用法：python benchmarks/bench_compact_schema.py [--decode-rate 50]
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from my_agent.utils.compact_schema import (
+    compact_plan, expand_objectives, expand_knowledge, expand_activities, expand_assessment
+)
+from my_agent.utils.hour_allocator import assign_activity_durations
+
+MIN_SAMPLES = 5  # 样本少于此数时提示结果不具代表性
+
+SECTIONS = [
+    ("objectives", expand_objectives),
+    ("knowledge_points", expand_knowledge),
+    ("activities", expand_activities),
+    ("assessment", expand_assessment),
+]
+
+
+def estimate_tokens(text: str) -> float:
+    """粗略估算token数：中文约0.7 token/字，其他字符约0.3 token/字"""
+    cjk = sum(1 for ch in text if "一" <= ch <= "鿿")
+    return cjk * 0.7 + (len(text) - cjk) * 0.3
+
+
+def normalize(value):
+    """将叶子值统一为字符串，便于比较往返结果"""
+    if isinstance(value, dict):
+        return {k: normalize(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [normalize(v) for v in value]
+    return str(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="紧凑输出格式基准测试")
+    parser.add_argument("--decode-rate", type=float, default=50.0, help="推算延迟所用的模型解码速率（token/秒）")
+    parser.add_argument("--output-dir", default=os.path.join("my_agent", "output"), help="历史输出JSON目录")
+    args = parser.parse_args()
+
+    files = sorted(glob.glob(os.path.join(args.output_dir, "**", "*.json"), recursive=True))
+    samples = []
+    for path in files:
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except json.JSONDecodeError:
+            continue
+        if all(isinstance(data.get(name), dict) and data.get(name) for name, _ in SECTIONS):
+            samples.append(data)
+    if not samples:
+        print(f"未在{args.output_dir}中找到完整的教学大纲JSON")
+        return
+
+    print(f"样本数：{len(samples)}，解码速率：{args.decode_rate} token/秒（假设值）")
+    if len(samples) < MIN_SAMPLES:
+        print(f"警告：只有{len(samples)}份完整样本，结果只反映这些大纲，不代表一般情况")
+    print("注：token数按字符估算；节省延迟 = token差 ÷ 解码速率，为推算值，未实际调用模型计时\n")
+    print(f"{'部分':<18}{'完整token':>12}{'紧凑token':>12}{'减少':>10}{'推算节省(秒)':>14}{'本地处理(ms)':>14}")
+
+    total_full = total_compact = 0.0
+    for name, expand in SECTIONS:
+        full_tokens = compact_tokens = expand_seconds = 0.0
+        for data in samples:
+            wire = compact_plan(data)[name]
+            full_tokens += estimate_tokens(json.dumps(data[name], ensure_ascii=False))
+            compact_tokens += estimate_tokens(json.dumps(wire, ensure_ascii=False))
+
+            original = data[name]
+            start = time.perf_counter()
+            if name == "activities":
+                # 时长和课时分配由本地求解，不计入模型输出
+                total_minutes = sum(int(item["activity"]["duration"]) for item in original["activities"])
+                expanded = expand(assign_activity_durations(wire, total_minutes))
+                expanded = {"activities": expanded["activities"]}
+                original = {"activities": original["activities"]}
+                for item in expanded["activities"]:
+                    item["activity"].pop("活动类型", None)
+            else:
+                expanded = expand(wire)
+            expand_seconds += time.perf_counter() - start
+            if normalize(expanded) != normalize(original):
+                raise AssertionError(f"{name}展开结果与原始结构不一致")
+
+        total_full += full_tokens
+        total_compact += compact_tokens
+        saved = (full_tokens - compact_tokens) / args.decode_rate / len(samples)
+        print(f"{name:<18}{full_tokens / len(samples):>12.0f}{compact_tokens / len(samples):>12.0f}"
+              f"{1 - compact_tokens / full_tokens:>10.1%}{saved:>14.1f}{expand_seconds * 1000 / len(samples):>14.3f}")
+
+    print(f"\n合计：完整{total_full / len(samples):.0f} token，紧凑{total_compact / len(samples):.0f} token，"
+          f"减少{1 - total_compact / total_full:.1%}，"
+          f"按{args.decode_rate:g} token/秒推算单份大纲约节省{(total_full - total_compact) / args.decode_rate / len(samples):.1f}秒"
+          f"生成时间（估算，未实测）")
+
+
+if __name__ == "__main__":
+    main()
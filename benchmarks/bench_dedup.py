@@ -0,0 +1,112 @@
+"""
+知识点近似去重基准测试
+在合成的近似重复知识点上测量MinHash/LSH去重的耗时和准确率，并与两两比较的精确Jaccard做对照
+
+用法：python benchmarks/bench_dedup.py [--topics 1000] [--variants 4] [--threshold 0.6]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from my_agent.utils.dedup import find_duplicate_clusters, _shingles
+
+SUBJECTS = ["函数", "数列", "向量", "概率", "导数", "集合", "不等式", "三角形", "方程", "统计",
+            "诗歌", "意象", "修辞", "议论文", "散文", "小说", "人物形象", "情节", "主题", "语言"]
+ASPECTS = ["概念", "性质", "图像", "应用", "分类", "运算", "证明方法", "表示方法", "基本特征", "历史背景",
+           "结构", "作用", "判断方法", "常见错误", "典型例题"]
+CONTEXTS = ["在实际问题中", "结合生活实例", "通过图表", "借助已学知识", "在课堂讨论中", "在阅读材料中"]
+ACTIONS = ["理解", "掌握", "分析", "比较", "归纳", "运用"]
+DETAILS = ["基本定义和判定条件", "主要特点及其联系", "常见类型和解题思路", "形成过程和核心思想", "适用范围与注意事项"]
+SYNONYMS = [("的", ""), ("和", "与"), ("及其", "和它们的"), ("主要", "重要"), ("常见", "典型")]
+
+
+def make_topic(rng: random.Random) -> dict:
+    """生成一个基础知识点（两个主题词加一个方面，名称基本不重复）"""
+    first, second = rng.sample(SUBJECTS, 2)
+    subject, aspect = f"{first}与{second}", rng.choice(ASPECTS)
+    return {
+        "name": f"{subject}的{aspect}",
+        "content": f"{rng.choice(CONTEXTS)}{rng.choice(ACTIONS)}{subject}{aspect}的{rng.choice(DETAILS)}",
+        "prerequisites": [], "objectives": []
+    }
+
+
+def make_variant(rng: random.Random, point: dict) -> dict:
+    """改写措辞，生成近似重复的知识点"""
+    name, content = point["name"], point["content"]
+    for old, new in rng.sample(SYNONYMS, 2):
+        if rng.random() < 0.7:
+            content = content.replace(old, new, 1)
+    if rng.random() < 0.5:
+        name = name.replace("的", "", 1)
+    return {"name": name, "content": content, "prerequisites": [], "objectives": []}
+
+
+def jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="知识点近似去重基准测试")
+    parser.add_argument("--topics", type=int, default=1000, help="基础知识点数")
+    parser.add_argument("--variants", type=int, default=4, help="每个知识点的平均改写数")
+    parser.add_argument("--threshold", type=float, default=0.6, help="相似度阈值")
+    parser.add_argument("--exact-limit", type=int, default=1500, help="精确两两比较的最大样本数")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    seen, topics = set(), []
+    while len(topics) < min(args.topics, len(SUBJECTS) * (len(SUBJECTS) - 1) * len(ASPECTS)):
+        topic = make_topic(rng)
+        if topic["name"] not in seen:
+            seen.add(topic["name"])
+            topics.append(topic)
+    points, labels = [], []
+    for label, topic in enumerate(topics):
+        points.append(topic)
+        labels.append(label)
+        for _ in range(rng.randint(0, 2 * args.variants)):
+            points.append(make_variant(rng, topic))
+            labels.append(label)
+    order = list(range(len(points)))
+    rng.shuffle(order)
+    points = [points[i] for i in order]
+    labels = [labels[i] for i in order]
+
+    start = time.perf_counter()
+    clusters = find_duplicate_clusters(points, args.threshold)
+    elapsed = time.perf_counter() - start
+
+    # 以生成时的来源作为真值，统计簇内点对的精确率和召回率
+    predicted = {i: c for c, cluster in enumerate(clusters) for i in cluster}
+    true_pairs = predicted_pairs = correct_pairs = 0
+    for i in range(len(points)):
+        for j in range(i + 1, len(points)):
+            same_truth = labels[i] == labels[j]
+            same_pred = predicted[i] == predicted[j]
+            true_pairs += same_truth
+            predicted_pairs += same_pred
+            correct_pairs += same_truth and same_pred
+
+    print(f"知识点数：{len(points)}（来源{len(topics)}个），阈值：{args.threshold}")
+    print(f"MinHash/LSH：{elapsed:.2f}秒，{len(points) / elapsed:.0f}个/秒，得到{len(clusters)}个簇")
+    print(f"点对精确率：{correct_pairs / max(1, predicted_pairs):.1%}，召回率：{correct_pairs / max(1, true_pairs):.1%}")
+
+    sample = points[:args.exact_limit]
+    shingles = [_shingles(p) for p in sample]
+    start = time.perf_counter()
+    for i in range(len(sample)):
+        for j in range(i + 1, len(sample)):
+            jaccard(shingles[i], shingles[j])
+    exact = time.perf_counter() - start
+    pairs = len(sample) * (len(sample) - 1) / 2
+    full_pairs = len(points) * (len(points) - 1) / 2
+    print(f"精确两两比较（{len(sample)}个）：{exact:.2f}秒，按点对数外推全量约{exact * full_pairs / pairs:.1f}秒")
+
+
+if __name__ == "__main__":
+    main()
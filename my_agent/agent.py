@@ -1,16 +1,31 @@
-<<<<<<< HEAD
-from typing import Dict, Any, List, Annotated
+import copy
+import math
+import os
+from typing import Callable, Dict, Any, List, Annotated, Optional, Union
 from typing_extensions import TypedDict
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
 
 from my_agent.agents.objective_agent import generate_objectives
 from my_agent.agents.knowledge_agent import analyze_knowledge
-from my_agent.agents.activity_agent import design_activities
-from my_agent.agents.assessment_agent import create_assessment
+from my_agent.agents.activity_agent import design_activities, ACTIVITY_BLOCK_HOURS
+from my_agent.agents.assessment_agent import create_assessment, OBJECTIVE_DIMENSIONS
+from my_agent.agents.plan_agent import generate_full_plan
+from my_agent.config import MAX_CONCURRENT_LLM_CALLS, RUN_TIMEOUT
 from my_agent.utils.pdf_utils import extract_text_from_pdf, is_valid_pdf
 from my_agent.utils.file_utils import save_lesson_plan_to_md
 from my_agent.utils.exceptions import PDFExtractionError, LLMGenerationError
+from my_agent.utils.token_utils import token_usage_log
+from my_agent.utils.llm_metrics import llm_metrics
+from my_agent.utils.summarizer import summarize_textbook
+from my_agent.utils.deadline import (
+    CancelToken, ContextThreadPoolExecutor, run_scope, check_cancelled, current_token, run_cancellable
+)
+from my_agent.utils.prepare_cache import prepared_cache, file_hash
+from my_agent.utils.singleflight import llm_singleflight
+from my_agent.utils.key_pool import key_pool_stats
+from my_agent.utils.concurrency import llm_limiter
+from my_agent.utils.circuit_breaker import breaker_stats
 
 class TeachingState(TypedDict):
     """教学状态"""
@@ -21,12 +36,42 @@ class TeachingState(TypedDict):
     activities: Dict[str, Any]
     assessment: Dict[str, Any]
     total_hours: int
+    hour_variants: List[int]  # 需要生成的课时版本，共用教材、目标、知识点和评估
+    variant_activities: Dict[int, Dict[str, Any]]  # 各课时版本的教学活动
+    error: Optional[str]  # 最近一次节点失败的错误信息
+    failed_stage: Optional[str]  # 失败的节点名称
+    llm_calls_avoided: int  # 因提前终止而省下的LLM调用次数
+    prepared: bool  # 教材、目标和知识点是否来自预计算
+
+# 主流程节点顺序
+PIPELINE = [
+    "process_textbook",
+    "generate_objectives",
+    "analyze_knowledge",
+    "design_activities",
+    "create_assessment",
+    "save_output",
+]
 
 class TeachingAgent:
     """教学代理"""
     
-    def __init__(self):
-        """初始化教学代理"""
+    def __init__(self, fast_mode: bool = False, summary_ratio: Optional[float] = None, save_metrics: bool = True):
+        """
+        初始化教学代理
+        
+        Args:
+            fast_mode: 是否启用快速模式（一次LLM调用生成完整大纲，失败时回退到分阶段流程）
+            summary_ratio: 教材预摘要的保留比例，None表示不做预摘要
+            save_metrics: 每次运行结束后是否输出并保存模型调用统计（常驻服务中由/stats提供，各工作线程不写文件）
+        """
+        self.fast_mode = fast_mode
+        self.summary_ratio = summary_ratio
+        self.save_metrics = save_metrics
+        
+        # 累计省下的LLM调用次数（跨多次运行）
+        self.llm_calls_avoided = 0
+        
         # 创建状态图
         self.graph_builder = StateGraph(TeachingState)
         
@@ -37,46 +82,196 @@ class TeachingAgent:
         self.graph_builder.add_node("design_activities", self.design_activities)
         self.graph_builder.add_node("create_assessment", self.create_assessment)
         self.graph_builder.add_node("save_output", self.save_output)
+        self.graph_builder.add_node("generate_plan", self.generate_plan)
+        self.graph_builder.add_node("handle_error", self.handle_error)
         
-        # 定义流程
-        self.graph_builder.add_edge(START, "process_textbook")
-        self.graph_builder.add_edge("process_textbook", "generate_objectives")
-        self.graph_builder.add_edge("generate_objectives", "analyze_knowledge")
-        self.graph_builder.add_edge("analyze_knowledge", "design_activities")
-        self.graph_builder.add_edge("design_activities", "create_assessment")
-        self.graph_builder.add_edge("create_assessment", "save_output")
-        self.graph_builder.add_edge("save_output", END)
+        # 定义流程：任一节点失败时直接进入错误终止节点，不再调用下游LLM
+        self.graph_builder.add_edge(START, PIPELINE[0])
+        self.graph_builder.add_conditional_edges(
+            PIPELINE[0],
+            self._route_after_textbook,
+            {"generate_plan": "generate_plan", PIPELINE[1]: PIPELINE[1], PIPELINE[3]: PIPELINE[3],
+             "handle_error": "handle_error"}
+        )
+        for current, following in zip(PIPELINE[1:], PIPELINE[2:]):
+            self.graph_builder.add_conditional_edges(
+                current,
+                self._route_on_error(following),
+                {following: following, "handle_error": "handle_error"}
+            )
+        # 快速模式成功后直接保存，失败则回退到分阶段流程
+        self.graph_builder.add_conditional_edges(
+            "generate_plan",
+            self._route_after_plan,
+            {"save_output": "save_output", PIPELINE[1]: PIPELINE[1]}
+        )
+        self.graph_builder.add_edge(PIPELINE[-1], END)
+        self.graph_builder.add_edge("handle_error", END)
         
         # 编译图
         self.graph = self.graph_builder.compile()
         
+    @staticmethod
+    def _route_on_error(following: str):
+        """生成条件边：上游失败则转到错误节点，否则进入下一节点"""
+        def route(state: TeachingState) -> str:
+            return "handle_error" if state.get("error") else following
+        return route
+        
+    def _route_after_textbook(self, state: TeachingState) -> str:
+        """教材处理后的路由：失败终止，已有预计算结果时直接设计活动，快速模式进入整体生成，否则进入分阶段流程"""
+        if state.get("error"):
+            return "handle_error"
+        if state.get("prepared"):
+            return PIPELINE[3]
+        # 多课时版本共用上游结果，快速模式只用于单一版本
+        if self.fast_mode and len(self._variants(state)) == 1:
+            return "generate_plan"
+        return PIPELINE[1]
+        
+    @staticmethod
+    def _route_after_plan(state: TeachingState) -> str:
+        """快速模式后的路由：四部分都已生成则保存，否则回退到分阶段流程"""
+        if all(state.get(key) for key in ("objectives", "knowledge_points", "activities", "assessment")):
+            return "save_output"
+        return PIPELINE[1]
+        
+    @staticmethod
+    def _estimate_llm_calls(stage: str, state: TeachingState) -> int:
+        """估算某个节点需要的LLM调用次数"""
+        if stage in ("generate_objectives", "analyze_knowledge"):
+            return 1
+        if stage == "design_activities":
+            return sum(max(1, math.ceil(hours / ACTIVITY_BLOCK_HOURS))
+                       for hours in TeachingAgent._variants(state))
+        if stage == "create_assessment":
+            return len(OBJECTIVE_DIMENSIONS)
+        return 0
+        
+    @staticmethod
+    def _variants(state: TeachingState) -> List[int]:
+        """本次运行需要生成的课时版本"""
+        return state.get("hour_variants") or [state.get("total_hours", 0)]
+        
+    def _fail(self, stage: str, message: str) -> TeachingState:
+        """记录节点失败"""
+        return {"messages": [message], "error": message, "failed_stage": stage}
+        
+    def handle_error(self, state: TeachingState) -> TeachingState:
+        """错误终止节点：统计因提前终止省下的LLM调用"""
+        failed_stage = state.get("failed_stage")
+        skipped = PIPELINE[PIPELINE.index(failed_stage) + 1:] if failed_stage in PIPELINE else []
+        avoided = sum(self._estimate_llm_calls(stage, state) for stage in skipped)
+        self.llm_calls_avoided += avoided
+        
+        print("\n=== 流程终止 ===")
+        print(f"失败节点: {failed_stage}")
+        token = current_token()
+        if token is not None and token.cancelled:
+            print(f"终止原因: {token.reason}")
+        print(f"跳过节点: {', '.join(skipped) or '无'}")
+        print(f"省下LLM调用: {avoided}次（累计{self.llm_calls_avoided}次）")
+        return {
+            "messages": [f"流程已终止，跳过{len(skipped)}个节点，省下{avoided}次LLM调用"],
+            "llm_calls_avoided": avoided
+        }
+        
+    def _normalize_textbook(self, textbook_content: Dict[str, Any]) -> Dict[str, Any]:
+        """本地抽取式摘要，缩小所有下游提示词"""
+        if not self.summary_ratio:
+            return textbook_content
+        before = sum(len(str(c.get("content", ""))) for c in textbook_content.get("chapters", []))
+        textbook_content = summarize_textbook(textbook_content, self.summary_ratio)
+        after = sum(len(str(c.get("content", ""))) for c in textbook_content.get("chapters", []))
+        print(f"教材预摘要: {before}字 -> {after}字")
+        return textbook_content
+        
+    def _prepare_key(self, pdf_path: str) -> str:
+        """预计算的缓存键：文件哈希加上影响结果的选项"""
+        return f"{file_hash(pdf_path)}:{self.summary_ratio}"
+        
+    def _precompute(self, pdf_path: str) -> Dict[str, Any]:
+        """执行与课时无关的阶段：提取、摘要、教学目标和知识点"""
+        print(f"\n=== 预计算: {os.path.basename(pdf_path)} ===")
+        textbook_content = self._normalize_textbook(extract_text_from_pdf(pdf_path))
+        objectives = generate_objectives(textbook_content)
+        knowledge_points = analyze_knowledge(textbook_content, objectives)
+        print(f"预计算完成: {os.path.basename(pdf_path)}")
+        return {"textbook_content": textbook_content, "objectives": objectives, "knowledge_points": knowledge_points}
+        
+    def prepare(self, pdf_path: str) -> str:
+        """
+        教材上传后立即在后台预计算与课时无关的阶段
+        
+        结果按文件哈希缓存，之后对同一文件调用run时只需设计活动和评估；
+        超过PREPARE_TTL未被使用的预计算会被取消并清除。
+        
+        Args:
+            pdf_path: 教材PDF路径
+            
+        Returns:
+            str: 文件哈希
+            
+        Raises:
+            ValueError: PDF文件无效
+        """
+        if not is_valid_pdf(pdf_path):
+            raise ValueError(f"无效的PDF文件: {pdf_path}")
+        key = self._prepare_key(pdf_path)
+        if prepared_cache.submit(key, lambda: self._precompute(pdf_path)):
+            print(f"已开始预计算: {pdf_path}")
+        return key.split(":")[0]
+        
+    def _take_prepared(self, pdf_path: str) -> Optional[Dict[str, Any]]:
+        """取出预计算结果，进行中则等待；没有预计算或预计算失败时返回None"""
+        # 缓存为空时不必读取文件计算哈希
+        future = prepared_cache.get(self._prepare_key(pdf_path)) if len(prepared_cache) else None
+        if future is None:
+            return None
+        try:
+            if not future.done():
+                print("等待预计算完成...")
+            # 结果在多次运行间共享，复制后再交给各节点
+            return copy.deepcopy(run_cancellable(future.result))
+        except Exception as e:
+            # 本次运行已取消时直接抛出，否则回退到完整流程
+            check_cancelled()
+            print(f"警告：预计算失败，重新执行完整流程 - {str(e)}")
+            return None
+        
     def process_textbook(self, state: TeachingState) -> TeachingState:
         """处理教材内容"""
         try:
             print("\n=== 处理教材内容 ===")
+            check_cancelled()
             
-            # 验证总课时
-            total_hours = state["total_hours"]
-            if not isinstance(total_hours, int) or total_hours <= 0:
-                raise ValueError(f"总课时格式错误: {total_hours}")
-                
-            if total_hours % 4 != 0:
-                raise ValueError(f"总课时必须是4的倍数: {total_hours}")
+            # 验证各版本总课时
+            for total_hours in self._variants(state):
+                if not isinstance(total_hours, int) or total_hours <= 0:
+                    raise ValueError(f"总课时格式错误: {total_hours}")
+                    
+                if total_hours % 4 != 0:
+                    raise ValueError(f"总课时必须是4的倍数: {total_hours}")
                 
             # 提取教材内容
             textbook_content = state["textbook_content"]
             if not isinstance(textbook_content, dict):
                 raise ValueError(f"教材内容格式错误: {type(textbook_content)}")
                 
+            # 预计算时已做过摘要
+            if self.summary_ratio and not state.get("prepared"):
+                return {"messages": ["教材内容处理完成"], "textbook_content": self._normalize_textbook(textbook_content)}
+                
             return {"messages": ["教材内容处理完成"]}
             
         except Exception as e:
-            return {"messages": [f"错误：处理教材内容失败 - {str(e)}"]}
+            return self._fail("process_textbook", f"错误：处理教材内容失败 - {str(e)}")
             
     def generate_objectives(self, state: TeachingState) -> TeachingState:
         """生成教学目标"""
         try:
             print("\n=== 生成教学目标 ===")
+            check_cancelled()
             
             # 调用目标代理
             result = generate_objectives(state["textbook_content"])
@@ -86,12 +281,13 @@ class TeachingAgent:
             }
             
         except Exception as e:
-            return {"messages": [f"错误：生成教学目标失败 - {str(e)}"]}
+            return self._fail("generate_objectives", f"错误：生成教学目标失败 - {str(e)}")
             
     def analyze_knowledge(self, state: TeachingState) -> TeachingState:
         """分析知识点"""
         try:
             print("\n=== 分析知识点 ===")
+            check_cancelled()
             
             # 调用知识点代理
             result = analyze_knowledge(state["textbook_content"], state["objectives"])
@@ -101,27 +297,67 @@ class TeachingAgent:
             }
             
         except Exception as e:
-            return {"messages": [f"错误：分析知识点失败 - {str(e)}"]}
+            return self._fail("analyze_knowledge", f"错误：分析知识点失败 - {str(e)}")
+            
+    def generate_plan(self, state: TeachingState) -> TeachingState:
+        """快速模式：一次LLM调用生成完整大纲"""
+        try:
+            print("\n=== 快速模式生成大纲 ===")
+            check_cancelled()
+            
+            # 调用整体大纲代理
+            result = generate_full_plan(state["textbook_content"], state["total_hours"])
+            return {"messages": ["完整教学大纲生成完成"], **result}
+            
+        except Exception as e:
+            # 快速模式失败不终止流程，不设置error，由路由回退到分阶段流程
+            return {"messages": [f"快速模式失败，回退到分阶段流程 - {str(e)}"]}
             
     def design_activities(self, state: TeachingState) -> TeachingState:
         """设计教学活动"""
         try:
             print("\n=== 设计教学活动 ===")
+            check_cancelled()
             
-            # 调用活动代理
-            result = design_activities(state["knowledge_points"], state["total_hours"])
+            variants = self._variants(state)
+            if len(variants) == 1:
+                # 调用活动代理
+                result = design_activities(state["knowledge_points"], variants[0])
+                return {
+                    "messages": ["教学活动设计完成"],
+                    "activities": result,
+                    "variant_activities": {variants[0]: result}
+                }
+                
+            # 多个课时版本并发设计，总并发调用数在各版本间均分
+            print(f"课时版本: {', '.join(str(hours) for hours in variants)}")
+            per_variant = max(1, MAX_CONCURRENT_LLM_CALLS // len(variants))
+            with ContextThreadPoolExecutor(max_workers=len(variants)) as executor:
+                futures = {
+                    hours: executor.submit(design_activities, state["knowledge_points"], hours, per_variant)
+                    for hours in variants
+                }
+                variant_activities = {}
+                for hours, future in futures.items():
+                    try:
+                        variant_activities[hours] = future.result()
+                    except Exception as e:
+                        raise ValueError(f"{hours}课时版本: {str(e)}")
+                        
             return {
-                "messages": ["教学活动设计完成"],
-                "activities": result
+                "messages": [f"教学活动设计完成（{len(variants)}个课时版本）"],
+                "activities": variant_activities[variants[0]],
+                "variant_activities": variant_activities
             }
             
         except Exception as e:
-            return {"messages": [f"错误：设计教学活动失败 - {str(e)}"]}
+            return self._fail("design_activities", f"错误：设计教学活动失败 - {str(e)}")
             
     def create_assessment(self, state: TeachingState) -> TeachingState:
         """创建评估方案"""
         try:
             print("\n=== 创建评估方案 ===")
+            check_cancelled()
             
             # 调用评估代理
             result = create_assessment(state["objectives"], state["knowledge_points"])
@@ -131,71 +367,149 @@ class TeachingAgent:
             }
             
         except Exception as e:
-            return {"messages": [f"错误：创建评估方案失败 - {str(e)}"]}
+            return self._fail("create_assessment", f"错误：创建评估方案失败 - {str(e)}")
             
     def save_output(self, state: TeachingState) -> TeachingState:
         """保存输出"""
         try:
             print("\n=== 保存输出 ===")
+            check_cancelled()
             
             # 获取课程名称
             course_name = state["textbook_content"].get("title", "未命名课程")
             
-            # 准备输出内容
-            output = {
-                "objectives": state["objectives"],
-                "knowledge_points": state["knowledge_points"],
-                "activities": state["activities"],
-                "assessment": state["assessment"],
-                "total_hours": state["total_hours"]
-            }
-            
-            # 保存到文件
-            save_lesson_plan_to_md(output, course_name)
-            return {"messages": ["教学大纲已保存"]}
+            # 每个课时版本保存一份，共用目标、知识点和评估
+            variants = self._variants(state)
+            variant_activities = state.get("variant_activities") or {variants[0]: state["activities"]}
+            for total_hours in variants:
+                output = {
+                    "objectives": state["objectives"],
+                    "knowledge_points": state["knowledge_points"],
+                    "activities": variant_activities[total_hours],
+                    "assessment": state["assessment"],
+                    "total_hours": total_hours
+                }
+                
+                # 保存到文件（多版本时文件名带课时数，避免同一秒内重名）
+                name = course_name if len(variants) == 1 else f"{course_name}_{total_hours}课时"
+                save_lesson_plan_to_md(output, name)
+            return {"messages": [f"教学大纲已保存（{len(variants)}份）" if len(variants) > 1 else "教学大纲已保存"]}
             
         except Exception as e:
-            return {"messages": [f"错误：保存输出失败 - {str(e)}"]}
+            return self._fail("save_output", f"错误：保存输出失败 - {str(e)}")
             
-    def run(self, pdf_path: str, total_hours: int) -> Dict[str, Any]:
-        """运行教学代理"""
+    def run(self, pdf_path: str, total_hours: Union[int, List[int]], timeout: Optional[float] = None,
+            cancel_token: Optional[CancelToken] = None,
+            textbook_content: Optional[Dict[str, Any]] = None,
+            resume: Optional[Dict[str, Any]] = None,
+            on_stage: Optional[Callable[[str, Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        运行教学代理
+        
+        Args:
+            pdf_path: 教材PDF路径
+            total_hours: 总课时数；传入列表时一次生成多个课时版本，
+                教材提取、教学目标、知识点和评估方案只生成一次
+            timeout: 运行截止时间（秒），默认使用RUN_TIMEOUT；传入cancel_token时忽略
+            cancel_token: 取消令牌，可在其他线程调用cancel()中止运行
+            textbook_content: 已提取的教材内容（如流水线在进程池中提取），传入时不再读取PDF
+            resume: 与课时无关阶段的已有结果（textbook_content、objectives、knowledge_points），
+                如工作队列中回收的任务从检查点继续，传入时直接设计活动
+            on_stage: 每个节点完成后以(节点名, 节点输出)调用，用于保存检查点
+                
+        Returns:
+            Dict[str, Any]: 最终状态，各版本的活动在variant_activities中
+        """
         try:
+            # 统一为课时版本列表（去重并保持顺序）
+            hour_variants = list(dict.fromkeys(total_hours if isinstance(total_hours, (list, tuple)) else [total_hours]))
+            if not hour_variants:
+                raise ValueError("总课时列表不能为空")
+                
             print("\n=== 启动教学代理 ===")
             print(f"PDF路径: {pdf_path}")
-            print(f"总课时: {total_hours}")
+            print(f"总课时: {', '.join(str(hours) for hours in hour_variants)}")
             
-            # 验证PDF文件
-            if not is_valid_pdf(pdf_path):
+            # 验证PDF文件（已提取内容时提取阶段已验证过）
+            if textbook_content is None and resume is None and not is_valid_pdf(pdf_path):
                 raise ValueError(f"无效的PDF文件: {pdf_path}")
             
-            # 提取教材内容
-            print("正在提取PDF内容...")
-            textbook_content = extract_text_from_pdf(pdf_path)
-            print("PDF内容提取完成")
-            
-            # 初始化状态
-            initial_state: TeachingState = {
-                "messages": [],
-                "textbook_content": textbook_content,
-                "objectives": {},
-                "knowledge_points": {},
-                "activities": {},
-                "assessment": {},
-                "total_hours": total_hours
-            }
+            # 本次运行的取消令牌，通过上下文传给各节点和并发线程
+            token = cancel_token or CancelToken(RUN_TIMEOUT if timeout is None else timeout)
+            with run_scope(token):
+                # 从检查点继续或已通过prepare预计算时直接使用已有的教材、目标和知识点
+                prepared = resume or self._take_prepared(pdf_path)
+                if prepared:
+                    print("从检查点继续" if resume else "使用预计算的教材内容、教学目标和知识点")
+                    textbook_content = prepared["textbook_content"]
+                elif textbook_content is not None:
+                    print("使用已提取的PDF内容")
+                else:
+                    # 提取教材内容
+                    print("正在提取PDF内容...")
+                    textbook_content = extract_text_from_pdf(pdf_path)
+                    print("PDF内容提取完成")
             
-            # 运行状态图
-            print("\n开始处理...")
-            final_state = initial_state
-            for event in self.graph.stream(initial_state):
-                for key, value in event.items():
-                    if isinstance(value, dict):
-                        final_state.update(value)
-                    if "messages" in value:
-                        for message in value["messages"]:
-                            print(f"- {message}")
+                # 初始化状态
+                initial_state: TeachingState = {
+                    "messages": [],
+                    "textbook_content": textbook_content,
+                    "objectives": prepared["objectives"] if prepared else {},
+                    "knowledge_points": prepared["knowledge_points"] if prepared else {},
+                    "activities": {},
+                    "assessment": {},
+                    "total_hours": hour_variants[0],
+                    "hour_variants": hour_variants,
+                    "variant_activities": {},
+                    "error": None,
+                    "failed_stage": None,
+                    "llm_calls_avoided": 0,
+                    "prepared": bool(prepared)
+                }
+            
+                # 运行状态图
+                print("\n开始处理...")
+                final_state = initial_state
+                for event in self.graph.stream(initial_state):
+                    for key, value in event.items():
+                        if isinstance(value, dict):
+                            final_state.update(value)
+                            if on_stage is not None:
+                                on_stage(key, value)
+                        if "messages" in value:
+                            for message in value["messages"]:
+                                print(f"- {message}")
             
             print("\n处理完成")
+            # 进程内所有运行的累计值，常驻服务中由/stats提供
+            usage = token_usage_log.summary() if self.save_metrics else {}
+            if usage.get("measured"):
+                print(f"token估算（累计）: {usage['measured']}次调用，估算{usage['estimated_tokens']}，"
+                      f"实际{usage['actual_tokens']}，平均偏差{usage['mean_abs_error']:.1%}")
+
+            # 记录模型路由与延迟分布，用于调整阶段模型和延迟预算
+            report = llm_metrics.report() if self.save_metrics else ""
+            if report:
+                print("\n=== 模型调用统计 ===")
+                print(report)
+                flight = llm_singleflight.stats()
+                if flight["coalesced"]:
+                    print(f"合并相同请求: 省下{flight['coalesced']}次调用（{flight['saved_ratio']:.1%}）")
+                limiter = llm_limiter.stats()
+                print(f"自适应并发: 当前上限{limiter['limit']}，排队{limiter['queue_depth']}，"
+                      f"增加{limiter['increases']}次，缩减{limiter['decreases']}次")
+                breakers = breaker_stats()
+                for name, breaker in breakers.items():
+                    if breaker["opens"] or breaker["fast_failures"]:
+                        print(f"熔断器{name}: 状态{breaker['state']}，熔断{breaker['opens']}次，"
+                              f"挂起{breaker['parked_total']}个请求，直接失败{breaker['fast_failures']}个")
+                keys = key_pool_stats() or {}
+                for label, usage in keys.items():
+                    print(f"API密钥{label}: 请求{usage['requests']}次，成功{usage['successes']}次，"
+                          f"错误{usage['errors']}，token {usage['prompt_tokens']}+{usage['completion_tokens']}")
+                os.makedirs(os.path.join("my_agent", "output"), exist_ok=True)
+                llm_metrics.save(os.path.join("my_agent", "output", "llm_metrics.json"), api_keys=keys,
+                                 concurrency=limiter, circuit_breakers=breakers)
             return final_state
             
         except Exception as e:
@@ -1,12 +1,168 @@
-<<<<<<< HEAD
 from typing import Dict, Any, List
-from my_agent.config import get_llm
+from my_agent.config import get_llm, LLMConfig, MAX_CONCURRENT_LLM_CALLS
 from my_agent.utils.exceptions import LLMGenerationError
 from my_agent.utils.types import AgentState
+from my_agent.utils.compact_schema import ACTIVITIES_WIRE_SCHEMA, expand_activities
+from my_agent.utils.llm_utils import chat_completion
+from my_agent.utils.hour_allocator import assign_activity_durations, compute_time_allocation, MINUTES_PER_HOUR
+from my_agent.utils.knowledge_graph import KnowledgeGraph
+from my_agent.utils.deadline import CancelToken, ContextThreadPoolExecutor, current_token, run_scope
+from my_agent.utils.concurrency import fanout_workers
 import json
 
-def design_activities(knowledge_points: Dict[str, Any], total_hours: int) -> Dict[str, Any]:
-    """设计教学活动"""
+ACTIVITY_BLOCK_HOURS = 4  # 每个教学单元的课时数，活动按单元并发生成
+
+def split_into_blocks(points: List[Dict[str, Any]], total_hours: int) -> List[Dict[str, Any]]:
+    """
+    将课程按4课时划分为教学单元，并按顺序分配知识点
+    
+    Args:
+        points: 按教学顺序排列的知识点列表
+        total_hours: 总课时数
+        
+    Returns:
+        List[Dict[str, Any]]: 每个单元的起始课时、课时数和知识点
+    """
+    block_hours = []
+    remaining = int(total_hours)
+    while remaining > 0:
+        block_hours.append(min(ACTIVITY_BLOCK_HOURS, remaining))
+        remaining -= block_hours[-1]
+        
+    blocks = []
+    start = 1
+    count = len(block_hours)
+    for index, hours in enumerate(block_hours):
+        if len(points) >= count:
+            block_points = points[index * len(points) // count:(index + 1) * len(points) // count]
+        else:
+            # 知识点少于单元数时，一个知识点跨多个单元
+            block_points = [points[index * len(points) // count]] if points else []
+        blocks.append({
+            "index": index + 1,
+            "start_hour": start,
+            "hours": hours,
+            "points": block_points
+        })
+        start += hours
+    return blocks
+
+def _design_block_activities(llm_config: LLMConfig, block: Dict[str, Any], block_count: int,
+                             knowledge: Dict[str, Any]) -> Dict[str, Any]:
+    """为单个教学单元设计活动，返回已分配时长的紧凑格式"""
+    end_hour = block["start_hour"] + block["hours"] - 1
+    total_minutes = block["hours"] * MINUTES_PER_HOUR
+    
+    # 构建提示词
+    points_json = json.dumps(block["points"], indent=2, ensure_ascii=False)
+    template = """作为教学设计专家，请为课程的一个教学单元设计教学活动。
+全课程共{block_count}个单元，本单元是第{index}单元（第{start}-{end}课时，共{hours}课时，每课时45分钟）。
+
+本单元知识点（已按先修关系排好教学顺序，请按此顺序安排活动）：
+{points}
+
+全课程教学重点：{key_points}
+全课程教学难点：{difficult_points}
+
+请设计教学活动，要求：
+1. 用相对权重表示每个活动需要的时间，系统会据此分配15/30/45/90分钟的时长，使本单元总时长等于{total_minutes}分钟
+2. 活动数量要与课时相称（约每课时1个活动）
+3. 本单元的每个知识点都要有对应的教学活动，不要设计其他单元的内容
+4. 活动设计要合理，包含导入、发展、总结等环节
+
+请按以下紧凑格式输出（使用短键和数组，不要输出字段说明）：
+{schema}"""
+
+    prompt = template.format(
+        block_count=block_count,
+        index=block["index"],
+        start=block["start_hour"],
+        end=end_hour,
+        hours=block["hours"],
+        points=points_json,
+        key_points="、".join(knowledge.get("key_points", [])),
+        difficult_points="、".join(knowledge.get("difficult_points", [])),
+        total_minutes=total_minutes,
+        schema=ACTIVITIES_WIRE_SCHEMA
+    )
+    
+    print(f"调用LLM设计第{block['index']}单元活动（第{block['start_hour']}-{end_hour}课时）...")
+    
+    # 调用LLM
+    response = chat_completion(
+        llm_config,
+        [
+            {"role": "system", "content": "你是一个专业的教学设计专家，擅长设计教学活动。"},
+            {"role": "user", "content": prompt}
+        ],
+        stage="design_activities",
+        temperature=0.7,
+        response_format={"type": "json_object"}
+    )
+    
+    # 解析响应
+    result = response.choices[0].message.content
+    if isinstance(result, str):
+        result = json.loads(result)
+    if not isinstance(result, dict):
+        raise ValueError(f"第{block['index']}单元结果格式错误: {type(result)}")
+        
+    # 本地分配本单元的活动时长
+    return assign_activity_durations(result, total_minutes)
+
+def check_activities(result: Dict[str, Any], total_hours: int) -> None:
+    """
+    验证教学活动设计结果
+    
+    Args:
+        result: 展开后的教学活动（含time_allocation和activities字段）
+        total_hours: 总课时数
+        
+    Raises:
+        ValueError: 如果格式或内容不符合要求
+    """
+    if "time_allocation" not in result:
+        raise ValueError("缺少time_allocation字段")
+        
+    if "activities" not in result:
+        raise ValueError("缺少activities字段")
+        
+    time_allocation = result["time_allocation"]
+    if not isinstance(time_allocation, dict):
+        raise ValueError(f"time_allocation格式错误: {type(time_allocation)}")
+        
+    activities = result["activities"]
+    if not isinstance(activities, list):
+        raise ValueError(f"activities格式错误: {type(activities)}")
+        
+    if not activities:
+        raise ValueError("activities不能为空")
+        
+    # 验证时间分配
+    total_time = sum(float(time_allocation.get(key, 0)) for key in ["knowledge", "skill", "practice", "discussion", "assessment"])
+    if abs(total_time - total_hours) > 0.1:  # 允许0.1课时的误差
+        raise ValueError(f"时间分配不正确：总和{total_time}课时，应为{total_hours}课时")
+        
+    # 验证活动时长
+    valid_durations = {15, 30, 45, 90}
+    for activity in activities:
+        if not isinstance(activity, dict):
+            raise ValueError(f"活动格式错误: {type(activity)}")
+        if "activity" not in activity:
+            raise ValueError("活动缺少activity字段")
+        act = activity["activity"]
+        if "duration" not in act:
+            raise ValueError("活动缺少duration字段")
+        try:
+            duration = int(str(act["duration"]).replace("分钟", ""))
+            if duration not in valid_durations:
+                raise ValueError(f"活动时长{duration}不是有效值（15/30/45/90）")
+        except ValueError as e:
+            raise ValueError(f"活动时长格式错误: {str(e)}")
+
+def design_activities(knowledge_points: Dict[str, Any], total_hours: int,
+                      max_workers: int = MAX_CONCURRENT_LLM_CALLS) -> Dict[str, Any]:
+    """设计教学活动（按4课时单元并发生成后按顺序拼接，max_workers为本次可用的并发调用数）"""
     try:
         # 验证输入
         if not isinstance(knowledge_points, dict):
@@ -18,136 +174,45 @@ def design_activities(knowledge_points: Dict[str, Any], total_hours: int) -> Dic
         # 获取LLM配置
         llm_config = get_llm()
         
-        # 构建提示词
-        points_json = json.dumps(knowledge_points, indent=2, ensure_ascii=False)
-        template = """作为教学设计专家，请基于以下知识点设计教学活动。总课时为{hours}学时（每课时45分钟）。
-
-知识点：
-{points}
-
-请设计教学活动，要求：
-1. 每个活动的时长必须是以下选项之一：
-   - 15分钟（小节课）
-   - 30分钟（半节课）
-   - 45分钟（一节课）
-   - 90分钟（两节连堂课）
-2. 所有活动的总时长必须等于{total_minutes}分钟
-3. 每个知识点都要有对应的教学活动
-4. 活动设计要合理，包含导入、发展、总结等环节
-
-请按以下格式输出：
-{{
-    "time_allocation": {{
-        "knowledge": "知识讲解课时数",
-        "skill": "技能训练课时数",
-        "practice": "实践课时数",
-        "discussion": "讨论课时数",
-        "assessment": "评估课时数"
-    }},
-    "activities": [
-        {{
-            "activity": {{
-                "title": "活动标题",
-                "duration": "活动时长（分钟）",
-                "教学重点": "教学重点内容",
-                "教学方法": "使用的教学方法",
-                "教学过程": {{
-                    "导入环节": {{
-                        "content": "环节内容",
-                        "duration": "环节时长",
-                        "activities": ["具体活动1", "具体活动2"],
-                        "materials": ["教学材料1", "教学材料2"]
-                    }},
-                    "发展环节": {{
-                        "content": "环节内容",
-                        "duration": "环节时长",
-                        "activities": ["具体活动1", "具体活动2"],
-                        "materials": ["教学材料1", "教学材料2"]
-                    }},
-                    "总结环节": {{
-                        "content": "环节内容",
-                        "duration": "环节时长",
-                        "activities": ["具体活动1", "具体活动2"],
-                        "materials": ["教学材料1", "教学材料2"]
-                    }}
-                }},
-                "设计亮点": "活动设计的亮点",
-                "预期效果": "预期达到的效果",
-                "可能问题": "可能遇到的问题",
-                "对应章节": "对应的教材章节"
-            }}
-        }}
-    ]
-}}"""
-
-        prompt = template.format(
-            hours=total_hours,
-            points=points_json,
-            total_minutes=total_hours * 45
-        )
+        # 按先修关系在本地排好教学顺序，再划分教学单元
+        knowledge = knowledge_points.get("knowledge_points", knowledge_points)
+        graph = KnowledgeGraph(knowledge)
+        for cycle in graph.find_cycles():
+            print(f"警告：知识点先修关系存在环：{' -> '.join(cycle)}")
+        points = graph.topological_order()
+        blocks = split_into_blocks(points, total_hours)
 
         print("\n=== 设计教学活动 ===")
-        print(f"总课时: {total_hours}")
-        print("调用LLM设计活动...")
-        
-        # 调用LLM
-        response = llm_config.client.chat.completions.create(
-            model=llm_config.model,
-            messages=[
-                {"role": "system", "content": "你是一个专业的教学设计专家，擅长设计教学活动。"},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            response_format={"type": "json_object"}
-        )
+        print(f"总课时: {total_hours}，教学单元数: {len(blocks)}")
         
-        # 解析响应
-        result = response.choices[0].message.content
-        if isinstance(result, str):
-            result = json.loads(result)
+        # 各单元并发生成，在子令牌下运行：一个单元失败时取消其余单元，不再等待它们的调用
+        parent = current_token()
+        token = parent.child() if parent is not None else CancelToken()
+        workers = fanout_workers(len(blocks), max_workers)
+        with run_scope(token), ContextThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(_design_block_activities, llm_config, block, len(blocks), knowledge)
+                for block in blocks
+            ]
+            block_results = []
+            for block, future in zip(blocks, futures):
+                try:
+                    block_results.append(future.result())
+                except Exception as e:
+                    token.cancel(f"第{block['index']}单元活动设计失败")
+                    for pending in futures:
+                        pending.cancel()
+                    raise ValueError(f"第{block['index']}单元活动设计失败: {str(e)}")
+                    
+        # 按单元顺序拼接，并重新计算课时分配
+        wire_activities = [item for block_result in block_results for item in block_result["a"]]
+        result = expand_activities({
+            "ta": compute_time_allocation(wire_activities),
+            "a": wire_activities
+        })
             
         # 验证结果
-        if not isinstance(result, dict):
-            raise ValueError(f"结果格式错误: {type(result)}")
-            
-        if "time_allocation" not in result:
-            raise ValueError("缺少time_allocation字段")
-            
-        if "activities" not in result:
-            raise ValueError("缺少activities字段")
-            
-        time_allocation = result["time_allocation"]
-        if not isinstance(time_allocation, dict):
-            raise ValueError(f"time_allocation格式错误: {type(time_allocation)}")
-            
-        activities = result["activities"]
-        if not isinstance(activities, list):
-            raise ValueError(f"activities格式错误: {type(activities)}")
-            
-        if not activities:
-            raise ValueError("activities不能为空")
-            
-        # 验证时间分配
-        total_time = sum(float(time_allocation.get(key, 0)) for key in ["knowledge", "skill", "practice", "discussion", "assessment"])
-        if abs(total_time - total_hours) > 0.1:  # 允许0.1课时的误差
-            raise ValueError(f"时间分配不正确：总和{total_time}课时，应为{total_hours}课时")
-            
-        # 验证活动时长
-        valid_durations = {15, 30, 45, 90}
-        for activity in activities:
-            if not isinstance(activity, dict):
-                raise ValueError(f"活动格式错误: {type(activity)}")
-            if "activity" not in activity:
-                raise ValueError("活动缺少activity字段")
-            act = activity["activity"]
-            if "duration" not in act:
-                raise ValueError("活动缺少duration字段")
-            try:
-                duration = int(str(act["duration"]).replace("分钟", ""))
-                if duration not in valid_durations:
-                    raise ValueError(f"活动时长{duration}不是有效值（15/30/45/90）")
-            except ValueError as e:
-                raise ValueError(f"活动时长格式错误: {str(e)}")
+        check_activities(result, total_hours)
                 
         print("活动设计完成")
         return result
@@ -242,131 +307,3 @@ def validate_activities(activities: Dict[str, Any], total_hours: int) -> None:
             raise ValueError("依赖项缺少activity或depends_on字段")
         if not isinstance(dep["depends_on"], list):
             raise ValueError("depends_on必须是列表类型")
-=======
-from typing import TypedDict
-from langchain_core.prompts import ChatPromptTemplate
-from ..config import get_llm
-from ..utils.types import AgentState
-
-def design_activities(state: AgentState) -> AgentState:
-    """设计教学活动的代理"""
-    try:
-        print("\n=== 开始设计教学活动 ===")
-        state["progress_status"] = "正在设计教学活动..."
-        
-        system_prompt = f"""你是一位创新的教学设计专家。
-        你的任务是设计有效的教学活动来实现教学目标。
-
-        请遵循以下原则：
-        1. 活动设计要以学生为中心
-        2. 结合多样化的教学方法
-        3. 注重师生互动和生生互动
-        4. 适当运用现代教育技术
-        5. 每节课45分钟，总课时{state['total_hours']}课时
-        6. 考虑教学内容的难度和学生接受程度
-        7. 设计要体现教学目标的层次性和递进性
-        8. 注重理论与实践的结合
-        9. 适当融入学科核心素养的培养
-
-        输出格式：
-        1. 课时分配方案（总计{state['total_hours']}课时）：
-           * 知识讲解：X课时（说明分配理由）
-           * 技能训练：X课时（说明训练重点）
-           * 实践活动：X课时（说明活动特色）
-           * 研讨交流：X课时（说明交流形式）
-           * 测试评价：X课时（说明评价方式）
-
-        2. 具体活动设计：
-           第X课时：[主题名称]
-           - 教学重点：（对应知识点）
-           - 教学方法：（采用的方法及理由）
-           - 教学过程：
-             * 导入环节（5分钟）：...
-             * 发展环节（30分钟）：...
-             * 总结环节（10分钟）：...
-           - 设计亮点：（创新之处）
-           - 预期效果：（对应教学目标）
-           - 可能问题：（教学难点及应对）
-        """
-        
-        user_prompt = f"""
-        请基于以下内容，设计总计{state['total_hours']}课时的教学活动。
-
-        教学目标：
-        {state['teaching_objectives']}
-
-        知识点体系：
-        {state['knowledge_points']}
-
-        请确保你的设计：
-        1. 每个活动都明确对应教学目标
-        2. 活动难度循序渐进
-        3. 时间分配合理，总计{state['total_hours']}课时
-        4. 充分考虑学生参与度
-        5. 包含必要的复习和巩固环节
-        6. 设计适当的课堂互动方式
-        7. 注意理论与实践的结合
-        """
-        
-        llm = get_llm(is_scanned=state["is_scanned"])
-        print("正在调用 AI 设计教学活动...")
-        response = llm.chat([
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ])
-        
-        content = response.choices[0].message.content
-        print("教学活动设计完成，正在解析课时分配...")
-        
-        # 解析课时分配
-        hours_per_section = {}
-        for line in content.split('\n'):
-            if '：' in line and '课时' in line:
-                try:
-                    section = line.split('：')[0].strip()
-                    hours = int(line.split('：')[1].replace('课时', ''))
-                    hours_per_section[section] = hours
-                except:
-                    continue
-        
-        # 验证课时总和
-        total = sum(hours_per_section.values())
-        if total != state['total_hours']:
-            raise ValueError(f"课时分配总和({total})不等于指定的总课时数({state['total_hours']})")
-        
-        activities = [
-            {"activity": activity.strip()}
-            for activity in content.split('\n')
-            if activity.strip()
-        ]
-        
-        # 确保所有字段都有有效值
-        new_state = {
-            **state,
-            "teaching_activities": activities,
-            "hours_per_section": hours_per_section,
-            "next_step": "create_assessment",
-            "messages": [],
-            "assessment_plan": state.get("assessment_plan", {}),
-            "final_output": state.get("final_output", ""),
-            "progress_status": "已设计教学���动",
-            "error_msg": None
-        }
-        print("=== 教学活动设计完成 ===\n")
-        return new_state
-        
-    except Exception as e:
-        return {
-            **state,
-            "error_msg": str(e),
-            "next_step": "error",
-            "progress_status": "生成失败",
-            "messages": [],
-            "teaching_objectives": state.get("teaching_objectives"),
-            "knowledge_points": state.get("knowledge_points", []),
-            "teaching_activities": [],
-            "assessment_plan": {},
-            "final_output": "",
-            "hours_per_section": {}
-        } 
->>>>>>> c4972e73ce82ab596751226cd0a07e233d3db998
@@ -1,160 +1,333 @@
-<<<<<<< HEAD
-from typing import Dict, Any, List
-from my_agent.config import get_llm
+from typing import Dict, Any, List, Tuple
+from my_agent.config import get_llm, LLMConfig
 from my_agent.utils.exceptions import LLMGenerationError
 from my_agent.utils.types import AgentState
+from my_agent.utils.compact_schema import ASSESSMENT_WIRE_SCHEMA, expand_assessment
+from my_agent.utils.llm_utils import chat_completion
+from my_agent.utils.knowledge_graph import KnowledgeGraph
+from my_agent.utils.coverage import build_coverage
+from my_agent.utils.deadline import ContextThreadPoolExecutor
+from my_agent.utils.concurrency import fanout_workers
 import json
+import re
 
-def create_assessment(objectives: Dict[str, Any], knowledge_points: Dict[str, Any]) -> Dict[str, Any]:
-    """创建评估方案"""
-    try:
-        # 验证输入
-        if not isinstance(objectives, dict):
-            raise ValueError(f"教学目标格式错误: {type(objectives)}")
-            
-        if not isinstance(knowledge_points, dict):
-            raise ValueError(f"知识点格式错误: {type(knowledge_points)}")
-            
-        # 获取LLM配置
-        llm_config = get_llm()
+# 评估方案按目标维度分片生成
+OBJECTIVE_DIMENSIONS = [("knowledge", "知识"), ("ability", "能力"), ("emotion", "情感")]
+DEFAULT_FORMATIVE_WEIGHT = 0.6  # 分片未给出有效总权重时，形成性评估的默认占比
+COVERAGE_REGEN_ROUNDS = 1  # 针对覆盖缺口补充生成的最多轮数
+
+def _parse_weights(values: List[Any]) -> List[float]:
+    """
+    解析一组权重（支持0.2、20、20%等写法），统一为0-1的小数
+    
+    同一组权重按同一尺度解析：任一值带%或大于1时整组视为百分数，否则视为小数，
+    避免1、2、3这样的相对权重被逐个判断成不同的尺度。
+    """
+    numbers = []
+    for value in values:
+        match = re.search(r"\d+(?:\.\d+)?", str(value))
+        numbers.append(float(match.group()) if match else 0.0)
+    if any("%" in str(value) for value in values) or any(number > 1 for number in numbers):
+        return [number / 100 for number in numbers]
+    return numbers
+
+def _as_list(value: Any) -> List[Any]:
+    """将对应关系字段统一为列表，单个字符串不拆成字符"""
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [value]
+
+def _format_weights(raw: List[float], total: float) -> List[str]:
+    """按比例将权重归一化到total，保留三位小数且总和精确等于total"""
+    if not raw:
+        return []
+    if not any(raw):
+        raw = [1.0] * len(raw)
+    scale = round(total * 1000)
+    exact = [w / sum(raw) * scale for w in raw]
+    units = [int(x) for x in exact]
+    order = sorted(range(len(exact)), key=lambda i: exact[i] - units[i], reverse=True)
+    for i in order[:scale - sum(units)]:
+        units[i] += 1
+    return [f"{u / 1000:g}" for u in units]
+
+def merge_assessment_plans(plans: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    合并多个分片的评估方案：按名称去重，并在本地重新归一化权重
+    
+    Args:
+        plans: 各分片展开后的评估方案（含assessment_plan字段）
         
-        # 构建提示词
-        objectives_json = json.dumps(objectives, indent=2, ensure_ascii=False)
-        points_json = json.dumps(knowledge_points, indent=2, ensure_ascii=False)
-        template = """作为评估方案设计专家，请基于以下教学目标和知识点设计评估方案。
+    Returns:
+        Dict[str, Any]: 合并后的评估方案
+    """
+    merged = {"formative": [], "summative": []}
+    index: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    totals = {"formative": [], "summative": []}
+    
+    for plan in plans:
+        plan = plan.get("assessment_plan", plan)
+        # 同一分片内所有评估项的权重按同一尺度解析
+        items = [(field, item) for field in ["formative", "summative"] for item in plan.get(field, [])]
+        item_weights = _parse_weights([item.get("weight") for _, item in items])
+        for (field, item), weight in zip(items, item_weights):
+            key = (field, re.sub(r"\s+", "", str(item.get("name", ""))))
+            if key in index:
+                # 同名评估项合并对应关系，权重取较大者
+                existing = index[key]
+                for list_key in ["objectives", "knowledge_points", "tools"]:
+                    for value in _as_list(item.get(list_key)):
+                        if value not in existing[list_key]:
+                            existing[list_key].append(value)
+                existing["_raw_weight"] = max(existing["_raw_weight"], weight)
+                continue
+            entry = dict(item)
+            for list_key in ["objectives", "knowledge_points", "tools"]:
+                entry[list_key] = _as_list(item.get(list_key))
+            entry["_raw_weight"] = weight
+            index[key] = entry
+            merged[field].append(entry)
+        weights = plan.get("weights", {})
+        group_weights = _parse_weights([weights.get("formative"), weights.get("summative")])
+        for field, weight in zip(["formative", "summative"], group_weights):
+            if weight > 0:
+                totals[field].append(weight)
+                
+    # 形成性/终结性总权重取各分片的平均值，再归一化为1
+    formative = sum(totals["formative"]) / len(totals["formative"]) if totals["formative"] else DEFAULT_FORMATIVE_WEIGHT
+    summative = sum(totals["summative"]) / len(totals["summative"]) if totals["summative"] else 1 - DEFAULT_FORMATIVE_WEIGHT
+    if not merged["formative"]:
+        formative = 0.0
+    if not merged["summative"]:
+        summative = 0.0
+    group_totals = _format_weights([formative, summative], 1.0)
+    
+    for field, total in zip(["formative", "summative"], group_totals):
+        items = merged[field]
+        for item, weight in zip(items, _format_weights([item.pop("_raw_weight") for item in items], float(total))):
+            item["weight"] = weight
+            
+    return {
+        "assessment_plan": {
+            "formative": merged["formative"],
+            "summative": merged["summative"],
+            "weights": {"formative": group_totals[0], "summative": group_totals[1]}
+        }
+    }
 
-教学目标：
+def _create_shard_assessment(llm_config: LLMConfig, dimension: str, label: str,
+                             shard_objectives: List[Dict[str, Any]],
+                             points: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """为单个目标维度生成评估方案，返回展开后的结构"""
+    # 构建提示词
+    objectives_json = json.dumps({dimension: shard_objectives}, indent=2, ensure_ascii=False)
+    points_json = json.dumps(
+        [{"name": p.get("name", ""), "content": p.get("content", "")} for p in points],
+        indent=2, ensure_ascii=False
+    )
+    template = """作为评估方案设计专家，请基于以下{label}目标和知识点设计评估方案。
+本次只需为下列{label}目标设计评估项，其他维度的目标由其他专家负责。
+
+{label}目标：
 {objectives}
 
 知识点：
 {points}
 
 请设计评估方案，要求：
-1. 评估方案要全面覆盖教学目标和知识点
+1. 评估方案要全面覆盖上述{label}目标及其相关知识点
 2. 评估方式要多样化，包含形成性评估和终结性评估
 3. 评估标准要具体、可操作
-4. 评估结果要可量化
+4. 评估结果要可量化，权重表示各评估项的相对重要程度
 
-请按以下格式输出：
-{{
-    "assessment_plan": {{
-        "formative": [
-            {{
-                "type": "评估类型",
-                "name": "评估名称",
-                "description": "评估描述",
-                "objectives": ["对应的教学目标1", "对应的教学目标2"],
-                "knowledge_points": ["对应的知识点1", "对应的知识点2"],
-                "criteria": {{
-                    "优秀": "评分标准",
-                    "良好": "评分标准",
-                    "及格": "评分标准",
-                    "不及格": "评分标准"
-                }},
-                "weight": "占总成绩的权重",
-                "timing": "实施时间",
-                "tools": ["评估工具1", "评估工具2"],
-                "feedback": "反馈方式"
-            }}
-        ],
-        "summative": [
-            {{
-                "type": "评估类型",
-                "name": "评估名称",
-                "description": "评估描述",
-                "objectives": ["对应的教学目标1", "对应的教学目标2"],
-                "knowledge_points": ["对应的知识点1", "对应的知识点2"],
-                "criteria": {{
-                    "优秀": "评分标准",
-                    "良好": "评分标准",
-                    "及格": "评分标准",
-                    "不及格": "评分标准"
-                }},
-                "weight": "占总成绩的权重",
-                "timing": "实施时间",
-                "tools": ["评估工具1", "评估工具2"],
-                "feedback": "反馈方式"
-            }}
+请按以下紧凑格式输出（使用短键和数组，不要输出字段说明）：
+{schema}"""
+
+    prompt = template.format(label=label, objectives=objectives_json, points=points_json,
+                             schema=ASSESSMENT_WIRE_SCHEMA)
+    
+    print(f"调用LLM创建{label}目标评估方案...")
+    
+    # 调用LLM
+    response = chat_completion(
+        llm_config,
+        [
+            {"role": "system", "content": "你是一个专业的评估方案设计专家，擅长设计教学评估方案。"},
+            {"role": "user", "content": prompt}
         ],
-        "weights": {{
-            "formative": "形成性评估总权重",
-            "summative": "终结性评估总权重"
-        }}
-    }}
-}}"""
+        stage="create_assessment",
+        temperature=0.7,
+        response_format={"type": "json_object"}
+    )
+    
+    # 解析响应
+    result = response.choices[0].message.content
+    if isinstance(result, str):
+        result = json.loads(result)
+    if not isinstance(result, dict):
+        raise ValueError(f"{label}目标评估结果格式错误: {type(result)}")
+    return expand_assessment(result)
 
-        prompt = template.format(objectives=objectives_json, points=points_json)
+def _run_shards(llm_config: LLMConfig, shards: List[Tuple[str, str, List[Dict[str, Any]], List[Dict[str, Any]]]]) -> List[Dict[str, Any]]:
+    """并发生成各分片的评估方案"""
+    workers = fanout_workers(len(shards))
+    with ContextThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(_create_shard_assessment, llm_config, dimension, label, shard_objectives, shard_points)
+            for dimension, label, shard_objectives, shard_points in shards
+        ]
+        results = []
+        for (_, label, _, _), future in zip(shards, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                raise ValueError(f"{label}目标评估生成失败: {str(e)}")
+    return results
 
-        print("\n=== 创建评估方案 ===")
-        print("调用LLM创建评估方案...")
+def _merge_shards(shard_results: List[Dict[str, Any]], graph: KnowledgeGraph) -> Dict[str, Any]:
+    """合并分片结果，并把评估引用的知识点统一为规范名称"""
+    result = merge_assessment_plans(shard_results)
+    unknown = set()
+    for field in ["formative", "summative"]:
+        for item in result["assessment_plan"].get(field, []):
+            names = item.get("knowledge_points", [])
+            if isinstance(names, list):
+                unknown.update(name for name in names if name not in graph)
+                item["knowledge_points"] = list(dict.fromkeys(graph.canonical(name) for name in names))
+    if unknown:
+        print(f"警告：评估方案引用了知识点分析之外的知识点：{'、'.join(sorted(map(str, unknown)))}")
+    return result
+
+def _gap_shards(report: Dict[str, Any], dimension_objectives: Dict[str, Any],
+                points: List[Dict[str, Any]]) -> List[Tuple[str, str, List[Dict[str, Any]], List[Dict[str, Any]]]]:
+    """根据覆盖报告，只为未覆盖的目标和知识点构建补充生成的分片"""
+    missing_points = report["uncovered_knowledge_points"]
+    shard_points = missing_points or points
+    shards = []
+    for dimension, label in OBJECTIVE_DIMENSIONS:
+        missing = [gap["objective"] for gap in report["uncovered_objectives"] if gap["dimension"] == dimension]
+        if missing:
+            shards.append((dimension, label, missing, shard_points))
+    if missing_points and not shards:
+        # 目标都已覆盖、只缺知识点时，挂在第一个非空维度下补充
+        for dimension, label in OBJECTIVE_DIMENSIONS:
+            if dimension_objectives.get(dimension):
+                shards.append((dimension, label, dimension_objectives[dimension], missing_points))
+                break
+    return shards
+
+def check_assessment(result: Dict[str, Any]) -> None:
+    """
+    验证评估方案结果
+    
+    Args:
+        result: 展开后的评估方案（含assessment_plan字段）
+        
+    Raises:
+        ValueError: 如果格式或内容不符合要求
+    """
+    if "assessment_plan" not in result:
+        raise ValueError("缺少assessment_plan字段")
         
-        # 调用LLM
-        response = llm_config.client.chat.completions.create(
-            model=llm_config.model,
-            messages=[
-                {"role": "system", "content": "你是一个专业的评估方案设计专家，擅长设计教学评估方案。"},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            response_format={"type": "json_object"}
-        )
+    plan = result["assessment_plan"]
+    if not isinstance(plan, dict):
+        raise ValueError(f"assessment_plan格式错误: {type(plan)}")
         
-        # 解析响应
-        result = response.choices[0].message.content
-        if isinstance(result, str):
-            result = json.loads(result)
+    required_fields = ["formative", "summative", "weights"]
+    for field in required_fields:
+        if field not in plan:
+            raise ValueError(f"缺少{field}字段")
             
-        # 验证结果
-        if not isinstance(result, dict):
-            raise ValueError(f"结果格式错误: {type(result)}")
+    # 验证形成性和终结性评估
+    for field in ["formative", "summative"]:
+        assessments = plan[field]
+        if not isinstance(assessments, list):
+            raise ValueError(f"{field}评估格式错误")
+        if not assessments:
+            raise ValueError(f"{field}评估不能为空")
+        for assessment in assessments:
+            if not isinstance(assessment, dict):
+                raise ValueError(f"{field}评估项格式错误")
+            for key in ["type", "name", "description", "objectives", "knowledge_points", "criteria", "weight", "timing", "tools", "feedback"]:
+                if key not in assessment:
+                    raise ValueError(f"{field}评估缺少{key}字段")
+                if key in ["objectives", "knowledge_points", "tools"]:
+                    if not isinstance(assessment[key], list):
+                        raise ValueError(f"{field}评估的{key}字段必须是列表")
+                elif key == "criteria":
+                    if not isinstance(assessment[key], dict):
+                        raise ValueError(f"{field}评估的{key}字段必须是字典")
+                    for grade in ["优秀", "良好", "及格", "不及格"]:
+                        if grade not in assessment[key]:
+                            raise ValueError(f"{field}评估的评分标准缺少{grade}等级")
+                else:
+                    if not isinstance(assessment[key], str):
+                        raise ValueError(f"{field}评估的{key}字段必须是字符串")
+                        
+    # 验证权重
+    weights = plan["weights"]
+    if not isinstance(weights, dict):
+        raise ValueError("weights格式错误")
+    for key in ["formative", "summative"]:
+        if key not in weights:
+            raise ValueError(f"weights缺少{key}字段")
+        if not isinstance(weights[key], str):
+            raise ValueError(f"weights的{key}字段必须是字符串")
+
+def create_assessment(objectives: Dict[str, Any], knowledge_points: Dict[str, Any]) -> Dict[str, Any]:
+    """创建评估方案（按目标维度分片并发生成后合并）"""
+    try:
+        # 验证输入
+        if not isinstance(objectives, dict):
+            raise ValueError(f"教学目标格式错误: {type(objectives)}")
             
-        if "assessment_plan" not in result:
-            raise ValueError("缺少assessment_plan字段")
+        if not isinstance(knowledge_points, dict):
+            raise ValueError(f"知识点格式错误: {type(knowledge_points)}")
             
-        plan = result["assessment_plan"]
-        if not isinstance(plan, dict):
-            raise ValueError(f"assessment_plan格式错误: {type(plan)}")
+        # 获取LLM配置
+        llm_config = get_llm()
+        
+        # 按目标维度分片
+        dimension_objectives = objectives.get("objectives", objectives)
+        knowledge = knowledge_points.get("knowledge_points", knowledge_points)
+        points = list(knowledge.get("basic", [])) + list(knowledge.get("advanced", []))
+        shards = [
+            (dimension, label, dimension_objectives[dimension], points)
+            for dimension, label in OBJECTIVE_DIMENSIONS
+            if dimension_objectives.get(dimension)
+        ]
+        if not shards:
+            raise ValueError("教学目标为空")
+
+        print("\n=== 创建评估方案 ===")
+        print(f"评估分片数: {len(shards)}")
+        
+        # 各分片并发生成
+        shard_results = _run_shards(llm_config, shards)
+                    
+        # 合并去重并归一化权重
+        graph = KnowledgeGraph(knowledge)
+        result = _merge_shards(shard_results, graph)
+        
+        # 本地检查覆盖度，只针对未覆盖的目标和知识点补充生成
+        report = build_coverage(objectives, knowledge, result)
+        for _ in range(COVERAGE_REGEN_ROUNDS):
+            gap_shards = _gap_shards(report, dimension_objectives, points)
+            if not gap_shards:
+                break
+            print(f"覆盖缺口: {len(report['uncovered_objectives'])}个目标、"
+                  f"{len(report['uncovered_knowledge_points'])}个知识点，补充生成{len(gap_shards)}个分片")
+            shard_results += _run_shards(llm_config, gap_shards)
+            result = _merge_shards(shard_results, graph)
+            report = build_coverage(objectives, knowledge, result)
             
-        required_fields = ["formative", "summative", "weights"]
-        for field in required_fields:
-            if field not in plan:
-                raise ValueError(f"缺少{field}字段")
-                
-        # 验证形成性和终结性评估
-        for field in ["formative", "summative"]:
-            assessments = plan[field]
-            if not isinstance(assessments, list):
-                raise ValueError(f"{field}评估格式错误")
-            if not assessments:
-                raise ValueError(f"{field}评估不能为空")
-            for assessment in assessments:
-                if not isinstance(assessment, dict):
-                    raise ValueError(f"{field}评估项格式错误")
-                for key in ["type", "name", "description", "objectives", "knowledge_points", "criteria", "weight", "timing", "tools", "feedback"]:
-                    if key not in assessment:
-                        raise ValueError(f"{field}评估缺少{key}字段")
-                    if key in ["objectives", "knowledge_points", "tools"]:
-                        if not isinstance(assessment[key], list):
-                            raise ValueError(f"{field}评估的{key}字段必须是列表")
-                    elif key == "criteria":
-                        if not isinstance(assessment[key], dict):
-                            raise ValueError(f"{field}评估的{key}字段必须是字典")
-                        for grade in ["优秀", "良好", "及格", "不及格"]:
-                            if grade not in assessment[key]:
-                                raise ValueError(f"{field}评估的评分标准缺少{grade}等级")
-                    else:
-                        if not isinstance(assessment[key], str):
-                            raise ValueError(f"{field}评估的{key}字段必须是字符串")
-                            
-        # 验证权重
-        weights = plan["weights"]
-        if not isinstance(weights, dict):
-            raise ValueError("weights格式错误")
-        for key in ["formative", "summative"]:
-            if key not in weights:
-                raise ValueError(f"weights缺少{key}字段")
-            if not isinstance(weights[key], str):
-                raise ValueError(f"weights的{key}字段必须是字符串")
+        print(f"目标覆盖: {report['objective_count'] - len(report['uncovered_objectives'])}/{report['objective_count']}，"
+              f"知识点覆盖: {report['knowledge_count'] - len(report['uncovered_knowledge_points'])}/{report['knowledge_count']}")
+            
+        # 验证结果
+        check_assessment(result)
                 
         print("评估方案创建完成")
         return result
@@ -238,134 +411,3 @@ def validate_assessment(assessment: Dict[str, Any]) -> None:
             raise ValueError(f"{key}必须是列表类型")
         if key == "frequency" and not isinstance(feed[key], str):
             raise ValueError("frequency必须是字符串类型")
-=======
-from typing import TypedDict
-from langchain_core.prompts import ChatPromptTemplate
-from ..config import get_llm
-from ..utils.types import AgentState
-from ..utils.output_formatter import format_final_output
-
-def create_assessment(state: AgentState) -> AgentState:
-    """创建评估方案的代理"""
-    try:
-        print("\n=== 开始生成评估方案 ===")
-        state["progress_status"] = "正在制定评估方案..."
-        
-        system_prompt = """你是一位教育评估专家。
-        你的任务是设计全面的评估方案来检验教学目标的达成情况。
-
-        请遵循以下原则：
-        1. 评估方式要多元化
-        2. 注重过程性评价和终结性评价相结合
-        3. 评估标准要清晰可操作
-        4. 关注学生的全面发展
-        5. 评估要体现素养导向
-        6. 注重学生的自主评价和互评
-        7. 评估结果要能指导教学改进
-
-        输出格式：
-        1. 过程性评价方案（占比60%）：
-           A. 课堂表现（20%）
-              - 具体评估要点
-              - 评分标准
-              - 记录方式
-           
-           B. 作业完成（20%）
-              - 作业类型和要求
-              - 批改要点
-              - 反馈方式
-           
-           C. 实践活动（20%）
-              - 活动评价维度
-              - 评价方法
-              - 证据收集
-
-        2. 终结性评价方案（占比40%）：
-           A. 理论测试
-              - 题型设置
-              - 难度分布
-              - 重点考查内容
-           
-           B. 实践考核
-              - 考核形式
-              - 评分标准
-              - 注意事项
-
-        3. 评价反馈机制：
-           - 及时反馈方式
-           - 结果运用建议
-           - 改进策略设计
-        """
-        
-        user_prompt = f"""
-        请基于以下内容，设计完整的评估方案。
-
-        教学目标：
-        {state['teaching_objectives']}
-
-        知识点体系：
-        {state['knowledge_points']}
-
-        教学活动：
-        {state['teaching_activities']}
-
-        请确保评估方案：
-        1. 全面覆盖教学目标
-        2. 评价方式多样
-        3. 标准清晰可操作
-        4. 注重过程性评价
-        5. 体现素养导向
-        6. 具有可行性
-        7. 促进教学改进
-        """
-        
-        llm = get_llm(is_scanned=state["is_scanned"])
-        print("正在调用 AI 生成评估方案...")
-        response = llm.chat([
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ])
-        
-        content = response.choices[0].message.content
-        print("评估方案生成完成，正在整理输出...")
-        
-        assessment_plan = {
-            "plan": content
-        }
-        
-        # 生成最终输出
-        final_output = format_final_output({
-            **state,
-            "assessment_plan": assessment_plan
-        })
-        
-        print("正在保存最终结果...")
-        # 确保所有字段都有有效值
-        new_state = {
-            **state,
-            "assessment_plan": assessment_plan,
-            "next_step": "end",
-            "messages": [],
-            "final_output": final_output,
-            "progress_status": "已完成评估方案",
-            "error_msg": None
-        }
-        print("=== 评估方案生成完成 ===\n")
-        return new_state
-        
-    except Exception as e:
-        print(f"\n!!! 评估方案生成失败: {str(e)} !!!\n")
-        return {
-            **state,
-            "error_msg": str(e),
-            "next_step": "error",
-            "progress_status": "生成失败",
-            "messages": [],
-            "teaching_objectives": state.get("teaching_objectives"),
-            "knowledge_points": state.get("knowledge_points", []),
-            "teaching_activities": state.get("teaching_activities", []),
-            "assessment_plan": {},
-            "final_output": "",
-            "hours_per_section": state.get("hours_per_section", {})
-        } 
->>>>>>> c4972e73ce82ab596751226cd0a07e233d3db998
@@ -0,0 +1,143 @@
+from typing import Dict, Any
+from my_agent.config import get_llm
+from my_agent.utils.exceptions import LLMGenerationError
+from my_agent.utils.compact_schema import (
+    OBJECTIVES_WIRE_SCHEMA, KNOWLEDGE_WIRE_SCHEMA, ACTIVITIES_WIRE_SCHEMA, ASSESSMENT_WIRE_SCHEMA,
+    expand_objectives, expand_knowledge, expand_activities, expand_assessment
+)
+from my_agent.utils.hour_allocator import assign_activity_durations, MINUTES_PER_HOUR
+from my_agent.utils.llm_utils import chat_completion
+from my_agent.utils.token_utils import content_budget, plan_textbook
+from my_agent.agents.objective_agent import check_objectives
+from my_agent.agents.knowledge_agent import check_knowledge_points
+from my_agent.agents.activity_agent import check_activities
+from my_agent.agents.assessment_agent import check_assessment, merge_assessment_plans
+import json
+
+FAST_MODE_MAX_HOURS = 8  # 快速模式只用于短单元，超过该课时数直接走分阶段流程
+FAST_MODE_MAX_OUTPUT_CHARS = 30000  # 合并输出超过该长度视为过大，回退到分阶段流程
+
+def generate_full_plan(textbook_content: Dict[str, Any], total_hours: int) -> Dict[str, Any]:
+    """
+    快速模式：一次LLM调用生成完整教学大纲
+
+    Args:
+        textbook_content: 教材内容
+        total_hours: 总课时数
+
+    Returns:
+        Dict[str, Any]: 包含objectives、knowledge_points、activities、assessment四部分，
+            与分阶段流程各节点的输出结构一致
+
+    Raises:
+        LLMGenerationError: 超出快速模式范围、输出过大或任一部分验证失败（调用方应回退到分阶段流程）
+    """
+    try:
+        # 验证输入
+        if not isinstance(textbook_content, dict):
+            raise ValueError(f"教材内容格式错误: {type(textbook_content)}")
+
+        if not isinstance(total_hours, int) or total_hours <= 0:
+            raise ValueError(f"总课时格式错误: {total_hours}")
+
+        if total_hours > FAST_MODE_MAX_HOURS:
+            raise ValueError(f"总课时{total_hours}超过快速模式上限{FAST_MODE_MAX_HOURS}")
+
+        # 获取LLM配置
+        llm_config = get_llm()
+
+        # 构建提示词（各部分的紧凑格式短键互不冲突，可合并为一个JSON对象）
+        system_prompt = "你是一个专业的教学设计专家，擅长设计完整的教学大纲。"
+        template = """作为教学设计专家，请基于以下教材内容一次性完成完整的教学大纲设计。总课时为{hours}学时（每课时45分钟）。
+
+教材内容：
+{content}
+
+请依次完成以下四部分，并放在同一个JSON对象中输出：
+1. 教学目标：包含知识、能力、情感三个维度，目标具体、可测量、有层次
+2. 知识点分析：基础和高级知识点，标注前置知识、对应目标和重难点
+3. 教学活动：用相对权重表示每个活动需要的时间（系统会据此分配15/30/45/90分钟的时长，使总时长等于{total_minutes}分钟），每个知识点都有对应活动，包含导入、发展、总结环节
+4. 评估方案：形成性评估和终结性评估，全面覆盖教学目标和知识点
+
+教学目标部分格式：
+{objectives_schema}
+
+知识点部分格式：
+{knowledge_schema}
+
+教学活动部分格式：
+{activities_schema}
+
+评估方案部分格式：
+{assessment_schema}
+
+请将四部分的顶层字段（o、kp、a、f、s、w）合并到同一个JSON对象中输出，不要输出字段说明。"""
+
+        schemas = dict(
+            hours=total_hours,
+            total_minutes=total_hours * MINUTES_PER_HOUR,
+            objectives_schema=OBJECTIVES_WIRE_SCHEMA,
+            knowledge_schema=KNOWLEDGE_WIRE_SCHEMA,
+            activities_schema=ACTIVITIES_WIRE_SCHEMA,
+            assessment_schema=ASSESSMENT_WIRE_SCHEMA
+        )
+        
+        # 教材超出上下文预算时压缩后发送（一次调用，不分块）
+        budget = content_budget(llm_config.model, system_prompt, template.format(content="", **schemas))
+        mode, parts = plan_textbook(textbook_content, budget, llm_config.model)
+        content_json = json.dumps(parts[0], indent=2, ensure_ascii=False)
+        prompt = template.format(content=content_json, **schemas)
+
+        print("\n=== 快速模式：生成完整教学大纲 ===")
+        print(f"教材发送方式: {mode}")
+        print("调用LLM生成完整大纲...")
+
+        # 调用LLM
+        response = chat_completion(
+            llm_config,
+            [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            stage="generate_plan",
+            temperature=0.7,
+            response_format={"type": "json_object"}
+        )
+
+        # 检查输出大小
+        content = response.choices[0].message.content
+        if getattr(response.choices[0], "finish_reason", None) == "length":
+            raise ValueError("合并输出被截断")
+        if isinstance(content, str) and len(content) > FAST_MODE_MAX_OUTPUT_CHARS:
+            raise ValueError(f"合并输出过大: {len(content)}字符")
+
+        # 解析响应
+        result = json.loads(content) if isinstance(content, str) else content
+        if not isinstance(result, dict):
+            raise ValueError(f"结果格式错误: {type(result)}")
+
+        # 拆分并展开各部分，复用各阶段的验证
+        objectives = expand_objectives(result)
+        check_objectives(objectives)
+
+        knowledge_points = expand_knowledge(result)
+        check_knowledge_points(knowledge_points)
+
+        activities = expand_activities(assign_activity_durations(result, total_hours * MINUTES_PER_HOUR))
+        check_activities(activities, total_hours)
+
+        # 权重与分片模式一样在本地归一化
+        assessment = merge_assessment_plans([expand_assessment(result)])
+        check_assessment(assessment)
+
+        print("完整大纲生成完成")
+        return {
+            "objectives": objectives,
+            "knowledge_points": knowledge_points,
+            "activities": activities,
+            "assessment": assessment
+        }
+
+    except Exception as e:
+        print(f"错误：快速模式生成失败 - {str(e)}")
+        raise LLMGenerationError(f"快速模式生成失败: {str(e)}")
@@ -0,0 +1,208 @@
+"""
+批量生成
+把大量教材的各阶段请求合并为JSONL批量任务：每一轮对所有未完成的课程运行状态图，已有结果的请求直接回放，
+新的请求写入下一批；导入结果后再运行一轮，课程即推进到下一阶段，直到全部完成
+
+用法：
+    python -m my_agent.batch add WORK_DIR 教材.pdf 16 [32 ...]
+    python -m my_agent.batch step WORK_DIR [--results 结果.jsonl]
+    python -m my_agent.batch submit 请求.jsonl
+    python -m my_agent.batch fetch BATCH_ID 结果.jsonl
+    python -m my_agent.batch fulfill 请求.jsonl 结果.jsonl
+"""
+import argparse
+import json
+import os
+from typing import Any, Dict, List, Optional, Union
+
+from my_agent.agent import TeachingAgent
+from my_agent.utils.batch import (
+    BatchSession, batch_scope, write_requests, load_results, fulfill_batch, BATCH_ENDPOINT
+)
+from my_agent.utils.prepare_cache import file_hash
+
+MANIFEST_FILE = "manifest.json"  # 课程列表和各课程状态
+RESULTS_FILE = "results.jsonl"  # 已导入的全部结果
+
+
+class BatchRunner:
+    """批量生成的工作目录，状态保存在文件中，可跨进程继续"""
+
+    def __init__(self, work_dir: str, agent: Optional[TeachingAgent] = None):
+        """
+        Args:
+            work_dir: 工作目录
+            agent: 教学代理，默认使用分阶段流程
+        """
+        self.work_dir = work_dir
+        self.agent = agent or TeachingAgent()
+        os.makedirs(work_dir, exist_ok=True)
+        manifest_path = os.path.join(work_dir, MANIFEST_FILE)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                self.manifest = json.load(f)
+        else:
+            self.manifest = {"round": 0, "courses": []}
+        results_path = os.path.join(work_dir, RESULTS_FILE)
+        self.results = load_results(results_path) if os.path.exists(results_path) else {}
+
+    def _save_manifest(self) -> None:
+        with open(os.path.join(self.work_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+
+    def add(self, pdf_path: str, total_hours: Union[int, List[int]]) -> str:
+        """
+        添加课程
+
+        Args:
+            pdf_path: 教材PDF路径
+            total_hours: 总课时数或多个课时版本
+
+        Returns:
+            str: 课程ID（文件哈希前缀加课时）
+        """
+        hours = list(total_hours) if isinstance(total_hours, (list, tuple)) else [total_hours]
+        course_id = f"{file_hash(pdf_path)[:12]}_{'-'.join(str(h) for h in hours)}"
+        if not any(course["id"] == course_id for course in self.manifest["courses"]):
+            self.manifest["courses"].append({
+                "id": course_id, "pdf_path": os.path.abspath(pdf_path), "total_hours": hours,
+                "status": "pending", "error": None
+            })
+            self._save_manifest()
+        return course_id
+
+    def ingest(self, results_path: str) -> int:
+        """
+        导入批量任务的结果文件
+
+        Returns:
+            int: 导入的结果数
+        """
+        results = load_results(results_path)
+        self.results.update(results)
+        with open(os.path.join(self.work_dir, RESULTS_FILE), "a", encoding="utf-8") as f:
+            for line in results.values():
+                f.write(json.dumps(line, ensure_ascii=False) + "\n")
+        return len(results)
+
+    def step(self) -> Optional[str]:
+        """
+        推进所有未完成的课程，并写出下一批请求
+
+        Returns:
+            Optional[str]: 下一批请求文件的路径，没有新请求时返回None
+        """
+        requests: Dict[str, Dict[str, Any]] = {}
+        for course in self.manifest["courses"]:
+            if course["status"] in ("done", "failed"):
+                continue
+            session = BatchSession(self.results)
+            with batch_scope(session):
+                try:
+                    hours = course["total_hours"]
+                    state = self.agent.run(course["pdf_path"], hours if len(hours) > 1 else hours[0])
+                except Exception as e:
+                    state = {"error": str(e)}
+            if session.pending:
+                course["status"] = "waiting"
+                requests.update(session.pending)
+            elif state.get("error"):
+                course["status"], course["error"] = "failed", state["error"]
+            else:
+                course["status"] = "done"
+
+        self.manifest["round"] += 1
+        self._save_manifest()
+        print(f"\n=== 批量第{self.manifest['round']}轮 ===")
+        print(", ".join(f"{status}: {count}" for status, count in self.status().items()))
+        if not requests:
+            return None
+        path = os.path.join(self.work_dir, f"requests_{self.manifest['round']:03d}.jsonl")
+        write_requests(path, list(requests.values()))
+        print(f"下一批请求: {len(requests)}条 -> {path}")
+        return path
+
+    def status(self) -> Dict[str, int]:
+        """各状态的课程数"""
+        counts: Dict[str, int] = {}
+        for course in self.manifest["courses"]:
+            counts[course["status"]] = counts.get(course["status"], 0) + 1
+        return counts
+
+
+def submit_batch(requests_path: str, client: Any = None) -> str:
+    """
+    上传请求文件并创建批量任务
+
+    Returns:
+        str: 批量任务ID
+    """
+    if client is None:
+        from my_agent.config import get_llm
+        client = get_llm().client
+    with open(requests_path, "rb") as f:
+        uploaded = client.files.create(file=f, purpose="batch")
+    batch = client.batches.create(input_file_id=uploaded.id, endpoint=BATCH_ENDPOINT, completion_window="24h",
+                                  metadata={"description": os.path.basename(requests_path)})
+    return batch.id
+
+
+def fetch_results(batch_id: str, results_path: str, client: Any = None) -> bool:
+    """
+    下载已完成批量任务的结果文件
+
+    Returns:
+        bool: 任务已完成并写出结果时为True，仍在进行时为False
+
+    Raises:
+        ValueError: 批量任务失败、过期或被取消
+    """
+    if client is None:
+        from my_agent.config import get_llm
+        client = get_llm().client
+    batch = client.batches.retrieve(batch_id)
+    if batch.status in ("failed", "expired", "cancelled"):
+        raise ValueError(f"批量任务{batch_id}状态为{batch.status}")
+    if batch.status != "completed":
+        return False
+    client.files.content(batch.output_file_id).write_to_file(results_path)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量生成教学大纲")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="添加课程")
+    add.add_argument("work_dir")
+    add.add_argument("pdf_path")
+    add.add_argument("total_hours", type=int, nargs="+")
+    step = commands.add_parser("step", help="导入结果并写出下一批请求")
+    step.add_argument("work_dir")
+    step.add_argument("--results", help="上一批的结果文件")
+    submit = commands.add_parser("submit", help="提交批量任务")
+    submit.add_argument("requests_path")
+    fetch = commands.add_parser("fetch", help="下载批量任务结果")
+    fetch.add_argument("batch_id")
+    fetch.add_argument("results_path")
+    fulfill = commands.add_parser("fulfill", help="在本地逐条完成请求文件")
+    fulfill.add_argument("requests_path")
+    fulfill.add_argument("results_path")
+    args = parser.parse_args()
+
+    if args.command == "add":
+        print(BatchRunner(args.work_dir).add(args.pdf_path, args.total_hours))
+    elif args.command == "step":
+        runner = BatchRunner(args.work_dir)
+        if args.results:
+            print(f"导入结果: {runner.ingest(args.results)}条")
+        runner.step()
+    elif args.command == "submit":
+        print(submit_batch(args.requests_path))
+    elif args.command == "fetch":
+        print("已完成" if fetch_results(args.batch_id, args.results_path) else "仍在进行")
+    elif args.command == "fulfill":
+        print(f"已完成: {fulfill_batch(args.requests_path, args.results_path)}条")
+
+
+if __name__ == "__main__":
+    main()
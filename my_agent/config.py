@@ -1,17 +1,81 @@
-<<<<<<< HEAD
 from dataclasses import dataclass
-from typing import Optional
+from typing import Optional, Dict, List
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# 并发调用LLM的最大线程数（分块生成活动等场景）
+MAX_CONCURRENT_LLM_CALLS = int(os.getenv("MAX_CONCURRENT_LLM_CALLS", "8"))
+
+# 默认的模型服务商：zhipu使用智谱SDK，其他名称为OpenAI兼容接口，配置见utils/providers.py
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "zhipu")
+
+# 单次运行的截止时间（秒），超过后取消所有进行中的调用；0表示不限制
+RUN_TIMEOUT = float(os.getenv("RUN_TIMEOUT", "1800"))
+
+# 各阶段使用的模型，按优先级排列，前一个超时或失败时自动换下一个
+# 可用环境变量覆盖，如 GENERATE_OBJECTIVES_MODELS=glm-4-air,glm-4-plus；
+# 写成"服务商:模型"可把单个阶段发往其他服务商，如 GENERATE_OBJECTIVES_MODELS=local:qwen2-7b-instruct,glm-4-flash
+DEFAULT_STAGE_MODELS: Dict[str, List[str]] = {
+    "generate_objectives": ["glm-4-flash", "glm-4-air"],
+    "design_objectives": ["glm-4-flash", "glm-4-air"],
+    "analyze_knowledge": ["glm-4-air", "glm-4-flash"],
+    "design_activities": ["glm-4-air", "glm-4-flash"],
+    "create_assessment": ["glm-4-air", "glm-4-flash"],
+    "generate_plan": ["glm-4-air", "glm-4-plus"],
+}
+
+# 各阶段单次调用的延迟预算（秒），超过即视为超时并换用下一个模型
+DEFAULT_STAGE_LATENCY_BUDGETS: Dict[str, float] = {
+    "generate_objectives": 30.0,
+    "design_objectives": 30.0,
+    "analyze_knowledge": 90.0,
+    "design_activities": 60.0,
+    "create_assessment": 60.0,
+    "generate_plan": 180.0,
+}
+DEFAULT_LATENCY_BUDGET = 120.0  # 未配置阶段的延迟预算（秒）
+
+def get_stage_models(stage: str, default: str) -> List[str]:
+    """
+    获取阶段的模型路由列表
+    
+    Args:
+        stage: 阶段名称
+        default: 未配置时使用的模型
+        
+    Returns:
+        List[str]: 按优先级排列的模型
+
+    Raises:
+        ValueError: 环境变量{STAGE}_MODELS中没有任何模型
+    """
+    override = os.getenv(f"{stage.upper()}_MODELS")
+    if override:
+        models = [model.strip() for model in override.split(",") if model.strip()]
+        if not models:
+            raise ValueError(f"{stage.upper()}_MODELS未配置任何模型: {override!r}")
+        return models
+    if LLM_PROVIDER != "zhipu":
+        # 默认路由都是智谱的模型，换用其他服务商时只用其默认模型
+        return [default]
+    return list(DEFAULT_STAGE_MODELS.get(stage, [default]))
+
+def get_stage_latency_budget(stage: str) -> float:
+    """获取阶段的延迟预算（秒），可用环境变量{STAGE}_LATENCY_BUDGET覆盖"""
+    override = os.getenv(f"{stage.upper()}_LATENCY_BUDGET")
+    if override:
+        return float(override)
+    return DEFAULT_STAGE_LATENCY_BUDGETS.get(stage, DEFAULT_LATENCY_BUDGET)
+
 @dataclass
 class LLMConfig:
     """LLM配置"""
     model: str
     client: any
     temperature: float = 0.7
+    provider: str = "zhipu"
     
 def get_llm() -> LLMConfig:
     """
@@ -20,89 +84,14 @@ def get_llm() -> LLMConfig:
     Returns:
         LLMConfig: 模型配置
     """
-    from zhipuai import ZhipuAI
-    client = ZhipuAI(api_key=os.getenv("ZHIPU_API_KEY"))
+    from my_agent.utils.providers import default_model, get_client
+    # 多个密钥时按负载选择，智谱的密钥从ZHIPU_API_KEYS（或ZHIPU_API_KEY）读取
+    client = get_client(LLM_PROVIDER)
     
-    # 统一使用glm-4-air
+    # 智谱统一使用glm-4-air，其他服务商使用{NAME}_MODEL
     return LLMConfig(
-        model="glm-4-air",
+        model=default_model(LLM_PROVIDER),
         client=client,
-        temperature=0.3
+        temperature=0.3,
+        provider=LLM_PROVIDER
     )
-=======
-from langchain_openai import ChatOpenAI
-from zhipuai import ZhipuAI
-import os
-import json
-from dotenv import load_dotenv
-from .utils.exceptions import LLMGenerationError
-
-# 加载环境变量
-load_dotenv()
-
-# API 配置
-ZHIPU_API_KEY = os.getenv("ZHIPU_API_KEY")
-DEFAULT_TEXT_MODEL = "glm-4-air"  # 文字版PDF使用的模型
-DEFAULT_VISION_MODEL = "glm-4v-flash"  # 图片版PDF使用的模型
-DEFAULT_TEMPERATURE = float(os.getenv("TEMPERATURE", "0.7"))
-
-def handle_api_error(error_code: str, error_message: str) -> str:
-    """处理API错误并返回用户友好的错误信息"""
-    error_messages = {
-        "1113": "API账户余额不足，请联系管理员充值",
-        "1111": "API调用频率超限，请稍后再试",
-        "1112": "API服务暂时不可用，请稍后再试",
-    }
-    return error_messages.get(error_code, f"API调用失败: {error_message}")
-
-# LLM 配置
-def get_llm(is_scanned: bool = False, temperature: float = DEFAULT_TEMPERATURE):
-    """
-    获取LLM客户端
-    
-    Args:
-        is_scanned: 是否为扫描版PDF
-        temperature: 温度参数
-    """
-    if not ZHIPU_API_KEY:
-        raise LLMGenerationError("未找到 ZHIPU_API_KEY 环境变量")
-        
-    # 创建基础客户端
-    client = ZhipuAI(api_key=ZHIPU_API_KEY)
-    
-    # 根据PDF类型选择模型
-    model = DEFAULT_VISION_MODEL if is_scanned else DEFAULT_TEXT_MODEL
-    
-    class ModelWrapper:
-        def __init__(self, client, model, temperature):
-            self.client = client
-            self.model = model
-            self.temperature = temperature
-            
-        def chat(self, messages):
-            """调用API进行对话"""
-            try:
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=messages,
-                    temperature=self.temperature
-                )
-                return response
-            except Exception as e:
-                # 解析错误信息
-                error_text = str(e)
-                if "error" in error_text:
-                    try:
-                        error_data = json.loads(error_text.split("error text ")[-1])
-                        error_code = error_data["error"]["code"]
-                        error_message = error_data["error"]["message"]
-                        friendly_message = handle_api_error(error_code, error_message)
-                        raise LLMGenerationError(friendly_message)
-                    except json.JSONDecodeError:
-                        # 如果JSON解析失败，抛出原始错误
-                        raise LLMGenerationError(f"API调用失败: {str(e)}")
-                # 如果不是JSON错误，抛出原始错误
-                raise LLMGenerationError(f"API调用失败: {str(e)}")
-    
-    return ModelWrapper(client, model, temperature)
->>>>>>> c4972e73ce82ab596751226cd0a07e233d3db998
@@ -0,0 +1,235 @@
+"""
+分阶段流水线
+批量生成时把CPU密集的PDF提取放在进程池中，网络密集的各阶段LLM调用放在线程中，两段之间用有界队列连接：
+生成跟不上时提取阶段阻塞等待（背压），提取结果不会在内存中堆积；API等待期间CPU继续提取后面的教材。
+结束时输出各阶段的利用率、等待输入和等待下游的时间
+
+用法：
+    python -m my_agent.pipeline 教材1.pdf 教材2.pdf ... --hours 16 [32 ...]
+        [--extract-workers 4] [--llm-workers 4] [--queue-size 4]
+"""
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from my_agent.agent import TeachingAgent
+from my_agent.utils.concurrency import llm_limiter
+from my_agent.utils.pdf_utils import extract_text_from_pdf
+
+PIPELINE_EXTRACT_WORKERS = int(os.getenv("PIPELINE_EXTRACT_WORKERS", str(os.cpu_count() or 1)))  # 提取进程数
+PIPELINE_LLM_WORKERS = int(os.getenv("PIPELINE_LLM_WORKERS", "4"))  # 同时生成的课程数（每门课程内部还会并发调用）
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "4"))  # 已提取待生成的教材上限，满时提取阶段等待
+METRICS_FILE = "pipeline_metrics.json"
+
+
+@dataclass
+class PipelineJob:
+    """流水线中的一门课程"""
+    pdf_path: str
+    total_hours: List[int]
+    state: Optional[Dict[str, Any]] = None  # 生成完成后的最终状态
+    error: Optional[str] = None
+    extract_seconds: float = 0.0
+    generate_seconds: float = 0.0
+
+
+class StageMetrics:
+    """单个阶段的处理数和时间分布，线程安全"""
+
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.failures = 0
+        self.busy = 0.0  # 处理耗时
+        self.idle = 0.0  # 等待上游输入
+        self.blocked = 0.0  # 下游队列已满时的等待
+        self._lock = threading.Lock()
+
+    def record(self, busy: float = 0.0, idle: float = 0.0, blocked: float = 0.0, done: bool = False,
+               failed: bool = False) -> None:
+        with self._lock:
+            self.busy += busy
+            self.idle += idle
+            self.blocked += blocked
+            self.items += done
+            self.failures += failed
+
+    def stats(self, elapsed: float) -> Dict[str, Any]:
+        """
+        阶段统计
+
+        Args:
+            elapsed: 流水线总耗时（秒）
+
+        Returns:
+            Dict[str, Any]: 利用率为处理耗时占全部工作线程（进程）时间的比例
+        """
+        with self._lock:
+            capacity = self.workers * elapsed
+            return {
+                "workers": self.workers,
+                "items": self.items,
+                "failures": self.failures,
+                "busy_seconds": round(self.busy, 3),
+                "idle_seconds": round(self.idle, 3),
+                "blocked_seconds": round(self.blocked, 3),
+                "utilisation": round(self.busy / capacity, 4) if capacity else 0.0
+            }
+
+
+def _extract(pdf_path: str) -> Tuple[Dict[str, Any], float]:
+    """在子进程中提取教材内容，返回内容和耗时"""
+    start = time.perf_counter()
+    content = extract_text_from_pdf(pdf_path)
+    return content, time.perf_counter() - start
+
+
+class StagedPipeline:
+    """进程池提取 + 线程生成的两段流水线"""
+
+    def __init__(self, extract_workers: int = PIPELINE_EXTRACT_WORKERS, llm_workers: int = PIPELINE_LLM_WORKERS,
+                 queue_size: int = PIPELINE_QUEUE_SIZE, agent_options: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            extract_workers: 提取进程数
+            llm_workers: 生成线程数
+            queue_size: 两段之间队列的容量
+            agent_options: 创建TeachingAgent的参数（fast_mode、summary_ratio）
+        """
+        self.extract_workers = max(1, extract_workers)
+        self.llm_workers = max(1, llm_workers)
+        self.queue_size = max(1, queue_size)
+        self.agent_options = agent_options or {}
+        self.max_queue_depth = 0
+
+    def _extract_stage(self, pool: ProcessPoolExecutor, jobs: "queue.Queue[Optional[PipelineJob]]",
+                       extracted: "queue.Queue[Optional[Tuple[PipelineJob, Dict[str, Any]]]]",
+                       metrics: StageMetrics) -> None:
+        while True:
+            wait_start = time.perf_counter()
+            job = jobs.get()
+            metrics.record(idle=time.perf_counter() - wait_start)
+            if job is None:
+                return
+            start = time.perf_counter()
+            try:
+                content, job.extract_seconds = pool.submit(_extract, job.pdf_path).result()
+            except Exception as e:
+                job.error = f"提取PDF内容失败: {str(e)}"
+                metrics.record(busy=time.perf_counter() - start, done=True, failed=True)
+                print(f"错误：{job.pdf_path} - {job.error}")
+                continue
+            metrics.record(busy=job.extract_seconds, done=True)
+            # 队列已满时阻塞，直到生成阶段取走一门课程
+            put_start = time.perf_counter()
+            extracted.put((job, content))
+            metrics.record(blocked=time.perf_counter() - put_start)
+            self.max_queue_depth = max(self.max_queue_depth, extracted.qsize())
+
+    def _generate_stage(self, extracted: "queue.Queue[Optional[Tuple[PipelineJob, Dict[str, Any]]]]",
+                        metrics: StageMetrics) -> None:
+        agent = TeachingAgent(**self.agent_options)
+        while True:
+            wait_start = time.perf_counter()
+            item = extracted.get()
+            metrics.record(idle=time.perf_counter() - wait_start)
+            if item is None:
+                return
+            job, content = item
+            start = time.perf_counter()
+            try:
+                job.state = agent.run(job.pdf_path, job.total_hours, textbook_content=content)
+                job.error = job.state.get("error")
+            except Exception as e:
+                job.error = str(e)
+            job.generate_seconds = time.perf_counter() - start
+            metrics.record(busy=job.generate_seconds, done=True, failed=job.error is not None)
+
+    def run(self, jobs: List[PipelineJob]) -> Dict[str, Any]:
+        """
+        运行流水线，直到所有课程完成或失败
+
+        Args:
+            jobs: 课程列表，结果写回各PipelineJob
+
+        Returns:
+            Dict[str, Any]: 总耗时、各阶段统计、队列峰值和结束时的自适应并发状态
+        """
+        pending: "queue.Queue[Optional[PipelineJob]]" = queue.Queue()
+        for job in jobs:
+            pending.put(job)
+        for _ in range(self.extract_workers):
+            pending.put(None)
+        extracted: "queue.Queue[Optional[Tuple[PipelineJob, Dict[str, Any]]]]" = queue.Queue(self.queue_size)
+        extract_metrics = StageMetrics("extract", self.extract_workers)
+        generate_metrics = StageMetrics("generate", self.llm_workers)
+
+        start = time.perf_counter()
+        generators = [threading.Thread(target=self._generate_stage, args=(extracted, generate_metrics), daemon=True)
+                      for _ in range(self.llm_workers)]
+        for thread in generators:
+            thread.start()
+        with ProcessPoolExecutor(max_workers=self.extract_workers) as pool:
+            # 每个提取进程对应一个分发线程，等待结果和向下游队列交付都在线程中进行
+            extractors = [threading.Thread(target=self._extract_stage, args=(pool, pending, extracted, extract_metrics),
+                                           daemon=True)
+                          for _ in range(self.extract_workers)]
+            for thread in extractors:
+                thread.start()
+            for thread in extractors:
+                thread.join()
+        for _ in generators:
+            extracted.put(None)
+        for thread in generators:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        return {
+            "seconds": round(elapsed, 3),
+            "jobs": len(jobs),
+            "failed": sum(job.error is not None for job in jobs),
+            "max_queue_depth": self.max_queue_depth,
+            "stages": {
+                "extract": extract_metrics.stats(elapsed),
+                "generate": generate_metrics.stats(elapsed)
+            },
+            "concurrency": llm_limiter.stats()
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分阶段流水线批量生成教学大纲")
+    parser.add_argument("pdf_paths", nargs="+", help="教材PDF")
+    parser.add_argument("--hours", type=int, nargs="+", required=True, help="总课时数，可传多个课时版本")
+    parser.add_argument("--extract-workers", type=int, default=PIPELINE_EXTRACT_WORKERS)
+    parser.add_argument("--llm-workers", type=int, default=PIPELINE_LLM_WORKERS)
+    parser.add_argument("--queue-size", type=int, default=PIPELINE_QUEUE_SIZE)
+    args = parser.parse_args()
+
+    jobs = [PipelineJob(pdf_path, args.hours) for pdf_path in args.pdf_paths]
+    pipeline = StagedPipeline(args.extract_workers, args.llm_workers, args.queue_size)
+    metrics = pipeline.run(jobs)
+
+    print("\n=== 流水线统计 ===")
+    print(f"课程{metrics['jobs']}门，失败{metrics['failed']}门，耗时{metrics['seconds']:.1f}秒，"
+          f"队列峰值{metrics['max_queue_depth']}")
+    for name, stage in metrics["stages"].items():
+        print(f"{name}: {stage['workers']}个工作者，处理{stage['items']}项，利用率{stage['utilisation']:.1%}，"
+              f"等待输入{stage['idle_seconds']:.1f}秒，等待下游{stage['blocked_seconds']:.1f}秒")
+    for job in jobs:
+        if job.error:
+            print(f"失败：{job.pdf_path} - {job.error}")
+    os.makedirs(os.path.join("my_agent", "output"), exist_ok=True)
+    with open(os.path.join("my_agent", "output", METRICS_FILE), "w", encoding="utf-8") as f:
+        json.dump(metrics, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
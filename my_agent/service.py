@@ -0,0 +1,246 @@
+"""
+教学大纲任务服务
+常驻的本地HTTP服务：上传教材后按优先级通道排队（interactive先于bulk），相同教材和课时的任务只生成一次；
+进度和结果保存在SQLite工作队列中，服务重启后仍可查询，未完成的任务在租约到期后继续。
+模型客户端和编译好的状态图在启动时创建并在请求间复用，单个任务没有启动开销
+
+接口：
+    POST /jobs?hours=16,32&lane=interactive&name=教材名   请求体为PDF文件，返回任务ID
+    GET  /jobs/{任务ID}                                   状态和已完成的阶段
+    GET  /jobs/{任务ID}/result                            生成结果
+    GET  /stats                                           队列和模型调用统计
+
+用法：
+    python -m my_agent.service [--host 127.0.0.1] [--port 8000] [--store 目录]
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from my_agent.config import get_llm
+from my_agent.utils.circuit_breaker import breaker_stats
+from my_agent.utils.concurrency import llm_limiter
+from my_agent.utils.llm_metrics import llm_metrics
+from my_agent.utils.singleflight import llm_singleflight
+from my_agent.utils.token_utils import token_usage_log
+from my_agent.work_queue import (
+    DONE, FAILED, INTERACTIVE, LANES, WORK_POLL_SECONDS, QueueWorker, SQLiteWorkQueue, job_key
+)
+
+SERVICE_DIR = os.getenv("SERVICE_DIR", os.path.join("my_agent", "output", "service"))  # 任务库和上传文件的目录
+SERVICE_WORKERS = int(os.getenv("SERVICE_WORKERS", "4"))  # 按优先级领取所有通道任务的工作线程数
+# 批量任务积压时交互任务仍有专用线程，不必排在批量任务之后
+SERVICE_INTERACTIVE_WORKERS = int(os.getenv("SERVICE_INTERACTIVE_WORKERS", "1"))  # 只处理交互任务的工作线程数
+SERVICE_MAX_UPLOAD_MB = float(os.getenv("SERVICE_MAX_UPLOAD_MB", "200"))  # 上传文件大小上限
+STORE_FILE = "jobs.db"
+UPLOAD_DIR = "uploads"
+
+
+class JobService:
+    """任务服务：保存上传的教材、入队去重，并由常驻工作线程处理"""
+
+    def __init__(self, store_dir: str = SERVICE_DIR, workers: int = SERVICE_WORKERS,
+                 interactive_workers: int = SERVICE_INTERACTIVE_WORKERS,
+                 agent_options: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            store_dir: 任务库和上传文件的目录
+            workers: 领取所有通道任务的工作线程数
+            interactive_workers: 只领取交互任务的工作线程数
+            agent_options: 创建TeachingAgent的参数（fast_mode、summary_ratio）；各工作线程不保存调用统计，由/stats提供
+        """
+        self.upload_dir = os.path.join(store_dir, UPLOAD_DIR)
+        os.makedirs(self.upload_dir, exist_ok=True)
+        self.queue = SQLiteWorkQueue(os.path.join(store_dir, STORE_FILE))
+        self._stop = threading.Event()
+        self._pending = threading.Condition()  # 有新任务时唤醒空闲的工作线程
+
+        # 预热：启动时创建模型客户端和各工作线程的状态图，之后的任务直接复用
+        get_llm()
+        lanes: List[Optional[List[int]]] = [None] * max(0, workers) + [[INTERACTIVE]] * max(0, interactive_workers)
+        agent_options = {"save_metrics": False, **(agent_options or {})}
+        self._workers = [(QueueWorker(self.queue, agent_options=agent_options), priorities) for priorities in lanes]
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> None:
+        """启动工作线程"""
+        for worker, priorities in self._workers:
+            thread = threading.Thread(target=self._work, args=(worker, priorities), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        print(f"任务服务已启动：{len(self._workers)}个工作线程，任务库{self.queue.path}")
+
+    def stop(self) -> None:
+        """停止领取新任务；进行中的任务在租约到期后由重启的服务继续"""
+        self._stop.set()
+        with self._pending:
+            self._pending.notify_all()
+
+    def _work(self, worker: QueueWorker, priorities: Optional[List[int]]) -> None:
+        while not self._stop.is_set():
+            item = self.queue.claim(worker.worker_id, worker.lease_seconds, priorities)
+            if item is None:
+                with self._pending:
+                    self._pending.wait(WORK_POLL_SECONDS)
+                continue
+            try:
+                worker.process(item)
+            except Exception as e:
+                # 队列不可用等意外错误不应让工作线程退出，任务在租约到期后会被回收
+                print(f"错误：工作线程{worker.worker_id}处理任务{item.job_id}失败 - {str(e)}")
+
+    def submit(self, data: bytes, total_hours: List[int], lane: str = "interactive",
+               name: Optional[str] = None) -> Tuple[Dict[str, Any], bool]:
+        """
+        保存上传的教材并入队
+
+        Args:
+            data: PDF文件内容
+            total_hours: 课时版本
+            lane: 优先级通道（interactive或bulk）
+            name: 课程名称，作为输出的标题
+
+        Returns:
+            Tuple[Dict[str, Any], bool]: 任务状态，以及是否与已有任务重复
+
+        Raises:
+            ValueError: 文件不是PDF、课时或通道无效
+        """
+        if not data.startswith(b"%PDF"):
+            raise ValueError("上传的文件不是PDF")
+        # 课时顺序和重复不影响结果，规范化后hours=32,16与hours=16,32对应同一任务
+        total_hours = sorted(set(total_hours))
+        if not total_hours or any(hours <= 0 or hours % 4 != 0 for hours in total_hours):
+            raise ValueError(f"总课时无效: {total_hours}（须为4的正整数倍）")
+        if lane not in LANES:
+            raise ValueError(f"未知的优先级通道: {lane}（可选{', '.join(LANES)}）")
+
+        digest = hashlib.sha256(data).hexdigest()
+        existing = self.queue.status(job_key(digest, total_hours))
+        # 文件名即课程标题；同一内容只保存一份，沿用首次上传时的名称
+        directory = os.path.join(self.upload_dir, digest[:16])
+        os.makedirs(directory, exist_ok=True)
+        saved = sorted(f for f in os.listdir(directory) if f.endswith(".pdf"))
+        if saved:
+            pdf_path = os.path.join(directory, saved[0])
+        else:
+            title = os.path.splitext(os.path.basename(name or ""))[0] or "未命名课程"
+            pdf_path = os.path.join(directory, f"{title}.pdf")
+            with open(pdf_path, "wb") as f:
+                f.write(data)
+
+        job_id = self.queue.enqueue(pdf_path, total_hours, LANES[lane])
+        with self._pending:
+            self._pending.notify_all()
+        duplicate = existing is not None and existing["status"] != FAILED
+        return self.queue.status(job_id), duplicate
+
+    def stats(self) -> Dict[str, Any]:
+        """队列、模型调用、自适应并发、请求合并和熔断器的统计"""
+        models = llm_metrics.summary()
+        return {
+            "jobs": self.queue.stats(),
+            "workers": len(self._workers),
+            "models": {key: value for key, value in models.items() if key != "routes"},
+            "token_estimates": token_usage_log.summary(),
+            "concurrency": llm_limiter.stats(),
+            "singleflight": llm_singleflight.stats(),
+            "circuit_breakers": breaker_stats()
+        }
+
+
+class JobRequestHandler(BaseHTTPRequestHandler):
+    """任务服务的HTTP接口"""
+
+    server_version = "TeachingJobService/1.0"
+
+    @property
+    def service(self) -> JobService:
+        return self.server.service
+
+    def _send(self, status: int, body: Dict[str, Any]) -> None:
+        payload = json.dumps(body, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self) -> None:
+        url = urlparse(self.path)
+        if url.path != "/jobs":
+            self._send(404, {"error": f"未知的接口: {url.path}"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if length <= 0:
+            self._send(400, {"error": "请求体为空，请上传PDF文件"})
+            return
+        if length > SERVICE_MAX_UPLOAD_MB * 1024 * 1024:
+            self._send(413, {"error": f"文件超过{SERVICE_MAX_UPLOAD_MB:g}MB"})
+            return
+        query = parse_qs(url.query)
+        try:
+            total_hours = [int(hours) for value in query.get("hours", []) for hours in value.split(",") if hours]
+            job, duplicate = self.service.submit(self.rfile.read(length), total_hours,
+                                                 query.get("lane", ["interactive"])[0], query.get("name", [None])[0])
+        except ValueError as e:
+            self._send(400, {"error": str(e)})
+            return
+        self._send(200 if duplicate else 202, {**job, "duplicate": duplicate})
+
+    def do_GET(self) -> None:
+        parts = [part for part in urlparse(self.path).path.split("/") if part]
+        if parts == ["stats"]:
+            self._send(200, self.service.stats())
+            return
+        if len(parts) not in (2, 3) or parts[0] != "jobs" or (len(parts) == 3 and parts[2] != "result"):
+            self._send(404, {"error": f"未知的接口: {self.path}"})
+            return
+        job = self.service.queue.status(parts[1])
+        if job is None:
+            self._send(404, {"error": f"任务不存在: {parts[1]}"})
+        elif len(parts) == 2:
+            self._send(200, job)
+        elif job["status"] != DONE:
+            self._send(409, {**job, "error": job["error"] if job["status"] == FAILED else "任务尚未完成"})
+        else:
+            self._send(200, {"job_id": job["job_id"], "result": self.service.queue.result(job["job_id"])})
+
+
+def create_server(host: str, port: int, service: JobService) -> ThreadingHTTPServer:
+    """创建绑定到任务服务的HTTP服务器"""
+    server = ThreadingHTTPServer((host, port), JobRequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="教学大纲任务服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--store", default=SERVICE_DIR, help="任务库和上传文件的目录")
+    parser.add_argument("--workers", type=int, default=SERVICE_WORKERS)
+    parser.add_argument("--interactive-workers", type=int, default=SERVICE_INTERACTIVE_WORKERS)
+    args = parser.parse_args()
+
+    service = JobService(args.store, args.workers, args.interactive_workers)
+    service.start()
+    server = create_server(args.host, args.port, service)
+    print(f"监听 http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n正在停止任务服务...")
+    finally:
+        service.stop()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
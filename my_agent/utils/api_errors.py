@@ -0,0 +1,55 @@
+"""
+API错误码解析模块
+从SDK异常中取出智谱API的业务错误码（OpenAI兼容接口按HTTP状态码），供密钥池、并发控制和熔断器判断错误类型
+"""
+import re
+from typing import Optional
+
+BALANCE_ERROR_CODES = {"1113"}  # 账户余额不足
+RATE_LIMIT_ERROR_CODES = {"1111", "1302", "1303", "1305"}  # 调用频率或并发超限
+UNAVAILABLE_ERROR_CODES = {"1112", "500", "502", "503", "504"}  # 服务暂时不可用
+
+_CODE_PATTERN = re.compile(r"[\"']code[\"']\s*:\s*[\"']?(\d+)")
+
+
+def api_error_code(error: BaseException) -> Optional[str]:
+    """
+    解析异常中的API错误码
+
+    依次尝试响应体中的error.code、异常文本中的"code"字段和HTTP状态码；OpenAI兼容接口的error.code为
+    rate_limit_exceeded等文字或为空，此时使用HTTP状态码。
+
+    Args:
+        error: 调用抛出的异常
+
+    Returns:
+        Optional[str]: 错误码，无法识别时返回None
+    """
+    response = getattr(error, "response", None)
+    try:
+        code = str(response.json()["error"]["code"])
+        if code.isdigit():
+            return code
+    except Exception:
+        pass
+    match = _CODE_PATTERN.search(str(error))
+    if match:
+        return match.group(1)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    return str(status) if status else None
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    """是否为频率或并发超限（含HTTP 429）"""
+    code = api_error_code(error)
+    return code in RATE_LIMIT_ERROR_CODES or code == "429"
+
+
+def is_balance_error(error: BaseException) -> bool:
+    """是否为账户余额不足"""
+    return api_error_code(error) in BALANCE_ERROR_CODES
+
+
+def is_unavailable(error: BaseException) -> bool:
+    """是否为服务暂时不可用"""
+    return api_error_code(error) in UNAVAILABLE_ERROR_CODES
@@ -0,0 +1,168 @@
+"""
+批量请求模块
+批量模式下chat_completion不直接调用模型：已有结果的请求从结果文件回放，没有结果的请求记录下来，
+由批量任务统一以JSONL提交；自定义ID由请求内容哈希得到，同一请求在各轮之间保持不变
+"""
+import contextvars
+import hashlib
+import json
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional
+
+from my_agent.config import MAX_CONCURRENT_LLM_CALLS
+from my_agent.utils.exceptions import BatchPendingError, LLMGenerationError
+
+BATCH_ENDPOINT = "/v4/chat/completions"  # 批量任务的接口路径
+
+
+def custom_id(stage: str, body: Dict[str, Any]) -> str:
+    """
+    计算请求的稳定自定义ID
+
+    Args:
+        stage: 阶段名称
+        body: 请求体（模型、消息和生成参数）
+
+    Returns:
+        str: 阶段名加请求体的SHA-256前缀
+    """
+    digest = hashlib.sha256(json.dumps(body, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+    return f"{stage}-{digest[:32]}"
+
+
+def _to_response(body: Dict[str, Any]) -> Any:
+    """将结果文件中的响应体转为与SDK响应相同的属性访问形式"""
+    return json.loads(json.dumps(body), object_hook=lambda d: SimpleNamespace(**d))
+
+
+class BatchSession:
+    """一门课程在批量模式下的请求回放与记录"""
+
+    def __init__(self, results: Dict[str, Dict[str, Any]]):
+        """
+        Args:
+            results: 已取得的结果，自定义ID到结果行的映射（各课程共享）
+        """
+        self.results = results
+        self.pending: Dict[str, Dict[str, Any]] = {}  # 本轮需要提交的请求
+        self._lock = threading.Lock()
+
+    def complete(self, stage: str, body: Dict[str, Any]) -> Any:
+        """
+        回放请求的结果
+
+        Args:
+            stage: 阶段名称
+            body: 请求体
+
+        Returns:
+            Any: 模型响应
+
+        Raises:
+            BatchPendingError: 请求尚无结果，已记录待提交
+            LLMGenerationError: 批量任务中该请求失败
+        """
+        request_id = custom_id(stage, body)
+        result = self.results.get(request_id)
+        if result is None:
+            with self._lock:
+                self.pending[request_id] = {"custom_id": request_id, "method": "POST", "url": BATCH_ENDPOINT,
+                                            "body": body}
+            raise BatchPendingError(f"{stage}请求已加入批量任务: {request_id}")
+        response = result.get("response") or {}
+        if result.get("error") or response.get("status_code", 200) != 200:
+            raise LLMGenerationError(f"批量请求{request_id}失败: {result.get('error') or response.get('body')}")
+        return _to_response(response.get("body", {}))
+
+
+_current_session: contextvars.ContextVar[Optional[BatchSession]] = contextvars.ContextVar("batch_session",
+                                                                                          default=None)
+
+
+def current_session() -> Optional[BatchSession]:
+    """当前的批量会话，非批量模式时返回None"""
+    return _current_session.get()
+
+
+@contextmanager
+def batch_scope(session: BatchSession) -> Iterator[BatchSession]:
+    """在上下文中启用批量模式"""
+    reset = _current_session.set(session)
+    try:
+        yield session
+    finally:
+        _current_session.reset(reset)
+
+
+def write_requests(path: str, requests: List[Dict[str, Any]]) -> None:
+    """将请求写为批量任务的JSONL文件"""
+    with open(path, "w", encoding="utf-8") as f:
+        for request in requests:
+            f.write(json.dumps(request, ensure_ascii=False) + "\n")
+
+
+def read_jsonl(path: str) -> List[Dict[str, Any]]:
+    """读取JSONL文件（跳过空行）"""
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def load_results(path: str) -> Dict[str, Dict[str, Any]]:
+    """
+    读取批量任务的结果文件
+
+    Returns:
+        Dict[str, Dict[str, Any]]: 自定义ID到结果行的映射
+    """
+    return {line["custom_id"]: line for line in read_jsonl(path) if line.get("custom_id")}
+
+
+def fulfill_batch(requests_path: str, results_path: str, client: Any = None,
+                  max_workers: int = MAX_CONCURRENT_LLM_CALLS) -> int:
+    """
+    在本地逐条完成批量请求，写出与批量任务格式相同的结果文件
+
+    用于不经批量接口的小规模运行和离线测试（传入替身客户端即可完全离线）。
+
+    Args:
+        requests_path: 请求JSONL文件
+        results_path: 结果JSONL文件
+        client: 提供chat.completions.create的客户端，默认使用配置的模型客户端
+        max_workers: 并发数
+
+    Returns:
+        int: 完成的请求数
+    """
+    if client is None:
+        from my_agent.config import get_llm
+        client = get_llm().client
+    requests = read_jsonl(requests_path)
+
+    def fulfill(request: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            response = client.chat.completions.create(**request["body"])
+            choice = response.choices[0]
+            usage = getattr(response, "usage", None)
+            body = {
+                "choices": [{
+                    "index": 0,
+                    "finish_reason": getattr(choice, "finish_reason", "stop"),
+                    "message": {"role": "assistant", "content": choice.message.content}
+                }],
+                "usage": {
+                    "prompt_tokens": getattr(usage, "prompt_tokens", None),
+                    "completion_tokens": getattr(usage, "completion_tokens", None),
+                    "total_tokens": getattr(usage, "total_tokens", None)
+                }
+            }
+            return {"custom_id": request["custom_id"], "response": {"status_code": 200, "body": body}}
+        except Exception as e:
+            return {"custom_id": request["custom_id"], "error": {"message": str(e)}}
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        results = list(executor.map(fulfill, requests))
+    write_requests(results_path, results)
+    return len(results)
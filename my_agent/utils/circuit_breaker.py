@@ -0,0 +1,162 @@
+"""
+熔断器模块
+服务不可用的错误连续达到阈值后熔断：熔断期间的请求直接失败或挂起等待；冷却后放行少量试探请求，
+试探成功即恢复并唤醒挂起的请求
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List
+
+from my_agent.utils.api_errors import is_unavailable
+from my_agent.utils.deadline import check_cancelled, on_cancel
+from my_agent.utils.exceptions import CircuitOpenError
+
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))  # 连续多少次服务不可用后熔断
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))  # 熔断后多久放行试探请求
+CIRCUIT_HALF_OPEN_PROBES = int(os.getenv("CIRCUIT_HALF_OPEN_PROBES", "1"))  # 同时进行的试探请求数
+CIRCUIT_OPEN_MODE = os.getenv("CIRCUIT_OPEN_MODE", "park")  # 熔断期间的处理：park挂起等待，fail直接失败
+WAIT_POLL_SECONDS = 0.5  # 挂起时检查运行是否已取消的间隔
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+def is_outage(error: BaseException) -> bool:
+    """是否为服务故障：服务不可用的错误码、连接失败或超时（限流、余额、参数等错误说明服务仍在响应）"""
+    name = type(error).__name__.lower()
+    return (is_unavailable(error) or "connection" in name or "timeout" in name
+            or isinstance(error, (ConnectionError, TimeoutError)))
+
+
+class CircuitBreaker:
+    """单个服务商的熔断器，线程安全"""
+
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 reset_seconds: float = CIRCUIT_RESET_SECONDS, half_open_probes: int = CIRCUIT_HALF_OPEN_PROBES,
+                 open_mode: str = CIRCUIT_OPEN_MODE):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.half_open_probes = half_open_probes
+        self.open_mode = open_mode
+        self.state = CLOSED
+        self.failures = 0  # 连续的服务故障数
+        self.opened_at = 0.0
+        self.probes = 0  # 进行中的试探请求数
+        self.parked = 0  # 当前挂起等待的请求数
+        self.opens = 0
+        self.fast_failures = 0
+        self.parked_total = 0
+        self._condition = threading.Condition()
+
+    def _before(self) -> bool:
+        """请求前检查熔断状态，返回本次请求是否为试探请求"""
+        with self._condition:
+            parked = False
+            try:
+                while True:
+                    if self.state == OPEN and time.monotonic() >= self.opened_at + self.reset_seconds:
+                        self.state = HALF_OPEN
+                    if self.state == CLOSED:
+                        return False
+                    if self.state == HALF_OPEN and self.probes < self.half_open_probes:
+                        self.probes += 1
+                        return True
+                    if self.open_mode == "fail":
+                        self.fast_failures += 1
+                        raise CircuitOpenError(f"{self.name}服务熔断中，请稍后再试")
+                    if not parked:
+                        parked = True
+                        self.parked += 1
+                        self.parked_total += 1
+                    self._condition.wait(WAIT_POLL_SECONDS)
+                    check_cancelled()
+            finally:
+                if parked:
+                    self.parked -= 1
+
+    def _release_probe(self, probe: List[bool]) -> None:
+        """归还试探名额（只归还一次），调用方需持有锁"""
+        if probe:
+            probe.clear()
+            self.probes -= 1
+            self._condition.notify_all()
+
+    def _abandon(self, probe: List[bool]) -> None:
+        """运行被取消、试探请求被放弃时立即归还试探名额，由下一个请求继续试探"""
+        with self._condition:
+            self._release_probe(probe)
+
+    def _after(self, probe: List[bool], error: BaseException = None) -> None:
+        """请求结束后更新熔断状态"""
+        with self._condition:
+            self._release_probe(probe)
+            if error is not None and is_outage(error):
+                self.failures += 1
+                if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                    self.state = OPEN
+                    self.opened_at = time.monotonic()
+                    self.opens += 1
+                    print(f"警告：{self.name}服务连续{self.failures}次不可用，熔断{self.reset_seconds:g}秒")
+                return
+            if error is not None:
+                # 其他错误不能说明服务已恢复：关闭状态下清零连续故障数，试探失败时保持半开（名额已归还），由下一个试探请求判断
+                if self.state == CLOSED:
+                    self.failures = 0
+                return
+            self.failures = 0
+            if self.state != CLOSED:
+                self.state = CLOSED
+                print(f"{self.name}服务已恢复，继续{self.parked}个挂起的请求")
+                self._condition.notify_all()
+
+    @contextmanager
+    def guard(self) -> Iterator[None]:
+        """
+        在熔断器保护下执行一次请求
+
+        Raises:
+            CircuitOpenError: 熔断中且处理方式为fail
+            RunCancelledError: 挂起期间运行被取消
+        """
+        probe = [True] if self._before() else []  # 试探名额只归还一次
+        if probe:
+            on_cancel(lambda: self._abandon(probe))
+        try:
+            yield
+        except BaseException as e:
+            self._after(probe, e)
+            raise
+        self._after(probe)
+
+    def stats(self) -> Dict[str, Any]:
+        """熔断状态和统计"""
+        with self._condition:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "opens": self.opens,
+                "parked": self.parked,
+                "parked_total": self.parked_total,
+                "fast_failures": self.fast_failures
+            }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """获取服务商的熔断器（同名共享）"""
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+
+def breaker_stats() -> Dict[str, Dict[str, Any]]:
+    """所有熔断器的状态"""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.stats() for breaker in breakers}
@@ -0,0 +1,368 @@
+"""
+紧凑输出格式模块
+LLM按短键/位置数组输出（减少补全token），本地再展开为save_lesson_plan_to_md使用的完整结构
+"""
+from typing import Dict, Any, List
+
+# 难度/重要性枚举编码
+DIFFICULTY_LEVELS = ["容易", "中等", "困难"]
+IMPORTANCE_LEVELS = ["一般", "重要", "核心"]
+
+# 教学过程环节顺序（位置数组按此顺序展开）
+PHASE_NAMES = ["导入环节", "发展环节", "总结环节"]
+
+# 课时分配字段顺序，与活动类型编码一一对应
+TIME_ALLOCATION_KEYS = ["knowledge", "skill", "practice", "discussion", "assessment"]
+ACTIVITY_TYPES = ["知识讲解", "技能训练", "实践活动", "讨论交流", "评估考核"]
+
+# 评分等级顺序
+GRADE_LEVELS = ["优秀", "良好", "及格", "不及格"]
+
+OBJECTIVES_WIRE_SCHEMA = """{
+    "o": {
+        "k": [["层次(记忆/理解/应用/分析/评价/创造)", "目标描述", "达成标准"]],
+        "a": [["层次(模仿/操作/熟练/创新)", "目标描述", "达成标准"]],
+        "e": [["层次(感知/响应/形成/内化)", "目标描述", "达成标准"]]
+    }
+}
+字段说明：o=教学目标，k=知识目标，a=能力目标，e=情感目标"""
+
+KNOWLEDGE_WIRE_SCHEMA = """{
+    "kp": {
+        "b": [["知识点名称", "知识点内容", 难度编码, 重要性编码, ["前置知识点"], ["对应的教学目标"], "教学建议"]],
+        "a": [["知识点名称", "知识点内容", 难度编码, 重要性编码, ["前置知识点"], ["对应的教学目标"], "教学建议"]],
+        "k": ["重点1", "重点2"],
+        "d": ["难点1", "难点2"]
+    }
+}
+字段说明：kp=知识点，b=基础知识点，a=高级知识点，k=教学重点，d=教学难点
+难度编码：0=容易，1=中等，2=困难；重要性编码：0=一般，1=重要，2=核心"""
+
+ACTIVITIES_WIRE_SCHEMA = """{
+    "a": [
+        {
+            "t": "活动标题",
+            "w": 相对权重（1-10，表示该活动所需时间的多少）,
+            "y": 活动类型编码,
+            "f": "教学重点",
+            "m": "教学方法",
+            "p": [
+                ["导入环节内容", 环节时长占比, ["具体活动"], ["教学材料"]],
+                ["发展环节内容", 环节时长占比, ["具体活动"], ["教学材料"]],
+                ["总结环节内容", 环节时长占比, ["具体活动"], ["教学材料"]]
+            ],
+            "h": "设计亮点",
+            "e": "预期效果",
+            "q": "可能问题",
+            "c": "对应章节"
+        }
+    ]
+}
+字段说明：a=活动列表，p=教学过程（依次为导入、发展、总结环节）
+活动类型编码：0=知识讲解，1=技能训练，2=实践活动，3=讨论交流，4=评估考核
+活动时长和课时分配由系统根据权重自动计算，不需要输出"""
+
+ASSESSMENT_WIRE_SCHEMA = """{
+    "f": [
+        {
+            "ty": "评估类型",
+            "n": "评估名称",
+            "ds": "评估描述",
+            "ob": ["对应的教学目标"],
+            "kp": ["对应的知识点"],
+            "cr": ["优秀标准", "良好标准", "及格标准", "不及格标准"],
+            "w": "占总成绩的权重",
+            "tm": "实施时间",
+            "tl": ["评估工具"],
+            "fb": "反馈方式"
+        }
+    ],
+    "s": [与f结构相同],
+    "w": ["形成性评估总权重", "终结性评估总权重"]
+}
+字段说明：f=形成性评估，s=终结性评估，w=总权重"""
+
+
+def _decode_level(value: Any, levels: List[str]) -> str:
+    """将枚举编码还原为文字，已是文字时原样返回"""
+    if isinstance(value, bool):
+        return str(value)
+    if isinstance(value, (int, float)) and 0 <= int(value) < len(levels):
+        return levels[int(value)]
+    if isinstance(value, str) and value.strip().isdigit() and int(value) < len(levels):
+        return levels[int(value)]
+    return str(value)
+
+
+def _as_list(value: Any) -> List[Any]:
+    """保证返回列表"""
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return value
+    return [value]
+
+
+def _as_text(value: Any) -> str:
+    """保证返回字符串"""
+    if value is None:
+        return ""
+    return value if isinstance(value, str) else str(value)
+
+
+def expand_objectives(wire: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    展开紧凑格式的教学目标
+
+    Args:
+        wire: LLM输出的紧凑格式，如{"o": {"k": [[层次, 描述, 标准]], ...}}
+
+    Returns:
+        Dict[str, Any]: {"objectives": {"knowledge": [...], "ability": [...], "emotion": [...]}}
+    """
+    if "objectives" in wire:  # 模型直接输出了完整格式
+        return wire
+
+    compact = wire.get("o", {})
+    objectives = {}
+    for short_key, field in [("k", "knowledge"), ("a", "ability"), ("e", "emotion")]:
+        items = []
+        for row in _as_list(compact.get(short_key)):
+            if isinstance(row, dict):
+                items.append(row)
+                continue
+            row = list(row) + [""] * (3 - len(row))
+            items.append({
+                "level": _as_text(row[0]),
+                "description": _as_text(row[1]),
+                "evaluation": _as_text(row[2])
+            })
+        objectives[field] = items
+    return {"objectives": objectives}
+
+
+def _expand_point(row: Any) -> Dict[str, Any]:
+    """展开单个知识点"""
+    if isinstance(row, dict):
+        return row
+    row = list(row) + [None] * (7 - len(row))
+    return {
+        "name": _as_text(row[0]),
+        "content": _as_text(row[1]),
+        "difficulty": _decode_level(row[2], DIFFICULTY_LEVELS),
+        "importance": _decode_level(row[3], IMPORTANCE_LEVELS),
+        "prerequisites": [_as_text(p) for p in _as_list(row[4])],
+        "objectives": [_as_text(o) for o in _as_list(row[5])],
+        "teaching_suggestions": _as_text(row[6])
+    }
+
+
+def expand_knowledge(wire: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    展开紧凑格式的知识点分析
+
+    Args:
+        wire: LLM输出的紧凑格式，如{"kp": {"b": [[...]], "a": [[...]], "k": [...], "d": [...]}}
+
+    Returns:
+        Dict[str, Any]: {"knowledge_points": {"basic", "advanced", "key_points", "difficult_points"}}
+    """
+    if "knowledge_points" in wire:
+        return wire
+
+    compact = wire.get("kp", {})
+    return {
+        "knowledge_points": {
+            "basic": [_expand_point(row) for row in _as_list(compact.get("b"))],
+            "advanced": [_expand_point(row) for row in _as_list(compact.get("a"))],
+            "key_points": [_as_text(p) for p in _as_list(compact.get("k"))],
+            "difficult_points": [_as_text(p) for p in _as_list(compact.get("d"))]
+        }
+    }
+
+
+def _expand_phases(phases: Any) -> Dict[str, Any]:
+    """展开教学过程的位置数组"""
+    if isinstance(phases, dict):
+        return phases
+
+    process = {}
+    for name, row in zip(PHASE_NAMES, _as_list(phases)):
+        if isinstance(row, dict):
+            process[name] = row
+            continue
+        row = list(row) + [None] * (4 - len(row))
+        process[name] = {
+            "content": _as_text(row[0]),
+            "duration": _as_text(row[1]),
+            "activities": [_as_text(a) for a in _as_list(row[2])],
+            "materials": [_as_text(m) for m in _as_list(row[3])]
+        }
+    return process
+
+
+def expand_activity(item: Dict[str, Any]) -> Dict[str, Any]:
+    """展开单个活动，返回{"activity": {...}}"""
+    if "activity" in item:
+        return item
+
+    activity = {
+        "title": _as_text(item.get("t")),
+        "duration": _as_text(item.get("d")),
+        "教学重点": _as_text(item.get("f")),
+        "教学方法": _as_text(item.get("m")),
+        "教学过程": _expand_phases(item.get("p", [])),
+        "设计亮点": _as_text(item.get("h")),
+        "预期效果": _as_text(item.get("e")),
+        "可能问题": _as_text(item.get("q")),
+        "对应章节": _as_text(item.get("c"))
+    }
+    if "y" in item:
+        activity["活动类型"] = _decode_level(item["y"], ACTIVITY_TYPES)
+    return {"activity": activity}
+
+
+def expand_activities(wire: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    展开紧凑格式的教学活动
+
+    Args:
+        wire: LLM输出的紧凑格式，如{"ta": [5个课时数], "a": [{"t": ..., "p": [[...]]}]}
+
+    Returns:
+        Dict[str, Any]: {"time_allocation": {...}, "activities": [{"activity": {...}}]}
+    """
+    if "activities" in wire and "time_allocation" in wire:
+        return wire
+
+    allocation = wire.get("ta", [])
+    if isinstance(allocation, dict):
+        time_allocation = allocation
+    else:
+        allocation = list(_as_list(allocation)) + [0] * (len(TIME_ALLOCATION_KEYS) - len(_as_list(allocation)))
+        time_allocation = dict(zip(TIME_ALLOCATION_KEYS, allocation))
+
+    return {
+        "time_allocation": time_allocation,
+        "activities": [expand_activity(item) for item in _as_list(wire.get("a"))]
+    }
+
+
+def _expand_assessment_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """展开单个评估项"""
+    if "name" in item and "criteria" in item:
+        return item
+
+    criteria = item.get("cr", [])
+    if not isinstance(criteria, dict):
+        criteria = list(_as_list(criteria)) + [""] * (len(GRADE_LEVELS) - len(_as_list(criteria)))
+        criteria = {grade: _as_text(text) for grade, text in zip(GRADE_LEVELS, criteria)}
+
+    return {
+        "type": _as_text(item.get("ty")),
+        "name": _as_text(item.get("n")),
+        "description": _as_text(item.get("ds")),
+        "objectives": [_as_text(o) for o in _as_list(item.get("ob"))],
+        "knowledge_points": [_as_text(k) for k in _as_list(item.get("kp"))],
+        "criteria": criteria,
+        "weight": _as_text(item.get("w")),
+        "timing": _as_text(item.get("tm")),
+        "tools": [_as_text(t) for t in _as_list(item.get("tl"))],
+        "feedback": _as_text(item.get("fb"))
+    }
+
+
+def expand_assessment(wire: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    展开紧凑格式的评估方案
+
+    Args:
+        wire: LLM输出的紧凑格式，如{"f": [{...}], "s": [{...}], "w": [形成性, 终结性]}
+
+    Returns:
+        Dict[str, Any]: {"assessment_plan": {"formative", "summative", "weights"}}
+    """
+    if "assessment_plan" in wire:
+        return wire
+
+    weights = wire.get("w", [])
+    if not isinstance(weights, dict):
+        weights = list(_as_list(weights)) + [""] * (2 - len(_as_list(weights)))
+        weights = {"formative": _as_text(weights[0]), "summative": _as_text(weights[1])}
+
+    return {
+        "assessment_plan": {
+            "formative": [_expand_assessment_item(item) for item in _as_list(wire.get("f"))],
+            "summative": [_expand_assessment_item(item) for item in _as_list(wire.get("s"))],
+            "weights": weights
+        }
+    }
+
+
+def compact_plan(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    将完整结构压缩为紧凑格式（expand_*的逆操作，用于基准测试和样例构造）
+
+    Args:
+        data: 与save_lesson_plan_to_md输入一致的完整结构
+
+    Returns:
+        Dict[str, Any]: 各部分的紧凑格式
+    """
+    result = {}
+
+    objectives = data.get("objectives", {}).get("objectives", {})
+    result["objectives"] = {"o": {
+        short_key: [[o["level"], o["description"], o["evaluation"]] for o in objectives.get(field, [])]
+        for short_key, field in [("k", "knowledge"), ("a", "ability"), ("e", "emotion")]
+    }}
+
+    def encode(value: str, levels: List[str]) -> Any:
+        return levels.index(value) if value in levels else value
+
+    kp = data.get("knowledge_points", {}).get("knowledge_points", {})
+    result["knowledge_points"] = {"kp": {
+        "b": [[p["name"], p["content"], encode(p["difficulty"], DIFFICULTY_LEVELS),
+               encode(p["importance"], IMPORTANCE_LEVELS), p["prerequisites"], p["objectives"],
+               p["teaching_suggestions"]] for p in kp.get("basic", [])],
+        "a": [[p["name"], p["content"], encode(p["difficulty"], DIFFICULTY_LEVELS),
+               encode(p["importance"], IMPORTANCE_LEVELS), p["prerequisites"], p["objectives"],
+               p["teaching_suggestions"]] for p in kp.get("advanced", [])],
+        "k": kp.get("key_points", []),
+        "d": kp.get("difficult_points", [])
+    }}
+
+    activities = data.get("activities", {})
+    result["activities"] = {
+        "a": [{
+            "t": act["title"],
+            "w": act["duration"],
+            "y": encode(act.get("活动类型", ACTIVITY_TYPES[0]), ACTIVITY_TYPES),
+            "f": act["教学重点"],
+            "m": act["教学方法"],
+            "p": [[details["content"], details["duration"], details["activities"], details["materials"]]
+                  for details in act["教学过程"].values()],
+            "h": act["设计亮点"],
+            "e": act["预期效果"],
+            "q": act["可能问题"],
+            "c": act["对应章节"]
+        } for act in (item["activity"] for item in activities.get("activities", []))]
+    }
+
+    plan = data.get("assessment", {}).get("assessment_plan", {})
+
+    def compact_item(item: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "ty": item["type"], "n": item["name"], "ds": item["description"],
+            "ob": item["objectives"], "kp": item["knowledge_points"],
+            "cr": [item["criteria"].get(grade, "") for grade in GRADE_LEVELS],
+            "w": item["weight"], "tm": item["timing"], "tl": item["tools"], "fb": item["feedback"]
+        }
+
+    weights = plan.get("weights", {})
+    result["assessment"] = {
+        "f": [compact_item(item) for item in plan.get("formative", [])],
+        "s": [compact_item(item) for item in plan.get("summative", [])],
+        "w": [weights.get("formative", ""), weights.get("summative", "")]
+    }
+    return result
@@ -0,0 +1,140 @@
+"""
+自适应并发控制模块
+按AIMD调整同时进行的LLM调用数：延迟平稳且无错误时逐步增加，遇到限流或延迟突增时成倍减少
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Tuple
+
+from my_agent.config import MAX_CONCURRENT_LLM_CALLS
+from my_agent.utils.api_errors import is_rate_limited
+from my_agent.utils.deadline import check_cancelled, on_cancel
+
+ADAPTIVE_CONCURRENCY_ENABLED = os.getenv("LLM_ADAPTIVE_CONCURRENCY", "1") == "1"  # 是否启用自适应并发
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "64"))  # 并发上限
+DECREASE_FACTOR = 0.5  # 限流或延迟突增时的缩减比例
+LATENCY_SPIKE_RATIO = 2.0  # 延迟超过基线的该倍数视为突增
+LATENCY_EWMA_ALPHA = 0.1  # 延迟基线的平滑系数
+LATENCY_MIN_SAMPLES = 5  # 基线样本不足时不判断突增
+DECREASE_COOLDOWN_SECONDS = 2.0  # 两次缩减的最小间隔，避免同一波错误连续缩减
+WAIT_POLL_SECONDS = 0.5  # 排队时检查运行是否已取消的间隔
+
+
+class AdaptiveLimiter:
+    """AIMD并发限制器，线程安全"""
+
+    def __init__(self, initial: int = MAX_CONCURRENT_LLM_CALLS, minimum: int = MIN_CONCURRENCY,
+                 maximum: int = MAX_CONCURRENCY):
+        self.minimum = minimum
+        self.maximum = max(minimum, maximum)
+        self.limit = float(min(max(initial, minimum), self.maximum))
+        self.in_flight = 0
+        self.waiting = 0  # 排队等待的调用数
+        self.increases = 0
+        self.decreases = 0
+        self._baselines: Dict[Tuple[str, str], Tuple[float, int]] = {}  # (阶段, 模型) -> (延迟基线, 样本数)
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def _acquire(self) -> None:
+        with self._condition:
+            self.waiting += 1
+            try:
+                while self.in_flight >= int(self.limit):
+                    self._condition.wait(WAIT_POLL_SECONDS)
+                    check_cancelled()
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+
+    def _release(self, held: List[bool], stage: str, model: str, seconds: float, error: BaseException = None,
+                 abandoned: bool = False) -> None:
+        with self._condition:
+            if not held:
+                return
+            held.clear()
+            self.in_flight -= 1
+            if abandoned:
+                # 被放弃的调用只归还名额，其耗时和结果不用于调整并发上限
+                self._condition.notify_all()
+                return
+            if error is not None:
+                if is_rate_limited(error):
+                    self._decrease()
+            elif self._is_spike(stage, model, seconds):
+                self._decrease()
+            else:
+                # 加性增长：每完成约limit次调用增加1
+                previous = int(self.limit)
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+                self.increases += int(self.limit) > previous
+            self._condition.notify_all()
+
+    def _is_spike(self, stage: str, model: str, seconds: float) -> bool:
+        """更新延迟基线并判断是否突增（突增的样本不计入基线）"""
+        baseline, count = self._baselines.get((stage, model), (seconds, 0))
+        spike = count >= LATENCY_MIN_SAMPLES and seconds > LATENCY_SPIKE_RATIO * baseline
+        if not spike:
+            baseline = seconds if count == 0 else (1 - LATENCY_EWMA_ALPHA) * baseline + LATENCY_EWMA_ALPHA * seconds
+            self._baselines[(stage, model)] = (baseline, count + 1)
+        return spike
+
+    def _decrease(self) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < DECREASE_COOLDOWN_SECONDS:
+            return
+        self._last_decrease = now
+        self.limit = max(float(self.minimum), self.limit * DECREASE_FACTOR)
+        self.decreases += 1
+
+    @contextmanager
+    def slot(self, stage: str, model: str) -> Iterator[None]:
+        """
+        占用一个并发名额执行一次调用，结束时按延迟和结果调整并发上限
+
+        Args:
+            stage: 阶段名称
+            model: 模型名称
+
+        Raises:
+            RunCancelledError: 排队期间运行被取消
+        """
+        self._acquire()
+        start = time.perf_counter()
+        held = [True]  # 名额只归还一次
+        # 运行被取消时调用方已放弃本次调用，立即归还名额，不必等SDK调用自身超时
+        on_cancel(lambda: self._release(held, stage, model, time.perf_counter() - start, abandoned=True))
+        try:
+            yield
+        except BaseException as e:
+            self._release(held, stage, model, time.perf_counter() - start, e)
+            raise
+        self._release(held, stage, model, time.perf_counter() - start)
+
+    def stats(self) -> Dict[str, Any]:
+        """当前并发上限、进行中和排队的调用数，以及调整次数"""
+        with self._condition:
+            return {
+                "limit": int(self.limit),
+                "in_flight": self.in_flight,
+                "queue_depth": self.waiting,
+                "increases": self.increases,
+                "decreases": self.decreases
+            }
+
+
+# LLM调用共用的并发限制器
+llm_limiter = AdaptiveLimiter()
+
+
+def fanout_workers(tasks: int, budget: int = MAX_CONCURRENT_LLM_CALLS) -> int:
+    """
+    并发分发任务时的线程数
+
+    启用自适应并发时由限制器控制实际并发，线程数只受任务数和并发上限约束；否则不超过固定的budget。
+    """
+    cap = MAX_CONCURRENCY if ADAPTIVE_CONCURRENCY_ENABLED else budget
+    return max(1, min(cap, tasks))
@@ -0,0 +1,149 @@
+"""
+评估覆盖度模块
+将评估项中以自由文本引用的教学目标和知识点模糊匹配到原始条目，建立稀疏覆盖矩阵并找出未覆盖的条目
+"""
+import math
+import re
+import zlib
+from collections import defaultdict
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+NGRAM_SIZES = (2, 3)  # 字n元组长度
+HASH_BUCKETS = 1 << 20  # n元组哈希桶数
+MATCH_THRESHOLD = 0.35  # 余弦相似度低于该值视为未匹配
+
+_DIMENSION_PREFIX = re.compile(r"^(知识|能力|情感|素养)(目标)?[：:\-\s]*")
+_IGNORED_CHARS = re.compile(r"[\s\"'“”‘’《》「」【】()（）,，、.。:：;；!！?？]")
+
+
+def _normalize(text: Any) -> str:
+    """去掉维度前缀、空白和标点"""
+    text = _DIMENSION_PREFIX.sub("", str(text).strip())
+    return _IGNORED_CHARS.sub("", text).lower()
+
+
+def hashed_ngrams(text: Any) -> Dict[int, float]:
+    """
+    将文本映射为哈希后的字n元组向量（L2归一化）
+
+    Args:
+        text: 文本
+
+    Returns:
+        Dict[int, float]: 哈希桶 -> 权重的稀疏向量
+    """
+    normalized = _normalize(text)
+    counts: Dict[int, float] = defaultdict(float)
+    for n in NGRAM_SIZES:
+        grams = [normalized[i:i + n] for i in range(len(normalized) - n + 1)] or ([normalized] if normalized else [])
+        for gram in grams:
+            counts[zlib.crc32(gram.encode("utf-8")) % HASH_BUCKETS] += 1.0
+    norm = math.sqrt(sum(v * v for v in counts.values())) or 1.0
+    return {bucket: value / norm for bucket, value in counts.items()}
+
+
+class CrossReferenceIndex:
+    """目标条目的n元组倒排索引，用于把自由文本引用匹配到条目"""
+
+    def __init__(self, labels: List[str]):
+        """
+        建立索引
+
+        Args:
+            labels: 条目文本（教学目标描述或知识点名称）
+        """
+        self.labels = labels
+        self.normalized = {}
+        for i, label in enumerate(labels):
+            self.normalized.setdefault(_normalize(label), i)
+        self.postings: Dict[int, List[Tuple[int, float]]] = defaultdict(list)
+        for i, label in enumerate(labels):
+            for bucket, weight in hashed_ngrams(label).items():
+                self.postings[bucket].append((i, weight))
+
+    def match(self, text: Any, threshold: float = MATCH_THRESHOLD) -> Tuple[Optional[int], float]:
+        """
+        查找与引用文本最相似的条目
+
+        Args:
+            text: 引用文本
+            threshold: 相似度阈值
+
+        Returns:
+            Tuple[Optional[int], float]: 条目下标（未匹配时为None）和相似度
+        """
+        key = _normalize(text)
+        if key in self.normalized:
+            return self.normalized[key], 1.0
+
+        # 稀疏向量与倒排表相乘，只计算共享n元组的条目
+        scores: Dict[int, float] = defaultdict(float)
+        for bucket, weight in hashed_ngrams(text).items():
+            for i, label_weight in self.postings.get(bucket, []):
+                scores[i] += weight * label_weight
+        if not scores:
+            return None, 0.0
+        best = max(scores, key=lambda i: (scores[i], -i))
+        return (best, scores[best]) if scores[best] >= threshold else (None, scores[best])
+
+
+def build_coverage(objectives: Dict[str, Any], knowledge_points: Dict[str, Any],
+                   assessment: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    建立教学目标、知识点与评估项之间的覆盖矩阵
+
+    Args:
+        objectives: 教学目标（含objectives字段）
+        knowledge_points: 知识点分析（含knowledge_points字段）
+        assessment: 评估方案（含assessment_plan字段）
+
+    Returns:
+        Dict[str, Any]: 覆盖报告，含：
+            objective_matrix / knowledge_matrix: 条目下标 -> 覆盖它的评估项名称（稀疏矩阵）
+            uncovered_objectives: 未覆盖的目标（含dimension和目标本身）
+            uncovered_knowledge_points: 未覆盖的知识点
+            unmatched_references: 无法匹配到任何条目的引用文本
+    """
+    dimension_objectives = objectives.get("objectives", objectives)
+    objective_entries = [
+        (dimension, item)
+        for dimension, items in dimension_objectives.items() if isinstance(items, list)
+        for item in items if isinstance(item, dict)
+    ]
+    knowledge = knowledge_points.get("knowledge_points", knowledge_points)
+    point_entries = [p for level in ["basic", "advanced"] for p in knowledge.get(level, []) if isinstance(p, dict)]
+
+    objective_index = CrossReferenceIndex([item.get("description", "") for _, item in objective_entries])
+    point_index = CrossReferenceIndex([p.get("name", "") for p in point_entries])
+
+    objective_matrix: Dict[int, List[str]] = defaultdict(list)
+    knowledge_matrix: Dict[int, List[str]] = defaultdict(list)
+    unmatched: List[str] = []
+
+    plan = assessment.get("assessment_plan", assessment)
+    for field in ["formative", "summative"]:
+        for item in plan.get(field, []):
+            name = str(item.get("name", ""))
+            for index, matrix, refs in [(objective_index, objective_matrix, item.get("objectives", [])),
+                                        (point_index, knowledge_matrix, item.get("knowledge_points", []))]:
+                for ref in refs if isinstance(refs, list) else []:
+                    row, _ = index.match(ref)
+                    if row is None:
+                        unmatched.append(str(ref))
+                    elif name not in matrix[row]:
+                        matrix[row].append(name)
+
+    covered_objectives: Set[int] = set(objective_matrix)
+    covered_points: Set[int] = set(knowledge_matrix)
+    return {
+        "objective_matrix": dict(objective_matrix),
+        "knowledge_matrix": dict(knowledge_matrix),
+        "objective_count": len(objective_entries),
+        "knowledge_count": len(point_entries),
+        "uncovered_objectives": [
+            {"dimension": dimension, "objective": item}
+            for i, (dimension, item) in enumerate(objective_entries) if i not in covered_objectives
+        ],
+        "uncovered_knowledge_points": [p for i, p in enumerate(point_entries) if i not in covered_points],
+        "unmatched_references": list(dict.fromkeys(unmatched))
+    }
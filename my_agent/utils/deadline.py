@@ -0,0 +1,180 @@
+"""
+截止时间与取消模块
+每次运行持有一个取消令牌，通过contextvars传到各节点和并发线程中；LLM调用的超时取预算和剩余时间的较小值，
+运行被取消或到达截止时间时进行中的等待立即返回
+"""
+import contextvars
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional
+
+from my_agent.utils.exceptions import RunCancelledError
+
+
+class CancelToken:
+    """运行的取消令牌：可显式取消，也可设置截止时间"""
+
+    def __init__(self, timeout: Optional[float] = None):
+        """
+        Args:
+            timeout: 距截止时间的秒数，None或不大于0表示不限制
+        """
+        self.deadline = time.monotonic() + timeout if timeout and timeout > 0 else None
+        self.reason: Optional[str] = None
+        self._cancelled: Future = Future()  # 取消时完成，供等待方与调用结果一起等待
+        self._lock = threading.Lock()
+
+    def cancel(self, reason: str = "运行已取消") -> None:
+        """取消运行（可从任意线程调用，重复调用无效）"""
+        with self._lock:
+            if self.reason is not None:
+                return
+            self.reason = reason
+        # 在锁外完成，取消回调可能需要获取限制器、熔断器等其他锁
+        self._cancelled.set_result(reason)
+
+    def on_cancel(self, callback: Callable[[], Any]) -> None:
+        """取消时调用callback（在执行取消的线程中），已取消时立即调用"""
+        self._cancelled.add_done_callback(lambda _: callback())
+
+    def child(self) -> "CancelToken":
+        """派生子令牌：截止时间相同，本令牌取消时随之取消；取消子令牌不影响本令牌，用于提前结束一组并发调用"""
+        token = CancelToken()
+        token.deadline = self.deadline
+        self._cancelled.add_done_callback(lambda _: token.cancel(self.reason or "运行已取消"))
+        return token
+
+    def remaining(self) -> Optional[float]:
+        """剩余秒数，未设置截止时间时返回None"""
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+    @property
+    def cancelled(self) -> bool:
+        """是否已取消或已过截止时间"""
+        if not self._cancelled.done():
+            remaining = self.remaining()
+            if remaining is not None and remaining <= 0:
+                self.cancel("已超过运行截止时间")
+        return self.reason is not None
+
+    def check(self) -> None:
+        """
+        检查运行是否仍可继续
+
+        Raises:
+            RunCancelledError: 已取消或已过截止时间
+        """
+        if self.cancelled:
+            raise RunCancelledError(self.reason)
+
+    def timeout(self, budget: float) -> float:
+        """
+        计算单次调用的超时
+
+        Args:
+            budget: 调用自身的延迟预算（秒）
+
+        Returns:
+            float: 预算和剩余时间中的较小值
+
+        Raises:
+            RunCancelledError: 已取消或已过截止时间
+        """
+        self.check()
+        remaining = self.remaining()
+        return budget if remaining is None else min(budget, remaining)
+
+    def run(self, func: Callable[[], Any]) -> Any:
+        """
+        在后台线程执行阻塞调用，取消或到达截止时间时立即返回
+
+        SDK的同步调用无法从外部中断，被放弃的调用在其自身超时后结束，结果被丢弃。
+
+        Raises:
+            RunCancelledError: 调用完成前运行被取消
+        """
+        self.check()
+        result: Future = Future()
+
+        def target():
+            try:
+                result.set_result(func())
+            except BaseException as e:
+                result.set_exception(e)
+
+        # 后台线程沿用当前上下文，排队等待并发名额时也能感知取消
+        context = contextvars.copy_context()
+        threading.Thread(target=context.run, args=(target,), name="llm-call", daemon=True).start()
+        wait([result, self._cancelled], timeout=self.remaining(), return_when=FIRST_COMPLETED)
+        if not result.done():
+            # 因取消或到达截止时间返回；已取消时cancel不会覆盖原因
+            self.cancel("已超过运行截止时间")
+            raise RunCancelledError(self.reason)
+        return result.result()
+
+
+_current_token: contextvars.ContextVar[Optional[CancelToken]] = contextvars.ContextVar("cancel_token", default=None)
+
+
+def current_token() -> Optional[CancelToken]:
+    """当前运行的取消令牌，不在运行中时返回None"""
+    return _current_token.get()
+
+
+@contextmanager
+def run_scope(token: CancelToken) -> Iterator[CancelToken]:
+    """在上下文中激活取消令牌"""
+    reset = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(reset)
+
+
+def check_cancelled() -> None:
+    """
+    检查当前运行是否已取消（不在运行中时不做任何事）
+
+    Raises:
+        RunCancelledError: 已取消或已过截止时间
+    """
+    token = current_token()
+    if token is not None:
+        token.check()
+
+
+def on_cancel(callback: Callable[[], Any]) -> None:
+    """当前运行被取消时调用callback，用于归还被放弃的调用占用的资源（不在运行中时不做任何事）"""
+    token = current_token()
+    if token is not None:
+        token.on_cancel(callback)
+
+
+def call_timeout(budget: float) -> float:
+    """当前运行中单次调用的超时：预算和剩余时间的较小值"""
+    token = current_token()
+    return budget if token is None else token.timeout(budget)
+
+
+def run_cancellable(func: Callable[[], Any]) -> Any:
+    """在当前运行的取消令牌下执行阻塞调用，不在运行中时直接调用"""
+    token = current_token()
+    return func() if token is None else token.run(func)
+
+
+class ContextThreadPoolExecutor(ThreadPoolExecutor):
+    """提交任务时复制调用方上下文的线程池，使取消令牌在工作线程中可见"""
+
+    def submit(self, fn, /, *args, **kwargs):
+        context = contextvars.copy_context()
+        return super().submit(context.run, fn, *args, **kwargs)
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        # 运行被取消时丢弃尚未开始的任务，立即释放线程
+        token = current_token()
+        self.shutdown(wait=True, cancel_futures=exc_type is not None and token is not None and token.cancelled)
+        return False
@@ -0,0 +1,161 @@
+"""
+知识点近似去重模块
+对中文字符shingle计算MinHash签名，用LSH分桶在线性时间内找出近似重复的知识点并合并
+"""
+import hashlib
+import os
+import re
+import struct
+from functools import lru_cache
+from typing import Dict, Any, List, Tuple
+
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.6"))  # 估计Jaccard相似度达到该值视为重复
+NUM_PERMUTATIONS = 64  # MinHash签名长度
+SHINGLE_SIZE = 2  # 字shingle长度
+NAME_REPEAT = 3  # 名称shingle的重复权重，名称比内容更能区分知识点
+
+_ROW_FORMAT = struct.Struct(f"<{NUM_PERMUTATIONS}I")
+_IGNORED_CHARS = re.compile(r"[\s\"'“”‘’《》「」【】()（）,，、.。:：;；!！?？]")
+
+
+def _shingles(point: Dict[str, Any]) -> set:
+    """知识点名称和内容的字shingle集合（名称shingle带序号重复以提高权重）"""
+    name = _IGNORED_CHARS.sub("", str(point.get("name", ""))).lower()
+    content = _IGNORED_CHARS.sub("", str(point.get("content", ""))).lower()
+    shingles = set()
+    for repeat in range(NAME_REPEAT):
+        shingles.update(f"n{repeat}{name[i:i + SHINGLE_SIZE]}" for i in range(max(1, len(name) - SHINGLE_SIZE + 1)))
+    shingles.update(content[i:i + SHINGLE_SIZE] for i in range(len(content) - SHINGLE_SIZE + 1))
+    return shingles
+
+
+@lru_cache(maxsize=65536)
+def _shingle_hashes(shingle: str) -> Tuple[int, ...]:
+    """一个shingle在NUM_PERMUTATIONS个独立哈希函数下的取值（SHAKE-128输出按32位切分，跨进程稳定）"""
+    return _ROW_FORMAT.unpack(hashlib.shake_128(shingle.encode("utf-8")).digest(_ROW_FORMAT.size))
+
+
+def minhash_signature(shingles: set) -> Tuple[int, ...]:
+    """
+    计算MinHash签名
+
+    Args:
+        shingles: shingle集合
+
+    Returns:
+        Tuple[int, ...]: 长度为NUM_PERMUTATIONS的签名
+    """
+    rows = [_shingle_hashes(s) for s in shingles] or [_shingle_hashes("")]
+    return tuple(map(min, zip(*rows)))
+
+
+def lsh_params(threshold: float, num_perm: int = NUM_PERMUTATIONS) -> Tuple[int, int]:
+    """
+    选择LSH的分段数和每段行数，使候选概率曲线的拐点(1/b)^(1/r)最接近阈值
+
+    Returns:
+        Tuple[int, int]: (bands, rows)
+    """
+    best = (num_perm, 1)
+    best_error = float("inf")
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        error = abs((1 / bands) ** (1 / rows) - threshold)
+        if error < best_error:
+            best, best_error = (bands, rows), error
+    return best
+
+
+def find_duplicate_clusters(points: List[Dict[str, Any]], threshold: float = DEDUP_THRESHOLD) -> List[List[int]]:
+    """
+    找出近似重复的知识点簇
+
+    Args:
+        points: 知识点列表
+        threshold: 相似度阈值
+
+    Returns:
+        List[List[int]]: 每个簇中知识点的下标（按原顺序），只含单个知识点的簇也会返回
+    """
+    bands, rows = lsh_params(threshold)
+    # 每个分段一张桶表，桶中只放各簇的代表（簇内第一个知识点）
+    buckets: List[Dict[Tuple[int, ...], List[int]]] = [{} for _ in range(bands)]
+    signatures: List[Tuple[int, ...]] = []
+    clusters: Dict[int, List[int]] = {}
+
+    for i, point in enumerate(points):
+        signature = minhash_signature(_shingles(point))
+        signatures.append(signature)
+        keys = [signature[band * rows:(band + 1) * rows] for band in range(bands)]
+
+        # 任一分段签名相同的代表成为候选，用签名估计的Jaccard相似度确认，取最相似的一个；
+        # 只和代表比较，避免相似关系传递导致簇无限扩大
+        candidates = {rep for band, key in enumerate(keys) for rep in buckets[band].get(key, [])}
+        best, best_similarity = None, threshold
+        for rep in sorted(candidates):
+            similarity = sum(x == y for x, y in zip(signatures[rep], signature)) / NUM_PERMUTATIONS
+            if similarity >= best_similarity:
+                best, best_similarity = rep, similarity
+
+        if best is not None:
+            clusters[best].append(i)
+            continue
+        clusters[i] = [i]
+        for band, key in enumerate(keys):
+            buckets[band].setdefault(key, []).append(i)
+    return list(clusters.values())
+
+
+def dedupe_knowledge_points(result: Dict[str, Any], threshold: float = DEDUP_THRESHOLD) -> Dict[str, Any]:
+    """
+    合并近似重复的知识点
+
+    每个簇保留最先出现的知识点，前置知识和对应目标取并集；其他知识点的前置知识和重难点中
+    对被合并知识点的引用改为保留下来的名称。
+
+    Args:
+        result: 知识点分析结果（含knowledge_points字段）
+        threshold: 相似度阈值
+
+    Returns:
+        Dict[str, Any]: 去重后的知识点分析
+    """
+    knowledge = result.get("knowledge_points", result)
+    entries = [(level, p) for level in ["basic", "advanced"] for p in knowledge.get(level, []) if isinstance(p, dict)]
+    clusters = find_duplicate_clusters([p for _, p in entries], threshold)
+    if len(clusters) == len(entries):
+        return result
+
+    renamed: Dict[str, str] = {}
+    merged: Dict[int, Dict[str, Any]] = {}
+    for cluster in clusters:
+        keep = dict(entries[cluster[0]][1])
+        for key in ["prerequisites", "objectives"]:
+            keep[key] = list(keep.get(key, []) or [])
+        for i in cluster[1:]:
+            point = entries[i][1]
+            renamed[str(point.get("name", ""))] = str(keep.get("name", ""))
+            for key in ["prerequisites", "objectives"]:
+                for value in point.get(key, []) or []:
+                    if value not in keep[key]:
+                        keep[key].append(value)
+        merged[cluster[0]] = keep
+
+    deduped = {"basic": [], "advanced": []}
+    for i in sorted(merged):
+        point = merged[i]
+        name = point.get("name", "")
+        point["prerequisites"] = [
+            pre for pre in dict.fromkeys(renamed.get(pre, pre) for pre in point["prerequisites"]) if pre != name
+        ]
+        deduped[entries[i][0]].append(point)
+    for field in ["key_points", "difficult_points"]:
+        if field in knowledge:
+            deduped[field] = list(dict.fromkeys(renamed.get(item, item) for item in knowledge[field]))
+    for field, value in knowledge.items():
+        deduped.setdefault(field, value)
+
+    print(f"知识点去重: {len(entries)} -> {len(merged)}")
+    return {**result, "knowledge_points": deduped} if "knowledge_points" in result else deduped
@@ -10,7 +10,6 @@ class ContentExtractionError(LessonPlanError):
     """内容提取错误"""
     pass
 
-<<<<<<< HEAD
 class PDFExtractionError(Exception):
     """PDF提取错误"""
     pass
@@ -23,10 +22,18 @@ class ValidationError(Exception):
     """验证错误"""
     pass
 
+class RunCancelledError(Exception):
+    """运行被取消或超过截止时间"""
+    pass
+
+class CircuitOpenError(Exception):
+    """服务熔断中，请求被直接拒绝"""
+    pass
+
+class BatchPendingError(Exception):
+    """批量模式下请求尚无结果，需等待批量任务完成"""
+    pass
+
 class FileOperationError(Exception):
     """文件操作错误"""
-=======
-class LLMGenerationError(LessonPlanError):
-    """LLM生成错误"""
->>>>>>> c4972e73ce82ab596751226cd0a07e233d3db998
     pass 
\ No newline at end of file
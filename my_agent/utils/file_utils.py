@@ -1,8 +1,8 @@
 import os
-<<<<<<< HEAD
 from typing import Dict, Any
 import json
 from datetime import datetime
+from my_agent.utils.knowledge_graph import KnowledgeGraph
 
 def save_lesson_plan_to_md(data: Dict[str, Any], course_name: str) -> None:
     """将教学大纲保存为Markdown格式"""
@@ -57,6 +57,7 @@ def save_lesson_plan_to_md(data: Dict[str, Any], course_name: str) -> None:
         md_content.append("## 二、知识点分析\n")
         if "knowledge_points" in data and isinstance(data["knowledge_points"], dict):
             kp = data["knowledge_points"].get("knowledge_points", {})
+            graph = KnowledgeGraph(kp)
             
             # 基础知识点
             if "basic" in kp:
@@ -68,7 +69,7 @@ def save_lesson_plan_to_md(data: Dict[str, Any], course_name: str) -> None:
                     md_content.append(f"- 重要性：{point['importance']}")
                     md_content.append("- 前置知识点：")
                     for pre in point["prerequisites"]:
-                        md_content.append(f"  - {pre}")
+                        md_content.append(f"  - {graph.canonical(pre)}" if pre in graph else f"  - {pre}（课程外）")
                     md_content.append("- 对应教学目标：")
                     for obj in point["objectives"]:
                         md_content.append(f"  - {obj}")
@@ -84,7 +85,7 @@ def save_lesson_plan_to_md(data: Dict[str, Any], course_name: str) -> None:
                     md_content.append(f"- 重要性：{point['importance']}")
                     md_content.append("- 前置知识点：")
                     for pre in point["prerequisites"]:
-                        md_content.append(f"  - {pre}")
+                        md_content.append(f"  - {graph.canonical(pre)}" if pre in graph else f"  - {pre}（课程外）")
                     md_content.append("- 对应教学目标：")
                     for obj in point["objectives"]:
                         md_content.append(f"  - {obj}")
@@ -100,6 +101,11 @@ def save_lesson_plan_to_md(data: Dict[str, Any], course_name: str) -> None:
                 md_content.append("### 4. 教学难点\n")
                 for point in kp["difficult_points"]:
                     md_content.append(f"- {point}\n")
+                    
+            # 按先修关系排好的教学顺序
+            if len(graph):
+                md_content.append("### 5. 教学顺序\n")
+                md_content.append(" → ".join(point["name"] for point in graph.topological_order()) + "\n")
         
         # 教学活动部分
         md_content.append("## 三、教学活动\n")
@@ -123,6 +129,8 @@ def save_lesson_plan_to_md(data: Dict[str, Any], course_name: str) -> None:
                     activity = act["activity"]
                     md_content.append(f"#### 活动{idx}：{activity['title']}")
                     md_content.append(f"- 时长：{activity['duration']}分钟")
+                    if "活动类型" in activity:
+                        md_content.append(f"- 活动类型：{activity['活动类型']}")
                     md_content.append(f"- 教学重点：{activity['教学重点']}")
                     md_content.append(f"- 教学方法：{activity['教学方法']}")
                     
@@ -248,32 +256,3 @@ def is_valid_pdf(file_path: str) -> bool:
     if not file_path.lower().endswith('.pdf'):
         return False
     return True 
-=======
-from datetime import datetime
-
-def save_lesson_plan_to_md(content: str, course_name: str) -> str:
-    """
-    将教学大纲保存为markdown文件
-    
-    Args:
-        content: 教学大纲内容
-        course_name: 课程名称
-        
-    Returns:
-        str: 保存的文件路径
-    """
-    # 创建downloads目录（如果不存在）
-    download_dir = "downloads"
-    os.makedirs(download_dir, exist_ok=True)
-    
-    # 生成文件名（使用时间戳避免重名）
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"{course_name}_教学大纲_{timestamp}.md"
-    filepath = os.path.join(download_dir, filename)
-    
-    # 写入文件
-    with open(filepath, "w", encoding="utf-8") as f:
-        f.write(content)
-    
-    return filepath 
->>>>>>> c4972e73ce82ab596751226cd0a07e233d3db998
@@ -0,0 +1,139 @@
+"""
+对冲请求模块
+调用在该阶段和模型近期延迟的指定分位数内仍未返回时，再发出一个相同请求，先成功返回的结果胜出，
+用于削减偶发慢调用造成的长尾延迟
+"""
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import wait, FIRST_COMPLETED
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+from my_agent.config import MAX_CONCURRENT_LLM_CALLS
+from my_agent.utils.deadline import ContextThreadPoolExecutor
+
+HEDGING_ENABLED = os.getenv("LLM_HEDGING", "0") == "1"  # 是否启用对冲
+HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95"))  # 等待到近期延迟的该分位数后发出对冲
+HEDGE_MAX_EXTRA_RATIO = float(os.getenv("LLM_HEDGE_MAX_EXTRA_RATIO", "0.1"))  # 对冲请求数占总调用数的上限
+HEDGE_WINDOW = 50  # 每个阶段和模型保留的近期延迟样本数
+HEDGE_MIN_SAMPLES = 10  # 样本不足时不对冲
+
+
+class HedgePolicy:
+    """维护近期延迟并决定何时发出对冲请求"""
+
+    def __init__(self, percentile: float = HEDGE_PERCENTILE, max_extra_ratio: float = HEDGE_MAX_EXTRA_RATIO,
+                 window: int = HEDGE_WINDOW, min_samples: int = HEDGE_MIN_SAMPLES):
+        self.percentile = percentile
+        self.max_extra_ratio = max_extra_ratio
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+        self._latencies: Dict[Tuple[str, str], Deque[float]] = defaultdict(lambda: deque(maxlen=window))
+        self.calls = 0  # 主请求总数
+        self.hedges = 0  # 已发出的对冲请求数
+        self.hedge_wins = 0  # 对冲请求先返回的次数
+        self._executor: Optional[ContextThreadPoolExecutor] = None
+
+    def observe(self, stage: str, model: str, seconds: float) -> None:
+        """记录一次成功调用的延迟"""
+        with self._lock:
+            self._latencies[(stage, model)].append(seconds)
+
+    def hedge_delay(self, stage: str, model: str) -> Optional[float]:
+        """
+        返回发出对冲前的等待时间
+
+        Returns:
+            Optional[float]: 近期延迟的分位数（秒），样本不足时返回None
+        """
+        with self._lock:
+            samples = sorted(self._latencies[(stage, model)])
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(self.percentile * len(samples)))]
+
+    def _try_reserve_hedge(self) -> bool:
+        """在额外开销上限内预留一次对冲"""
+        with self._lock:
+            if self.hedges + 1 > self.max_extra_ratio * self.calls:
+                return False
+            self.hedges += 1
+            return True
+
+    def _pool(self) -> ContextThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ContextThreadPoolExecutor(max_workers=MAX_CONCURRENT_LLM_CALLS * 2,
+                                                           thread_name_prefix="llm-hedge")
+            return self._executor
+
+    def call(self, stage: str, model: str, request: Callable[[], Any]) -> Tuple[Any, Dict[str, bool]]:
+        """
+        执行请求，必要时发出对冲
+
+        SDK的同步调用无法从外部中断，落败的请求若尚未开始会被取消，已在进行的请求结果会被丢弃。
+
+        Args:
+            stage: 阶段名称
+            model: 模型名称
+            request: 发出请求的无参函数
+
+        Returns:
+            Tuple[Any, Dict[str, bool]]: 响应，以及对冲情况（hedged是否发出对冲、hedge_won是否对冲胜出）
+
+        Raises:
+            Exception: 所有请求都失败时抛出主请求的异常
+        """
+        with self._lock:
+            self.calls += 1
+        start = time.perf_counter()
+        delay = self.hedge_delay(stage, model)
+        if delay is None:
+            response = request()
+            self.observe(stage, model, time.perf_counter() - start)
+            return response, {"hedged": False, "hedge_won": False}
+
+        pool = self._pool()
+        primary = pool.submit(request)
+        done, _ = wait([primary], timeout=delay)
+        if done or not self._try_reserve_hedge():
+            response = primary.result()
+            self.observe(stage, model, time.perf_counter() - start)
+            return response, {"hedged": False, "hedge_won": False}
+
+        hedge = pool.submit(request)
+        pending = {primary, hedge}
+        first_error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    response = future.result()
+                except Exception as e:
+                    if future is primary or first_error is None:
+                        first_error = e
+                    continue
+                for loser in pending:
+                    loser.cancel()
+                won = future is hedge
+                if won:
+                    with self._lock:
+                        self.hedge_wins += 1
+                self.observe(stage, model, time.perf_counter() - start)
+                return response, {"hedged": True, "hedge_won": won}
+        raise first_error
+
+    def stats(self) -> Dict[str, Any]:
+        """对冲统计：发出次数、胜出次数和额外开销比例"""
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "extra_ratio": round(self.hedges / self.calls, 4) if self.calls else 0.0
+            }
+
+
+# 全局对冲策略
+hedge_policy = HedgePolicy()
@@ -0,0 +1,226 @@
+"""
+课时分配模块
+根据LLM给出的活动相对权重，在本地求解合法的活动时长（15/30/45/90分钟），保证总和精确等于目标分钟数
+"""
+import copy
+from typing import Dict, Any, List, Sequence
+
+from my_agent.utils.compact_schema import TIME_ALLOCATION_KEYS
+
+MINUTES_PER_HOUR = 45  # 每课时45分钟
+VALID_DURATIONS = (15, 30, 45, 90)  # 合法的活动时长
+DEFAULT_PHASE_RATIOS = (5, 30, 10)  # 导入/发展/总结环节的默认时长比例
+DP_BAND = 8  # 带状DP中前缀和允许偏离理想值的单位数
+
+
+def _gcd_unit(durations: Sequence[int]) -> int:
+    """计算时长的公约数单位"""
+    unit = durations[0]
+    for d in durations[1:]:
+        a, b = unit, d
+        while b:
+            a, b = b, a % b
+        unit = a
+    return unit
+
+
+def _solve(ideal: List[float], choices: List[int], total: int, band: int = None) -> List[int]:
+    """
+    动态规划求解：每项从choices中取值，总和为total，最小化与理想值的平方误差
+
+    Args:
+        ideal: 每项的理想取值（单位数）
+        choices: 可选取值（单位数）
+        total: 目标总和（单位数）
+        band: 前缀和允许偏离理想前缀和的范围，None表示不限制
+
+    Returns:
+        List[int]: 每项的取值，无解时返回空列表
+    """
+    n = len(ideal)
+    lo_choice, hi_choice = min(choices), max(choices)
+
+    # layer[s] = (累计误差, 上一层前缀和, 本项取值)
+    layers: List[Dict[int, tuple]] = [{0: (0.0, None, None)}]
+    prefix_ideal = 0.0
+    for i in range(n):
+        prefix_ideal += ideal[i]
+        remaining = n - i - 1
+        current: Dict[int, tuple] = {}
+        for s, (cost, _, _) in layers[-1].items():
+            for c in choices:
+                t = s + c
+                # 剩余项必须还能凑满total
+                if t + remaining * lo_choice > total or t + remaining * hi_choice < total:
+                    continue
+                if band is not None and abs(t - prefix_ideal) > band:
+                    continue
+                new_cost = cost + (c - ideal[i]) ** 2
+                if t not in current or new_cost < current[t][0]:
+                    current[t] = (new_cost, s, c)
+        if not current:
+            return []
+        layers.append(current)
+
+    if total not in layers[-1]:
+        return []
+
+    # 回溯
+    values = []
+    s = total
+    for i in range(n, 0, -1):
+        _, prev, c = layers[i][s]
+        values.append(c)
+        s = prev
+    return values[::-1]
+
+
+def allocate_durations(weights: List[float], total_minutes: int,
+                       durations: Sequence[int] = VALID_DURATIONS) -> List[int]:
+    """
+    按相对权重分配活动时长
+
+    Args:
+        weights: 每个活动的相对权重
+        total_minutes: 目标总分钟数
+        durations: 合法的活动时长
+
+    Returns:
+        List[int]: 每个活动的时长（分钟），总和等于total_minutes
+
+    Raises:
+        ValueError: 活动数量无法凑出目标总时长
+    """
+    if not weights:
+        raise ValueError("活动列表为空")
+
+    unit = _gcd_unit(list(durations))
+    if total_minutes % unit != 0:
+        raise ValueError(f"总时长{total_minutes}分钟不是{unit}分钟的整数倍")
+
+    total = total_minutes // unit
+    choices = sorted(d // unit for d in durations)
+    weights = [max(float(w), 0.0) for w in weights]
+    weight_sum = sum(weights) or float(len(weights))
+    if not any(weights):
+        weights = [1.0] * len(weights)
+    ideal = [total * w / weight_sum for w in weights]
+
+    # 先用带状DP快速求解，失败再做全范围DP
+    values = _solve(ideal, choices, total, band=DP_BAND) or _solve(ideal, choices, total)
+    if not values:
+        raise ValueError(f"{len(weights)}个活动无法凑出{total_minutes}分钟")
+    return [v * unit for v in values]
+
+
+def split_phase_minutes(duration: int, ratios: Sequence[float]) -> List[int]:
+    """
+    将活动时长按比例拆分到各教学环节（最大余数法，总和精确等于duration）
+
+    Args:
+        duration: 活动时长（分钟）
+        ratios: 各环节的相对比例
+
+    Returns:
+        List[int]: 各环节时长（分钟）
+    """
+    ratios = [max(float(r), 0.0) for r in ratios]
+    if not any(ratios):
+        ratios = list(DEFAULT_PHASE_RATIOS[:len(ratios)]) or [1.0]
+    ratio_sum = sum(ratios)
+    exact = [duration * r / ratio_sum for r in ratios]
+    minutes = [int(x) for x in exact]
+    order = sorted(range(len(exact)), key=lambda i: exact[i] - minutes[i], reverse=True)
+    for i in order[:duration - sum(minutes)]:
+        minutes[i] += 1
+    return minutes
+
+
+def _to_number(value: Any, default: float) -> float:
+    """将LLM输出的数字或数字字符串转为浮点数"""
+    try:
+        return float(str(value).replace("分钟", "").strip())
+    except (TypeError, ValueError):
+        return default
+
+
+def _format_hours(minutes: int) -> Any:
+    """分钟数转为课时数，整课时返回整数"""
+    hours = minutes / MINUTES_PER_HOUR
+    return int(hours) if hours == int(hours) else round(hours, 2)
+
+
+def _fit_activity_count(activities: List[Dict[str, Any]], weights: List[float],
+                        total_minutes: int) -> None:
+    """调整活动数量使目标总时长可行：活动过少时拆分权重最大的活动，过多时去掉权重最小的活动"""
+    min_d, max_d = min(VALID_DURATIONS), max(VALID_DURATIONS)
+    while len(activities) * min_d > total_minutes:
+        drop = weights.index(min(weights))
+        print(f"警告：活动过多，移除活动「{activities[drop].get('t', '')}」")
+        del activities[drop]
+        del weights[drop]
+    # 接近上限时（如只差15/30分钟）也无法凑出，需要多一个活动
+    while len(activities) * max_d - total_minutes in (min_d, 2 * min_d) or len(activities) * max_d < total_minutes:
+        heaviest = weights.index(max(weights))
+        extra = copy.deepcopy(activities[heaviest])
+        title = str(extra.get("t", ""))
+        extra["t"] = title if title.endswith("（续）") else f"{title}（续）"
+        weights[heaviest] /= 2
+        activities.insert(heaviest + 1, extra)
+        weights.insert(heaviest + 1, weights[heaviest])
+
+
+def compute_time_allocation(activities: List[Dict[str, Any]]) -> List[Any]:
+    """
+    按活动类型汇总已分配的活动时长
+
+    Args:
+        activities: 紧凑格式的活动列表，每个活动含"d"（时长）和"y"（活动类型编码）
+
+    Returns:
+        List[Any]: 与TIME_ALLOCATION_KEYS对应的课时数
+    """
+    allocation = [0] * len(TIME_ALLOCATION_KEYS)
+    for item in activities:
+        category = int(_to_number(item.get("y"), 0))
+        if not 0 <= category < len(TIME_ALLOCATION_KEYS):
+            category = 0
+        allocation[category] += int(_to_number(item.get("d"), 0))
+    return [_format_hours(m) for m in allocation]
+
+
+def assign_activity_durations(wire: Dict[str, Any], total_minutes: int) -> Dict[str, Any]:
+    """
+    为紧凑格式的活动列表分配时长，并重新计算各环节时长和课时分配
+
+    Args:
+        wire: 紧凑格式的活动输出，每个活动含"w"（相对权重）和"y"（活动类型编码）
+        total_minutes: 目标总分钟数
+
+    Returns:
+        Dict[str, Any]: 填好"d"（活动时长）、环节时长和"ta"（课时分配）的紧凑格式
+    """
+    activities = [dict(item) for item in wire.get("a", []) if isinstance(item, dict)]
+    if not activities:
+        raise ValueError("activities不能为空")
+
+    # 没有给出权重时，退化为使用模型给出的时长作为权重
+    weights = [_to_number(item.get("w", item.get("d")), 1.0) for item in activities]
+    _fit_activity_count(activities, weights, total_minutes)
+    minutes = allocate_durations(weights, total_minutes)
+
+    for item, duration in zip(activities, minutes):
+        item["d"] = duration
+
+        phases = item.get("p")
+        if isinstance(phases, list) and phases and all(isinstance(row, list) for row in phases):
+            ratios = [_to_number(row[1] if len(row) > 1 else None, 0.0) for row in phases]
+            if not any(ratios) and len(phases) == len(DEFAULT_PHASE_RATIOS):
+                ratios = list(DEFAULT_PHASE_RATIOS)
+            phase_minutes = split_phase_minutes(duration, ratios)
+            item["p"] = [[row[0], m] + list(row[2:]) for row, m in zip(phases, phase_minutes)]
+
+    result = dict(wire)
+    result["a"] = activities
+    result["ta"] = compute_time_allocation(activities)
+    return result
@@ -0,0 +1,247 @@
+"""
+API密钥池模块
+从配置读取多个密钥，按加权的在途请求数选择负载最低的密钥；余额不足或连续限流的密钥会被暂时隔离，
+并按密钥统计用量，用于估算所需配额
+"""
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+from my_agent.utils.api_errors import api_error_code, is_balance_error, is_rate_limited
+from my_agent.utils.exceptions import LLMGenerationError
+
+BALANCE_QUARANTINE_SECONDS = float(os.getenv("KEY_BALANCE_QUARANTINE", "3600"))  # 余额不足的密钥隔离时长
+RATE_LIMIT_QUARANTINE_SECONDS = float(os.getenv("KEY_RATE_LIMIT_QUARANTINE", "60"))  # 连续限流的密钥隔离时长
+RATE_LIMIT_STRIKES = int(os.getenv("KEY_RATE_LIMIT_STRIKES", "3"))  # 连续限流多少次后隔离
+RATE_WINDOW_SECONDS = 60  # 统计每个密钥请求速率的时间窗口
+
+
+def parse_api_keys(value: str) -> List[Tuple[str, float]]:
+    """
+    解析密钥配置
+
+    Args:
+        value: 逗号分隔的密钥，可用"密钥:权重"指定权重（默认1）
+
+    Returns:
+        List[Tuple[str, float]]: (密钥, 权重)
+    """
+    keys = []
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        key, _, weight = item.partition(":")
+        keys.append((key.strip(), float(weight) if weight.strip() else 1.0))
+    return keys
+
+
+class KeyState:
+    """单个密钥的客户端和统计"""
+
+    def __init__(self, key: str, weight: float, client_factory: Callable[[str], Any]):
+        self.key = key
+        self.weight = max(weight, 1e-6)
+        self.label = f"{key[:6]}…" if len(key) > 6 else (key or "默认")  # 日志和指标中只显示前缀
+        self._client_factory = client_factory
+        self._client = None
+        self.in_flight = 0
+        self.requests = 0
+        self.successes = 0
+        self.errors: Dict[str, int] = {}
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.rate_limit_strikes = 0
+        self.quarantined_until = 0.0
+        self.quarantine_reason: Optional[str] = None
+        self.recent: Deque[float] = deque()  # 时间窗口内的请求时间
+
+    @property
+    def client(self) -> Any:
+        if self._client is None:
+            self._client = self._client_factory(self.key)
+        return self._client
+
+    def requests_per_minute(self, now: float) -> int:
+        while self.recent and now - self.recent[0] > RATE_WINDOW_SECONDS:
+            self.recent.popleft()
+        return len(self.recent)
+
+
+class KeyPool:
+    """线程安全的API密钥池"""
+
+    def __init__(self, keys: List[Tuple[str, float]], client_factory: Callable[[str], Any]):
+        """
+        Args:
+            keys: (密钥, 权重)列表
+            client_factory: 由密钥创建客户端的函数
+        """
+        if not keys:
+            raise LLMGenerationError("未配置API密钥（ZHIPU_API_KEYS或ZHIPU_API_KEY）")
+        self._states = [KeyState(key, weight, client_factory) for key, weight in keys]
+        self._lock = threading.Lock()
+        self._cursor = 0  # 负载相同时轮流选择
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    @property
+    def primary(self) -> KeyState:
+        """配置中的第一个密钥"""
+        return self._states[0]
+
+    def _select(self) -> KeyState:
+        """选出加权在途请求数最少的可用密钥（调用方持有锁）"""
+        now = time.monotonic()
+        available = [s for s in self._states if s.quarantined_until <= now]
+        if not available:
+            soonest = min(self._states, key=lambda s: s.quarantined_until)
+            raise LLMGenerationError(
+                f"所有API密钥均被隔离，最早{soonest.quarantined_until - now:.0f}秒后恢复（{soonest.quarantine_reason}）"
+            )
+        count = len(self._states)
+        order = {id(s): (i - self._cursor) % count for i, s in enumerate(self._states)}
+        state = min(available, key=lambda s: ((s.in_flight + 1) / s.weight,
+                                              s.requests_per_minute(now) / s.weight, order[id(s)]))
+        self._cursor = (self._states.index(state) + 1) % count
+        return state
+
+    @contextmanager
+    def lease(self) -> Iterator[KeyState]:
+        """
+        借出一个密钥执行一次请求，结束时按结果更新统计和隔离状态
+
+        Raises:
+            LLMGenerationError: 所有密钥均被隔离
+        """
+        with self._lock:
+            state = self._select()
+            state.in_flight += 1
+            state.requests += 1
+            state.recent.append(time.monotonic())
+        try:
+            yield state
+        except BaseException as e:
+            self._record_error(state, e)
+            raise
+        else:
+            with self._lock:
+                state.successes += 1
+                state.rate_limit_strikes = 0
+        finally:
+            with self._lock:
+                state.in_flight -= 1
+
+    def _record_error(self, state: KeyState, error: BaseException) -> None:
+        code = api_error_code(error) or type(error).__name__
+        with self._lock:
+            state.errors[code] = state.errors.get(code, 0) + 1
+            if is_balance_error(error):
+                self._quarantine(state, BALANCE_QUARANTINE_SECONDS, "余额不足")
+            elif is_rate_limited(error):
+                state.rate_limit_strikes += 1
+                if state.rate_limit_strikes >= RATE_LIMIT_STRIKES:
+                    self._quarantine(state, RATE_LIMIT_QUARANTINE_SECONDS, f"连续限流{state.rate_limit_strikes}次")
+                    state.rate_limit_strikes = 0
+
+    def _quarantine(self, state: KeyState, seconds: float, reason: str) -> None:
+        state.quarantined_until = time.monotonic() + seconds
+        state.quarantine_reason = reason
+        print(f"警告：API密钥{state.label}已隔离{seconds:.0f}秒 - {reason}")
+
+    def record_usage(self, state: KeyState, usage: Any) -> None:
+        """累计密钥的token用量"""
+        with self._lock:
+            state.prompt_tokens += getattr(usage, "prompt_tokens", 0) or 0
+            state.completion_tokens += getattr(usage, "completion_tokens", 0) or 0
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        各密钥的用量统计
+
+        Returns:
+            Dict[str, Dict[str, Any]]: 密钥前缀到请求数、成功数、错误码计数、近一分钟请求数、token用量和隔离状态的映射
+        """
+        now = time.monotonic()
+        with self._lock:
+            return {
+                state.label: {
+                    "weight": state.weight,
+                    "in_flight": state.in_flight,
+                    "requests": state.requests,
+                    "successes": state.successes,
+                    "errors": dict(state.errors),
+                    "requests_per_minute": state.requests_per_minute(now),
+                    "prompt_tokens": state.prompt_tokens,
+                    "completion_tokens": state.completion_tokens,
+                    "quarantined_for": max(0.0, round(state.quarantined_until - now, 1)),
+                    "quarantine_reason": state.quarantine_reason if state.quarantined_until > now else None
+                }
+                for state in self._states
+            }
+
+
+class _PooledCompletions:
+    def __init__(self, pool: KeyPool):
+        self._pool = pool
+
+    def create(self, **kwargs: Any) -> Any:
+        # 余额不足和限流只与密钥有关，换一个密钥重试，其他错误直接抛出
+        for attempt in range(len(self._pool)):
+            try:
+                with self._pool.lease() as state:
+                    response = state.client.chat.completions.create(**kwargs)
+                    self._pool.record_usage(state, getattr(response, "usage", None))
+                    return response
+            except Exception as e:
+                if attempt == len(self._pool) - 1 or not (is_balance_error(e) or is_rate_limited(e)):
+                    raise
+
+
+class _PooledChat:
+    def __init__(self, pool: KeyPool):
+        self.completions = _PooledCompletions(pool)
+
+
+class PooledClient:
+    """
+    与SDK客户端接口相同的密钥池客户端
+
+    对话请求按密钥池选择密钥；文件、批量任务等其他接口固定使用第一个密钥，保证批量任务的提交和查询在同一账户下。
+    """
+
+    def __init__(self, pool: KeyPool):
+        self.pool = pool
+        self.chat = _PooledChat(pool)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.pool.primary.client, name)
+
+
+_pool: Optional[KeyPool] = None
+_pool_lock = threading.Lock()
+
+
+def key_pool_stats() -> Optional[Dict[str, Dict[str, Any]]]:
+    """密钥池的用量统计，尚未创建密钥池时返回None"""
+    return _pool.stats() if _pool is not None else None
+
+
+def get_key_pool() -> KeyPool:
+    """
+    获取进程内共享的密钥池
+
+    密钥从环境变量ZHIPU_API_KEYS读取（逗号分隔，可带":权重"），未配置时使用ZHIPU_API_KEY。
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            from zhipuai import ZhipuAI
+            keys = parse_api_keys(os.getenv("ZHIPU_API_KEYS", "") or os.getenv("ZHIPU_API_KEY", "") or "")
+            # 都未配置时与之前一样交给SDK读取其默认的环境变量
+            _pool = KeyPool(keys or [("", 1.0)], lambda key: ZhipuAI(api_key=key or None))
+        return _pool
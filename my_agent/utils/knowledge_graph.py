@@ -0,0 +1,167 @@
+"""
+知识点先修关系图模块
+基于知识点的prerequisites字段建立有向无环图索引，提供名称归一化、环检测、拓扑排序和O(1)查找
+"""
+import heapq
+import re
+import unicodedata
+from typing import Dict, Any, List, Optional, Set
+
+_IGNORED_CHARS = re.compile(r"[\s\"'“”‘’《》「」『』【】()（）\[\]<>·・,，、.。:：;；]")
+
+
+def normalize_name(name: Any) -> str:
+    """
+    归一化知识点名称：全角转半角、去除空白和标点、英文转小写
+
+    Args:
+        name: 知识点名称
+
+    Returns:
+        str: 归一化后的名称
+    """
+    text = unicodedata.normalize("NFKC", str(name))
+    return _IGNORED_CHARS.sub("", text).lower()
+
+
+class KnowledgeGraph:
+    """知识点先修关系图"""
+
+    def __init__(self, knowledge: Dict[str, Any]):
+        """
+        建立知识点索引
+
+        Args:
+            knowledge: 知识点分析结果（含knowledge_points字段，或直接是其内容）
+        """
+        knowledge = knowledge.get("knowledge_points", knowledge)
+        self.points: Dict[str, Dict[str, Any]] = {}  # 归一化名称 -> 知识点
+        self.levels: Dict[str, str] = {}  # 归一化名称 -> basic/advanced
+        self.order: Dict[str, int] = {}  # 归一化名称 -> 原始顺序
+        for level in ["basic", "advanced"]:
+            for point in knowledge.get(level, []):
+                if not isinstance(point, dict):
+                    continue
+                key = normalize_name(point.get("name", ""))
+                if not key or key in self.points:
+                    continue
+                self.points[key] = point
+                self.levels[key] = level
+                self.order[key] = len(self.order)
+
+        # 先修边：prerequisites[key]为key的课程内前置知识点，external[key]为课程外的前置知识
+        self.prerequisites: Dict[str, List[str]] = {}
+        self.dependents: Dict[str, List[str]] = {key: [] for key in self.points}
+        self.external: Dict[str, List[str]] = {}
+        for key, point in self.points.items():
+            internal, external = [], []
+            for pre in point.get("prerequisites", []) or []:
+                pre_key = normalize_name(pre)
+                if pre_key in self.points and pre_key != key:
+                    if pre_key not in internal:
+                        internal.append(pre_key)
+                        self.dependents[pre_key].append(key)
+                elif pre_key != key:
+                    external.append(str(pre))
+            self.prerequisites[key] = internal
+            self.external[key] = external
+
+    def __contains__(self, name: Any) -> bool:
+        return normalize_name(name) in self.points
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def get(self, name: Any) -> Optional[Dict[str, Any]]:
+        """按名称查找知识点（忽略大小写、全半角和标点差异）"""
+        return self.points.get(normalize_name(name))
+
+    def canonical(self, name: Any) -> str:
+        """返回课程内知识点的规范名称，课程外的名称原样返回"""
+        point = self.get(name)
+        return point.get("name", str(name)) if point else str(name)
+
+    def level(self, name: Any) -> Optional[str]:
+        """返回知识点所属层次（basic/advanced）"""
+        return self.levels.get(normalize_name(name))
+
+    def find_cycles(self) -> List[List[str]]:
+        """
+        检测先修关系中的环（Tarjan强连通分量）
+
+        Returns:
+            List[List[str]]: 每个环中的知识点名称
+        """
+        index: Dict[str, int] = {}
+        low: Dict[str, int] = {}
+        on_stack: Set[str] = set()
+        stack: List[str] = []
+        cycles: List[List[str]] = []
+        counter = 0
+
+        for root in self.points:
+            if root in index:
+                continue
+            # 迭代式DFS，避免长依赖链触发递归深度限制
+            work = [(root, 0)]
+            while work:
+                node, child_index = work.pop()
+                if child_index == 0:
+                    index[node] = low[node] = counter
+                    counter += 1
+                    stack.append(node)
+                    on_stack.add(node)
+                children = self.dependents[node]
+                if child_index < len(children):
+                    work.append((node, child_index + 1))
+                    child = children[child_index]
+                    if child not in index:
+                        work.append((child, 0))
+                    elif child in on_stack:
+                        low[node] = min(low[node], index[child])
+                    continue
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    if len(component) > 1:
+                        component.sort(key=self.order.get)
+                        cycles.append([self.points[key]["name"] for key in component])
+        return cycles
+
+    def topological_order(self) -> List[Dict[str, Any]]:
+        """
+        按先修关系排序知识点（Kahn算法，同层按原始顺序）
+
+        存在环时，按原始顺序选出环中最靠前的知识点先行，忽略其尚未满足的先修边。
+
+        Returns:
+            List[Dict[str, Any]]: 排好教学顺序的知识点
+        """
+        remaining = {key: len(pres) for key, pres in self.prerequisites.items()}
+        ready = [(self.order[key], key) for key, count in remaining.items() if count == 0]
+        heapq.heapify(ready)
+        done: Set[str] = set()
+        result = []
+        while len(result) < len(self.points):
+            if not ready:
+                # 剩余知识点都在环上，取原始顺序最靠前的一个打破环
+                key = min((k for k in self.points if k not in done), key=self.order.get)
+                heapq.heappush(ready, (self.order[key], key))
+            _, key = heapq.heappop(ready)
+            if key in done:
+                continue
+            done.add(key)
+            result.append(self.points[key])
+            for child in self.dependents[key]:
+                remaining[child] -= 1
+                if remaining[child] == 0 and child not in done:
+                    heapq.heappush(ready, (self.order[child], child))
+        return result
@@ -0,0 +1,156 @@
+"""
+LLM调用指标模块
+记录每次调用的模型路由决策和各模型的延迟分布，用于调整阶段模型和延迟预算
+"""
+import bisect
+import json
+import os
+import threading
+from collections import defaultdict
+from typing import Dict, Any, List, Optional
+
+LATENCY_BUCKETS = (0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300)  # 延迟直方图的桶上界（秒）
+MAX_ROUTE_RECORDS = 1000  # 保留的路由决策条数
+
+_save_lock = threading.Lock()  # 串行化指标文件的写入
+
+
+class LatencyHistogram:
+    """固定桶的延迟直方图"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一个桶为超出上界
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        """记录一次延迟"""
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """按桶估算分位数（返回所在桶的上界）"""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+    def to_dict(self) -> Dict[str, Any]:
+        labels = [f"<={b}s" for b in self.buckets] + [f">{self.buckets[-1]}s"]
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 3) if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "buckets": dict(zip(labels, self.counts))
+        }
+
+
+class LLMMetrics:
+    """线程安全的LLM调用指标"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency: Dict[str, LatencyHistogram] = defaultdict(LatencyHistogram)
+        self.outcomes: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.routes: List[Dict[str, Any]] = []
+        self.hedges: Dict[str, Dict[str, int]] = defaultdict(lambda: {"calls": 0, "fired": 0, "won": 0})
+
+    def record_call(self, stage: str, model: str, seconds: float, outcome: str) -> None:
+        """
+        记录一次模型调用
+
+        Args:
+            stage: 阶段名称
+            model: 模型名称
+            seconds: 耗时（秒）
+            outcome: 结果（ok、timeout、error等）
+        """
+        with self._lock:
+            if outcome == "ok":
+                self.latency[model].observe(seconds)
+            self.outcomes[model][outcome] += 1
+
+    def record_route(self, stage: str, attempts: List[Dict[str, Any]]) -> None:
+        """
+        记录一次路由决策
+
+        Args:
+            stage: 阶段名称
+            attempts: 依次尝试的模型及结果
+        """
+        with self._lock:
+            self.routes.append({"stage": stage, "attempts": attempts})
+            del self.routes[:-MAX_ROUTE_RECORDS]
+
+    def record_hedge(self, stage: str, model: str, hedged: bool, hedge_won: bool) -> None:
+        """
+        记录一次启用对冲的调用
+
+        Args:
+            stage: 阶段名称
+            model: 模型名称
+            hedged: 是否发出了对冲请求
+            hedge_won: 对冲请求是否先返回
+        """
+        with self._lock:
+            counts = self.hedges[f"{stage}/{model}"]
+            counts["calls"] += 1
+            counts["fired"] += hedged
+            counts["won"] += hedge_won
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        汇总指标
+
+        Returns:
+            Dict[str, Any]: 各模型的延迟直方图和结果计数，各阶段的回退次数，以及对冲的发出和胜出次数
+        """
+        with self._lock:
+            fallbacks: Dict[str, int] = defaultdict(int)
+            for route in self.routes:
+                if len(route["attempts"]) > 1:
+                    fallbacks[route["stage"]] += 1
+            return {
+                "models": {
+                    model: {"latency": self.latency[model].to_dict(), "outcomes": dict(self.outcomes[model])}
+                    for model in sorted(set(self.latency) | set(self.outcomes))
+                },
+                "fallbacks": dict(fallbacks),
+                "hedges": {key: dict(counts) for key, counts in self.hedges.items()},
+                "routes": list(self.routes)
+            }
+
+    def report(self) -> str:
+        """生成便于阅读的文本报告"""
+        summary = self.summary()
+        lines = []
+        for model, data in summary["models"].items():
+            latency = data["latency"]
+            lines.append(f"{model}: 成功{latency['count']}次，平均{latency['mean']}秒，"
+                         f"P50≤{latency['p50']}秒，P95≤{latency['p95']}秒，结果{data['outcomes']}")
+        for stage, count in summary["fallbacks"].items():
+            lines.append(f"{stage}: 回退{count}次")
+        for key, counts in summary["hedges"].items():
+            lines.append(f"{key}: 对冲{counts['fired']}/{counts['calls']}次，对冲胜出{counts['won']}次")
+        return "\n".join(lines)
+
+    def save(self, path: str, **extra: Any) -> None:
+        """将指标（及附加的统计）保存为JSON文件，先写临时文件再替换，多个线程或工作进程同时保存时文件也是完整的"""
+        data = {**self.summary(), **extra}
+        with _save_lock:
+            temp_path = f"{path}.{os.getpid()}.tmp"  # 锁只在进程内有效，各进程使用自己的临时文件
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(temp_path, path)
+
+
+# 全局调用指标
+llm_metrics = LLMMetrics()
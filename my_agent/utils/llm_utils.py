@@ -0,0 +1,138 @@
+"""
+LLM调用模块
+各代理统一通过chat_completion调用模型：按阶段路由模型并在超时或失败时回退，调用前估算token并检查上下文窗口，
+调用后记录实际用量、延迟和路由决策；启用对冲时慢调用会额外发出一个相同请求，
+内容相同的进行中请求只发出一次，同时进行的请求数由自适应并发控制，服务故障时按服务商熔断
+"""
+import time
+from contextlib import nullcontext
+from typing import Dict, Any, List
+
+from my_agent.config import LLMConfig, get_stage_models, get_stage_latency_budget
+from my_agent.utils.token_utils import (
+    estimate_messages_tokens, token_usage_log, OUTPUT_TOKEN_RESERVE
+)
+from my_agent.utils.llm_metrics import llm_metrics
+from my_agent.utils.hedging import HEDGING_ENABLED, hedge_policy
+from my_agent.utils.deadline import call_timeout, run_cancellable
+from my_agent.utils.exceptions import RunCancelledError
+from my_agent.utils.batch import current_session
+from my_agent.utils.singleflight import SINGLEFLIGHT_ENABLED, llm_singleflight, request_key
+from my_agent.utils.concurrency import ADAPTIVE_CONCURRENCY_ENABLED, llm_limiter
+from my_agent.utils.circuit_breaker import get_breaker
+from my_agent.utils.providers import get_client, provider_context_window, request_kwargs, split_model
+
+
+def _is_timeout(error: Exception) -> bool:
+    """判断异常是否为超时（SDK和httpx的超时异常类名都含Timeout）"""
+    return "timeout" in type(error).__name__.lower() or isinstance(error, TimeoutError)
+
+
+def chat_completion(llm_config: LLMConfig, messages: List[Dict[str, str]], stage: str = "llm",
+                    **kwargs: Any) -> Any:
+    """
+    调用LLM生成回复
+
+    按阶段配置的模型顺序依次尝试：每次调用以阶段延迟预算和运行剩余时间的较小值为超时，
+    超时或出错时换用下一个模型；运行被取消时立即放弃进行中的调用，不再回退。
+
+    Args:
+        llm_config: 模型配置（未配置路由的阶段使用其中的模型，路由中未指定服务商的模型使用其中的服务商）
+        messages: 对话消息
+        stage: 调用所属的阶段名称（用于路由和日志）
+        **kwargs: 透传给chat.completions.create的参数（temperature、response_format等）
+
+    Returns:
+        Any: 模型响应
+
+    Raises:
+        ValueError: 阶段没有可用的模型，或估算的提示词长度超出所有候选模型的上下文窗口
+        RunCancelledError: 运行已取消或已过截止时间
+        BatchPendingError: 批量模式下请求尚无结果
+        CircuitOpenError: 服务熔断中且配置为直接失败
+        Exception: 所有候选模型都失败时抛出最后一个模型的异常
+    """
+    budget = get_stage_latency_budget(stage)
+    models = get_stage_models(stage, llm_config.model)
+    if not models:
+        raise ValueError(f"{stage}阶段没有可用的模型")
+    attempts: List[Dict[str, Any]] = []
+    last_error: Exception = None
+
+    for model in models:
+        # 路由中的"服务商:模型"发往对应服务商，指标和日志仍使用路由中的完整名称
+        provider, model_name = split_model(model, llm_config.provider)
+        estimated = estimate_messages_tokens(messages, model_name)
+        limit = provider_context_window(provider, model_name)
+        if estimated + OUTPUT_TOKEN_RESERVE > limit:
+            attempts.append({"model": model, "outcome": "context_overflow"})
+            last_error = ValueError(f"提示词约{estimated}个token，超出{model}的上下文窗口{limit}")
+            continue
+
+        # 批量模式：回放已有结果，否则记录请求等待批量任务（不做模型回退）
+        session = current_session()
+        if session is not None:
+            response = session.complete(stage, {"model": model_name, "messages": messages, **kwargs})
+            usage = getattr(response, "usage", None)
+            token_usage_log.record(stage, model, estimated, getattr(usage, "prompt_tokens", None))
+            return response
+
+        # 超时取阶段预算和运行剩余时间的较小值，运行已取消时直接抛出
+        timeout = call_timeout(budget)
+        client = llm_config.client if provider == llm_config.provider else get_client(provider)
+        breaker = get_breaker(provider)
+        call_kwargs = request_kwargs(provider, kwargs)
+
+        def request(model=model, model_name=model_name, client=client, breaker=breaker, call_kwargs=call_kwargs):
+            # 服务熔断时先挂起或直接失败，放行后每个实际发出的请求占用一个自适应并发名额
+            with breaker.guard(), llm_limiter.slot(stage, model) if ADAPTIVE_CONCURRENCY_ENABLED else nullcontext():
+                return client.chat.completions.create(
+                    model=model_name,
+                    messages=messages,
+                    timeout=timeout,
+                    **call_kwargs
+                )
+
+        def attempt(model=model):
+            if HEDGING_ENABLED:
+                response, hedge = hedge_policy.call(stage, model, request)
+                llm_metrics.record_hedge(stage, model, **hedge)
+                return response
+            return request()
+
+        def coalesced_attempt(model=model):
+            # 内容相同的请求正在进行时等待其结果，不再重复发出
+            if SINGLEFLIGHT_ENABLED:
+                return llm_singleflight.do(request_key(model, messages, kwargs), attempt)
+            return attempt(), False
+
+        start = time.perf_counter()
+        try:
+            response, shared = run_cancellable(coalesced_attempt)
+        except RunCancelledError:
+            attempts.append({"model": model, "outcome": "cancelled", "seconds": round(time.perf_counter() - start, 3)})
+            llm_metrics.record_route(stage, attempts)
+            raise
+        except Exception as e:
+            elapsed = time.perf_counter() - start
+            outcome = "timeout" if _is_timeout(e) else "error"
+            llm_metrics.record_call(stage, model, elapsed, outcome)
+            attempts.append({"model": model, "outcome": outcome, "seconds": round(elapsed, 3)})
+            print(f"警告：{stage}调用{model}{'超时' if outcome == 'timeout' else '失败'}（{elapsed:.1f}秒）- {str(e)}")
+            last_error = e
+            continue
+
+        elapsed = time.perf_counter() - start
+        outcome = "coalesced" if shared else "ok"
+        llm_metrics.record_call(stage, model, elapsed, outcome)
+        attempts.append({"model": model, "outcome": outcome, "seconds": round(elapsed, 3)})
+        llm_metrics.record_route(stage, attempts)
+
+        # 合并得到的响应其用量已由发起方记录
+        if not shared:
+            usage = getattr(response, "usage", None)
+            token_usage_log.record(stage, model, estimated, getattr(usage, "prompt_tokens", None))
+        return response
+
+    llm_metrics.record_route(stage, attempts)
+    raise last_error
@@ -0,0 +1,148 @@
+"""
+预计算缓存模块
+教材上传后即在后台执行与课时无关的阶段，结果按文件哈希缓存；超过TTL仍未使用的预计算会被取消并清除
+"""
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+
+from my_agent.config import RUN_TIMEOUT
+from my_agent.utils.deadline import CancelToken, run_scope
+
+PREPARE_TTL = float(os.getenv("PREPARE_TTL", "1800"))  # 预计算结果的保留时间（秒），从最近一次使用算起
+PREPARE_MAX_WORKERS = int(os.getenv("PREPARE_MAX_WORKERS", "2"))  # 同时进行的预计算数
+PREPARE_SWEEP_SECONDS = float(os.getenv("PREPARE_SWEEP_SECONDS", "60"))  # 后台清除过期预计算的间隔（秒）
+
+
+def file_hash(file_path: str) -> str:
+    """计算文件内容的SHA-256"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@dataclass
+class PreparedEntry:
+    """一份预计算"""
+    future: Future
+    token: CancelToken
+    last_access: float = field(default_factory=time.monotonic)
+    used: bool = False
+
+
+class PreparedCache:
+    """按键缓存后台预计算，线程安全"""
+
+    def __init__(self, ttl: float = PREPARE_TTL, max_workers: int = PREPARE_MAX_WORKERS,
+                 sweep_seconds: float = PREPARE_SWEEP_SECONDS):
+        self.ttl = ttl
+        self.max_workers = max_workers
+        self.sweep_seconds = sweep_seconds
+        self._entries: Dict[str, PreparedEntry] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._sweeper: Optional[threading.Thread] = None
+        self.evicted = 0  # 因过期被清除的预计算数
+        self.unused_evicted = 0  # 其中从未被使用的数量
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="prepare")
+        return self._executor
+
+    def _sweep(self) -> None:
+        """定期清除过期的预计算，没有再调用submit或get时也能释放；缓存清空后退出，下次提交时重新启动"""
+        while True:
+            time.sleep(min(self.sweep_seconds, self.ttl))
+            self.evict_expired()
+            with self._lock:
+                if not self._entries:
+                    self._sweeper = None
+                    return
+
+    def submit(self, key: str, func: Callable[[], Any]) -> bool:
+        """
+        提交预计算，同一键已有未过期的预计算时不重复提交
+
+        Args:
+            key: 缓存键（文件哈希及影响结果的选项）
+            func: 预计算函数，在独立的取消令牌下执行
+
+        Returns:
+            bool: 是否新提交了预计算
+        """
+        self.evict_expired()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not (entry.future.done() and entry.future.exception() is not None):
+                entry.last_access = time.monotonic()
+                return False
+            token = CancelToken(RUN_TIMEOUT)
+
+            def task():
+                with run_scope(token):
+                    return func()
+
+            self._entries[key] = PreparedEntry(self._pool().submit(task), token)
+            if self._sweeper is None:
+                self._sweeper = threading.Thread(target=self._sweep, name="prepare-sweep", daemon=True)
+                self._sweeper.start()
+            return True
+
+    def get(self, key: str) -> Optional[Future]:
+        """
+        取出预计算（进行中的也返回，由调用方等待）
+
+        Returns:
+            Optional[Future]: 预计算结果，不存在或已过期时返回None
+        """
+        self.evict_expired()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry.last_access = time.monotonic()
+            entry.used = True
+            return entry.future
+
+    def evict_expired(self) -> int:
+        """
+        清除超过TTL未被访问的预计算，进行中的会被取消
+
+        Returns:
+            int: 清除的数量
+        """
+        now = time.monotonic()
+        with self._lock:
+            expired = [key for key, entry in self._entries.items() if now - entry.last_access > self.ttl]
+            for key in expired:
+                entry = self._entries.pop(key)
+                entry.token.cancel("预计算超过保留时间未被使用")
+                entry.future.cancel()
+                self.evicted += 1
+                self.unused_evicted += not entry.used
+        return len(expired)
+
+    def stats(self) -> Dict[str, int]:
+        """缓存统计"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "running": sum(not entry.future.done() for entry in self._entries.values()),
+                "evicted": self.evicted,
+                "unused_evicted": self.unused_evicted
+            }
+
+
+# 全局预计算缓存，在同一进程内的各代理间共享
+prepared_cache = PreparedCache()
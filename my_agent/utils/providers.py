@@ -0,0 +1,214 @@
+"""
+模型服务商模块
+除智谱SDK外可接入任意OpenAI兼容接口（包括局域网内自部署的模型服务）：每个服务商共用一个带连接池的HTTP客户端，
+请求参数、response_format和错误码解析与智谱保持一致；阶段路由中写成"服务商:模型"即可把单个阶段发往指定服务商。
+OpenAI兼容接口默认以流式请求调用再拼接为完整响应，运行被取消时关闭进行中的连接，服务端随即停止生成
+"""
+import os
+import threading
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+from my_agent.utils.deadline import on_cancel
+from my_agent.utils.exceptions import LLMGenerationError
+from my_agent.utils.key_pool import KeyPool, PooledClient, get_key_pool, parse_api_keys
+from my_agent.utils.token_utils import context_window
+
+ZHIPU_PROVIDER = "zhipu"
+ZHIPU_DEFAULT_MODEL = "glm-4-air"
+OPENAI_PROVIDER = "openai"  # 未配置地址时使用OpenAI官方接口（或SDK读取的OPENAI_BASE_URL）
+
+# 每个服务商共用的HTTP连接池
+HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "64"))  # 最大连接数
+HTTP_MAX_KEEPALIVE = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "32"))  # 保持的空闲连接数
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "60"))  # 空闲连接保留时长（秒）
+HTTP_CONNECT_TIMEOUT = float(os.getenv("LLM_HTTP_CONNECT_TIMEOUT", "5"))  # 建立连接的超时（秒）
+HTTP_READ_TIMEOUT = 600.0  # 默认读超时，实际调用的超时由chat_completion按阶段预算传入
+
+
+@dataclass
+class ProviderSpec:
+    """
+    OpenAI兼容服务商的配置，从环境变量{NAME}_*读取
+
+    如名为local的服务商：LOCAL_BASE_URL=http://10.0.0.5:8000/v1、LOCAL_MODEL=qwen2-7b-instruct，
+    可选LOCAL_API_KEYS（或LOCAL_API_KEY）、LOCAL_JSON_MODE=0（服务不支持response_format时去掉该参数）、
+    LOCAL_CONTEXT_WINDOW=32768、LOCAL_STREAM=0（服务不支持流式请求时使用普通请求，取消时无法关闭连接）。
+    """
+    name: str
+    base_url: Optional[str]
+    keys: List[Tuple[str, float]] = field(default_factory=list)
+    model: Optional[str] = None
+    json_mode: bool = True
+    context_window: Optional[int] = None
+    stream: bool = True
+
+
+def _env(name: str, key: str) -> str:
+    return os.getenv(f"{name.upper()}_{key}", "")
+
+
+def is_provider(name: str) -> bool:
+    """是否为已配置的服务商名称"""
+    return name in (ZHIPU_PROVIDER, OPENAI_PROVIDER) or bool(_env(name, "BASE_URL"))
+
+
+def provider_spec(name: str) -> ProviderSpec:
+    """
+    读取OpenAI兼容服务商的配置
+
+    Raises:
+        LLMGenerationError: 服务商未配置接口地址
+    """
+    base_url = _env(name, "BASE_URL") or None
+    if base_url is None and name != OPENAI_PROVIDER:
+        raise LLMGenerationError(f"服务商{name}未配置接口地址（{name.upper()}_BASE_URL）")
+    window = _env(name, "CONTEXT_WINDOW")
+    return ProviderSpec(
+        name=name,
+        base_url=base_url,
+        keys=parse_api_keys(_env(name, "API_KEYS") or _env(name, "API_KEY")),
+        model=_env(name, "MODEL") or None,
+        json_mode=_env(name, "JSON_MODE") != "0",
+        context_window=int(window) if window else None,
+        stream=_env(name, "STREAM") != "0"
+    )
+
+
+def split_model(model: str, default_provider: str) -> Tuple[str, str]:
+    """
+    拆分路由中的"服务商:模型"
+
+    冒号前不是已配置的服务商时视为模型名的一部分（如qwen2:7b），使用默认服务商。
+
+    Returns:
+        Tuple[str, str]: (服务商, 模型)
+    """
+    provider, sep, name = model.partition(":")
+    if sep and name and is_provider(provider):
+        return provider, name
+    return default_provider, model
+
+
+def default_model(provider: str) -> str:
+    """
+    服务商的默认模型
+
+    Raises:
+        LLMGenerationError: OpenAI兼容服务商未配置模型（{NAME}_MODEL）
+    """
+    if provider == ZHIPU_PROVIDER:
+        return ZHIPU_DEFAULT_MODEL
+    model = _spec(provider).model
+    if not model:
+        raise LLMGenerationError(f"服务商{provider}未配置模型（{provider.upper()}_MODEL）")
+    return model
+
+
+def _http_client() -> Any:
+    """带连接池的HTTP客户端，同一服务商的所有密钥共用"""
+    import httpx
+    return httpx.Client(
+        limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS,
+                            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY),
+        timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+    )
+
+
+class _StreamingCompletions:
+    """以流式请求调用对话接口并拼接为与普通请求相同的响应；运行被取消时关闭连接，不必等到调用自身超时"""
+
+    def __init__(self, completions: Any):
+        self._completions = completions
+
+    def create(self, **kwargs: Any) -> Any:
+        extra_body = {**kwargs.pop("extra_body", {}), "stream_options": {"include_usage": True}}
+        stream = self._completions.create(stream=True, extra_body=extra_body, **kwargs)
+        on_cancel(stream.response.close)
+        content: List[str] = []
+        finish_reason, usage, model = None, None, kwargs.get("model")
+        try:
+            for chunk in stream:
+                model = getattr(chunk, "model", None) or model
+                usage = getattr(chunk, "usage", None) or usage
+                for choice in chunk.choices or []:
+                    if choice.delta is not None and choice.delta.content:
+                        content.append(choice.delta.content)
+                    finish_reason = choice.finish_reason or finish_reason
+        finally:
+            stream.response.close()
+        message = SimpleNamespace(role="assistant", content="".join(content))
+        return SimpleNamespace(model=model, usage=usage,
+                               choices=[SimpleNamespace(index=0, finish_reason=finish_reason, message=message)])
+
+
+class _StreamingClient:
+    """对话请求改为流式的客户端，其他接口（文件、批量任务等）直接使用SDK客户端"""
+
+    def __init__(self, client: Any):
+        self._client = client
+        self.chat = SimpleNamespace(completions=_StreamingCompletions(client.chat.completions))
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._client, name)
+
+
+def _openai_client(spec: ProviderSpec) -> PooledClient:
+    from openai import OpenAI
+    http_client = _http_client()
+
+    def create(key: str) -> Any:
+        # 自部署服务通常不校验密钥，但SDK要求非空
+        client = OpenAI(api_key=key or "EMPTY", base_url=spec.base_url, http_client=http_client)
+        return _StreamingClient(client) if spec.stream else client
+
+    return PooledClient(KeyPool(spec.keys or [("", 1.0)], create))
+
+
+_clients: Dict[str, Any] = {}
+_specs: Dict[str, ProviderSpec] = {}
+_clients_lock = threading.RLock()
+
+
+def _spec(provider: str) -> Optional[ProviderSpec]:
+    """OpenAI兼容服务商的配置（首次使用时读取），智谱返回None"""
+    if provider == ZHIPU_PROVIDER:
+        return None
+    with _clients_lock:
+        if provider not in _specs:
+            _specs[provider] = provider_spec(provider)
+        return _specs[provider]
+
+
+def get_client(provider: str) -> Any:
+    """
+    获取服务商的客户端（进程内共享），接口与智谱SDK客户端相同
+
+    Raises:
+        LLMGenerationError: 服务商未配置
+    """
+    with _clients_lock:
+        if provider not in _clients:
+            if provider == ZHIPU_PROVIDER:
+                _clients[provider] = PooledClient(get_key_pool())
+            else:
+                _clients[provider] = _openai_client(_spec(provider))
+        return _clients[provider]
+
+
+def request_kwargs(provider: str, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """按服务商能力调整请求参数：不支持JSON模式的服务去掉response_format，由提示词约束输出格式"""
+    spec = _spec(provider)
+    if spec is not None and not spec.json_mode and "response_format" in kwargs:
+        return {key: value for key, value in kwargs.items() if key != "response_format"}
+    return kwargs
+
+
+def provider_context_window(provider: str, model: str) -> int:
+    """模型的上下文窗口，OpenAI兼容服务商可用{NAME}_CONTEXT_WINDOW指定"""
+    spec = _spec(provider)
+    if spec is not None and spec.context_window:
+        return spec.context_window
+    return context_window(model)
@@ -0,0 +1,104 @@
+"""
+相同请求合并模块
+内容相同的请求同时进行时只发出第一个，后到的调用方等待它的结果；线程和asyncio任务均可使用
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+SINGLEFLIGHT_ENABLED = os.getenv("LLM_SINGLEFLIGHT", "1") == "1"  # 是否合并相同的进行中请求
+
+
+def request_key(*parts: Any) -> str:
+    """请求内容的哈希，作为合并的键"""
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """按键合并进行中的调用"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        self.calls = 0  # 实际发出的调用数
+        self.coalesced = 0  # 等待其他调用结果而省下的调用数
+
+    def _join(self, key: str) -> Tuple[Future, bool]:
+        """加入或发起一次调用，返回结果Future和是否为发起方"""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = Future()
+            self._inflight[key] = future
+            self.calls += 1
+            return future, True
+
+    def _finish(self, key: str, future: Future, result: Any = None, error: BaseException = None) -> None:
+        with self._lock:
+            self._inflight.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key: str, func: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        执行调用，同键调用进行中时等待其结果
+
+        Args:
+            key: 请求内容的哈希
+            func: 发出调用的无参函数
+
+        Returns:
+            Tuple[Any, bool]: 结果，以及是否来自其他调用方（发起方失败时等待方收到同样的异常）
+        """
+        future, leader = self._join(key)
+        if not leader:
+            return future.result(), True
+        try:
+            result = func()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result, False
+
+    async def do_async(self, key: str, func: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        do的协程版本，与线程中的同键调用共享结果
+
+        Args:
+            key: 请求内容的哈希
+            func: 返回协程的无参函数
+        """
+        future, leader = self._join(key)
+        if not leader:
+            return await asyncio.wrap_future(future), True
+        try:
+            result = await func()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result, False
+
+    def stats(self) -> Dict[str, Any]:
+        """合并统计：实际调用数、省下的调用数和合并比例"""
+        with self._lock:
+            total = self.calls + self.coalesced
+            return {
+                "calls": self.calls,
+                "coalesced": self.coalesced,
+                "saved_ratio": round(self.coalesced / total, 4) if total else 0.0
+            }
+
+
+# LLM调用共用的合并器
+llm_singleflight = SingleFlight()
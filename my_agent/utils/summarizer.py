@@ -0,0 +1,196 @@
+"""
+教材抽取式摘要模块
+在本地用TextRank对句子排序，把每章内容压缩到指定比例，并始终保留标题和概念定义句
+"""
+import math
+import os
+import re
+from collections import defaultdict
+from typing import Dict, Any, List, Callable, Optional
+
+SUMMARY_RATIO = float(os.getenv("SUMMARY_RATIO", "0.3"))  # 默认保留的内容比例
+DAMPING = 0.85  # TextRank阻尼系数
+MAX_ITERATIONS = 50  # 迭代上限
+TOLERANCE = 1e-4  # 收敛阈值
+MAX_SHARED_RATIO = 0.5  # 长章节中出现在超过该比例句子中的二元组视为停用项，不参与相似度计算
+MIN_SENTENCES_FOR_STOP = 20  # 句子数达到该值才过滤高频二元组
+
+_SENTENCE_PATTERN = re.compile(r"[^。！？!?；;]+[。！？!?；;]*")
+_HEADING_PATTERN = re.compile(
+    r"^\s*(第[一二三四五六七八九十百零\d]+[章节单元课部分篇]|[一二三四五六七八九十]+、|（[一二三四五六七八九十]+）|\d+(\.\d+)*[\.、\s])"
+)
+_DEFINITION_PATTERN = re.compile(r"是指|称为|叫做|定义为|所谓|指的是|即为")
+_TERMINAL_PUNCTUATION = "。！？!?；;，,：:"
+HEADING_MAX_CHARS = 30  # 超过该长度的行不视为标题
+
+
+def _is_heading(line: str) -> bool:
+    """判断一行是否为标题：编号开头，或者是不以标点结尾的短行"""
+    line = line.strip()
+    if not line or len(line) > HEADING_MAX_CHARS:
+        return False
+    return bool(_HEADING_PATTERN.match(line)) or line[-1] not in _TERMINAL_PUNCTUATION
+
+
+def split_units(text: str) -> List[Dict[str, Any]]:
+    """
+    将文本切分为标题和句子
+
+    Args:
+        text: 章节文本
+
+    Returns:
+        List[Dict[str, Any]]: 按原顺序排列的单元，含text、heading（是否标题）、line_end（是否行尾）
+    """
+    units: List[Dict[str, Any]] = []
+    paragraph: List[str] = []
+
+    def flush() -> None:
+        # PDF提取的文本按版面折行，先把折行拼回段落再切句
+        sentences = [s for s in _SENTENCE_PATTERN.findall("".join(paragraph)) if s.strip()]
+        for i, sentence in enumerate(sentences):
+            units.append({"text": sentence, "heading": False, "line_end": i == len(sentences) - 1})
+        paragraph.clear()
+
+    for line in text.split("\n"):
+        if not line.strip():
+            flush()
+            continue
+        if _is_heading(line):
+            flush()
+            units.append({"text": line.strip(), "heading": True, "line_end": True})
+            continue
+        paragraph.append(line.strip())
+        # 以句末标点结尾的短行视为段落结束
+        if line.strip()[-1] in "。！？!?" and len(line.strip()) < HEADING_MAX_CHARS:
+            flush()
+    flush()
+    return units
+
+
+def _bigrams(text: str) -> Dict[str, int]:
+    """按字二元组统计词频（中文无需分词）"""
+    chars = [ch for ch in text if not ch.isspace() and ch not in _TERMINAL_PUNCTUATION]
+    counts: Dict[str, int] = defaultdict(int)
+    for a, b in zip(chars, chars[1:]):
+        counts[a + b] += 1
+    return counts
+
+
+def textrank_scores(sentences: List[str]) -> List[float]:
+    """
+    计算句子的TextRank得分
+
+    相似度矩阵以稀疏形式构建：通过二元组倒排索引只计算共享二元组的句子对，
+    相似度为共享二元组数除以两句长度对数之和。
+
+    Args:
+        sentences: 句子列表
+
+    Returns:
+        List[float]: 每个句子的得分
+    """
+    n = len(sentences)
+    if n <= 2:
+        return [1.0] * n
+
+    grams = [_bigrams(s) for s in sentences]
+    index: Dict[str, List[int]] = defaultdict(list)
+    for i, counts in enumerate(grams):
+        for gram in counts:
+            index[gram].append(i)
+
+    # 稀疏相似度矩阵：overlap[i][j] = 共享二元组数
+    max_shared = max(2, int(n * MAX_SHARED_RATIO)) if n >= MIN_SENTENCES_FOR_STOP else n
+    overlap: List[Dict[int, int]] = [defaultdict(int) for _ in range(n)]
+    for ids in index.values():
+        if len(ids) < 2 or len(ids) > max_shared:
+            continue
+        for a in range(len(ids)):
+            for b in range(a + 1, len(ids)):
+                overlap[ids[a]][ids[b]] += 1
+                overlap[ids[b]][ids[a]] += 1
+
+    lengths = [math.log(max(2, sum(counts.values()) + 1)) for counts in grams]
+    weights: List[Dict[int, float]] = []
+    for i in range(n):
+        weights.append({j: shared / (lengths[i] + lengths[j]) for j, shared in overlap[i].items()})
+    out_sums = [sum(row.values()) for row in weights]
+
+    # 幂迭代
+    scores = [1.0 / n] * n
+    for _ in range(MAX_ITERATIONS):
+        contributions = [scores[j] / out_sums[j] if out_sums[j] else 0.0 for j in range(n)]
+        updated = [
+            (1 - DAMPING) / n + DAMPING * sum(w * contributions[j] for j, w in weights[i].items())
+            for i in range(n)
+        ]
+        delta = sum(abs(a - b) for a, b in zip(updated, scores))
+        scores = updated
+        if delta < TOLERANCE:
+            break
+    return scores
+
+
+def summarize_text(text: str, ratio: float = SUMMARY_RATIO, budget: Optional[float] = None,
+                   cost: Callable[[str], float] = len) -> str:
+    """
+    抽取式摘要：保留标题和定义句，其余句子按TextRank得分从高到低选取，按原顺序输出
+
+    Args:
+        text: 原文本
+        ratio: 保留比例（按cost计），budget给出时忽略
+        budget: 保留内容的上限（按cost计），如token数
+        cost: 单元的开销函数，默认按字符数
+
+    Returns:
+        str: 摘要文本
+    """
+    units = split_units(text)
+    if not units:
+        return ""
+    costs = [cost(u["text"]) for u in units]
+    limit = budget if budget is not None else sum(costs) * max(0.0, min(1.0, ratio))
+    if sum(costs) <= limit:
+        return text
+
+    # 标题和定义句优先保留
+    protected = [i for i, u in enumerate(units) if u["heading"] or _DEFINITION_PATTERN.search(u["text"])]
+    protected_set = set(protected)
+    candidates = [i for i in range(len(units)) if i not in protected_set]
+    scores = textrank_scores([units[i]["text"] for i in candidates])
+    ranked = [i for _, i in sorted(zip(scores, candidates), key=lambda pair: (-pair[0], pair[1]))]
+
+    selected, used = set(), 0.0
+    for i in protected + ranked:
+        if used + costs[i] > limit:
+            continue
+        selected.add(i)
+        used += costs[i]
+
+    parts = []
+    for i in sorted(selected):
+        if units[i]["heading"] and parts and parts[-1] != "\n":
+            parts.append("\n")
+        parts.append(units[i]["text"].strip() if units[i]["heading"] else units[i]["text"])
+        if units[i]["line_end"]:
+            parts.append("\n")
+    return "".join(parts).strip()
+
+
+def summarize_textbook(textbook: Dict[str, Any], ratio: float = SUMMARY_RATIO) -> Dict[str, Any]:
+    """
+    将教材每一章压缩到指定比例
+
+    Args:
+        textbook: extract_text_from_pdf返回的教材内容
+        ratio: 保留比例
+
+    Returns:
+        Dict[str, Any]: 结构不变、内容压缩后的教材
+    """
+    chapters = [
+        dict(chapter, content=summarize_text(str(chapter.get("content", "")), ratio=ratio))
+        for chapter in textbook.get("chapters", [])
+    ]
+    return {**textbook, "chapters": [c for c in chapters if c.get("content")]}
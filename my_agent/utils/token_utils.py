@@ -0,0 +1,260 @@
+"""
+Token估算与上下文预算模块
+在本地估算提示词的token数（针对中文教材文本校准），并据此决定教材内容是直接发送、分块发送还是压缩后发送
+"""
+import json
+import re
+import threading
+from typing import Dict, Any, List, Tuple
+
+from my_agent.utils.summarizer import summarize_text
+
+# 各模型的上下文窗口（token）
+CONTEXT_WINDOWS = {
+    "glm-4-air": 128000,
+    "glm-4-flash": 128000,
+    "glm-4-plus": 128000,
+    "glm-4-airx": 8192,
+    "glm-4v-flash": 8192,
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# 各类字符的平均token数（GLM-4系列分词器，中文约1.4字/token，英文约4字符/token）
+_GLM4_TOKEN_RATES = {"cjk": 0.72, "alnum": 0.27, "space": 0.1, "other": 0.6}
+TOKEN_RATES = {model: _GLM4_TOKEN_RATES for model in CONTEXT_WINDOWS}
+DEFAULT_TOKEN_RATES = {"cjk": 0.75, "alnum": 0.3, "space": 0.1, "other": 0.6}
+
+MESSAGE_OVERHEAD_TOKENS = 4  # 每条消息的角色与分隔符开销
+OUTPUT_TOKEN_RESERVE = 4096  # 为模型输出预留的token数
+CONTEXT_SAFETY_RATIO = 0.9  # 估算存在误差，只使用上下文窗口的90%
+
+_CJK_PATTERN = re.compile(r"[　-〿㐀-䶿一-鿿＀-￯]")
+_ALNUM_PATTERN = re.compile(r"[A-Za-z0-9]")
+_SPACE_PATTERN = re.compile(r"\s")
+_SENTENCE_PATTERN = re.compile(r"[^。！？!?；;\n]+[。！？!?；;\n]*")
+
+
+def context_window(model: str) -> int:
+    """获取模型的上下文窗口大小"""
+    return CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW)
+
+
+def estimate_tokens(text: str, model: str = "glm-4-air") -> int:
+    """
+    估算文本的token数
+
+    Args:
+        text: 文本
+        model: 模型名称
+
+    Returns:
+        int: 估算的token数
+    """
+    if not text:
+        return 0
+    rates = TOKEN_RATES.get(model, DEFAULT_TOKEN_RATES)
+    cjk = len(_CJK_PATTERN.findall(text))
+    alnum = len(_ALNUM_PATTERN.findall(text))
+    space = len(_SPACE_PATTERN.findall(text))
+    other = len(text) - cjk - alnum - space
+    tokens = cjk * rates["cjk"] + alnum * rates["alnum"] + space * rates["space"] + other * rates["other"]
+    return int(tokens) + 1
+
+
+def estimate_messages_tokens(messages: List[Dict[str, str]], model: str = "glm-4-air") -> int:
+    """估算一组对话消息的token数"""
+    return sum(estimate_tokens(str(m.get("content", "")), model) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+def content_budget(model: str, *fixed_texts: str) -> int:
+    """
+    计算单次调用中留给教材内容的token预算
+
+    Args:
+        model: 模型名称
+        fixed_texts: 提示词中除教材内容外的固定部分（系统提示、模板等）
+
+    Returns:
+        int: 教材内容可用的token数
+    """
+    used = sum(estimate_tokens(text, model) + MESSAGE_OVERHEAD_TOKENS for text in fixed_texts)
+    usable = int(context_window(model) * CONTEXT_SAFETY_RATIO) - OUTPUT_TOKEN_RESERVE
+    return max(0, usable - used)
+
+
+def _dump(content: Any) -> str:
+    """与提示词中一致的序列化方式"""
+    return json.dumps(content, indent=2, ensure_ascii=False)
+
+
+def condense_text(text: str, max_tokens: int, model: str = "glm-4-air") -> str:
+    """
+    将文本压缩到token预算内（TextRank抽取式摘要，保留标题和定义句）
+
+    Args:
+        text: 原文本
+        max_tokens: token上限
+        model: 模型名称
+
+    Returns:
+        str: 压缩后的文本
+    """
+    if estimate_tokens(text, model) <= max_tokens:
+        return text
+    return summarize_text(text, budget=max_tokens, cost=lambda sentence: estimate_tokens(sentence, model))
+
+
+def _split_text(text: str, max_tokens: int, model: str) -> List[str]:
+    """按句子边界把过长的文本切成不超过max_tokens的片段"""
+    pieces, current, used = [], [], 0
+    for sentence in _SENTENCE_PATTERN.findall(text):
+        cost = estimate_tokens(sentence, model)
+        if current and used + cost > max_tokens:
+            pieces.append("".join(current))
+            current, used = [], 0
+        current.append(sentence)
+        used += cost
+    if current:
+        pieces.append("".join(current))
+    return pieces
+
+
+def chunk_textbook(textbook: Dict[str, Any], max_tokens: int, model: str = "glm-4-air") -> List[Dict[str, Any]]:
+    """
+    按章节（页）把教材切成多个块，每块序列化后不超过token预算
+
+    Args:
+        textbook: 教材内容（含title和chapters）
+        max_tokens: 每块的token上限
+        model: 模型名称
+
+    Returns:
+        List[Dict[str, Any]]: 与原教材结构相同的教材块
+    """
+    title = textbook.get("title", "")
+    base_cost = estimate_tokens(_dump({"title": title, "chapters": []}), model)
+    page_budget = max(1, max_tokens - base_cost)
+
+    # 单页超出预算时先按句子切开
+    chapters = []
+    for chapter in textbook.get("chapters", []):
+        cost = estimate_tokens(_dump(chapter), model)
+        if cost <= page_budget:
+            chapters.append((chapter, cost))
+            continue
+        for piece in _split_text(str(chapter.get("content", "")), page_budget, model):
+            part = dict(chapter, content=piece)
+            chapters.append((part, estimate_tokens(_dump(part), model)))
+
+    chunks, current, used = [], [], 0
+    for chapter, cost in chapters:
+        if current and used + cost > page_budget:
+            chunks.append({"title": title, "chapters": current})
+            current, used = [], 0
+        current.append(chapter)
+        used += cost
+    if current or not chunks:
+        chunks.append({"title": title, "chapters": current})
+    return chunks
+
+
+def condense_textbook(textbook: Dict[str, Any], max_tokens: int, model: str = "glm-4-air") -> Dict[str, Any]:
+    """
+    把教材压缩到token预算内：各章节按原长度等比例分配预算，每章做抽取式摘要
+
+    Args:
+        textbook: 教材内容（含title和chapters）
+        max_tokens: token上限
+        model: 模型名称
+
+    Returns:
+        Dict[str, Any]: 压缩后的教材内容
+    """
+    chapters = textbook.get("chapters", [])
+    title = textbook.get("title", "")
+    # 每章的结构开销（页码、键名、缩进）单独扣除
+    overhead = estimate_tokens(_dump({"title": title, "chapters": [dict(c, content="") for c in chapters]}), model)
+    available = max(0, max_tokens - overhead)
+    costs = [estimate_tokens(str(c.get("content", "")), model) for c in chapters]
+    total = sum(costs) or 1
+    condensed = [
+        dict(chapter, content=condense_text(str(chapter.get("content", "")), int(available * cost / total), model))
+        for chapter, cost in zip(chapters, costs)
+    ]
+    return {**textbook, "chapters": [c for c in condensed if c.get("content")]}
+
+
+def plan_textbook(textbook: Dict[str, Any], max_tokens: int, model: str = "glm-4-air",
+                  max_chunks: int = 1) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    决定教材内容的发送方式
+
+    Args:
+        textbook: 教材内容
+        max_tokens: 单次调用中教材内容的token预算
+        model: 模型名称
+        max_chunks: 调用方能接受的最大分块数，1表示不能分块
+
+    Returns:
+        Tuple[str, List[Dict[str, Any]]]: 发送方式（"direct"直接发送、"chunk"分块、"summarize"压缩）和对应的教材内容列表
+    """
+    if estimate_tokens(_dump(textbook), model) <= max_tokens:
+        return "direct", [textbook]
+    if max_chunks > 1:
+        chunks = chunk_textbook(textbook, max_tokens, model)
+        if len(chunks) <= max_chunks:
+            return "chunk", chunks
+    return "summarize", [condense_textbook(textbook, max_tokens, model)]
+
+
+class TokenUsageLog:
+    """累计每次调用的估算token数与实际token数，用于评估估算准确度；只保存计数和总和，常驻进程中占用不随调用增长"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """清空累计值"""
+        with self._lock:
+            self.calls = 0
+            self.measured = 0  # 返回了实际用量的调用数
+            self.estimated_tokens = 0
+            self.actual_tokens = 0
+            self.abs_error_total = 0.0  # 各次相对偏差绝对值之和
+
+    def record(self, stage: str, model: str, estimated: int, actual: Any) -> None:
+        """记录一次调用"""
+        with self._lock:
+            self.calls += 1
+            if actual:
+                self.measured += 1
+                self.estimated_tokens += estimated
+                self.actual_tokens += actual
+                self.abs_error_total += abs(estimated - actual) / actual
+        if actual:
+            print(f"token估算 [{stage}] 估算{estimated}，实际{actual}，偏差{(estimated - actual) / actual:+.1%}")
+        else:
+            print(f"token估算 [{stage}] 估算{estimated}，未返回实际用量")
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        汇总估算准确度（自创建或上次reset以来）
+
+        Returns:
+            Dict[str, Any]: 调用次数、估算与实际token总数、平均绝对偏差
+        """
+        with self._lock:
+            if not self.measured:
+                return {"calls": self.calls, "measured": 0}
+            return {
+                "calls": self.calls,
+                "measured": self.measured,
+                "estimated_tokens": self.estimated_tokens,
+                "actual_tokens": self.actual_tokens,
+                "mean_abs_error": round(self.abs_error_total / self.measured, 4)
+            }
+
+
+# 全局token用量记录
+token_usage_log = TokenUsageLog()
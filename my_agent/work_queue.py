@@ -0,0 +1,407 @@
+"""
+工作队列
+多个工作进程从共享队列领取教材：领取时获得租约，处理期间定期续租，各阶段结果作为检查点写回队列；
+工作进程崩溃后租约到期，任务由其他进程回收并从检查点继续。默认用SQLite文件实现，只适用于同一台机器上的多个进程：
+WAL模式依赖共享内存，NFS、SMB等网络文件系统上的文件锁也不可靠，队列文件不能放在共享目录中供多台机器使用。
+跨机器部署时用其他消息代理（如Redis、数据库服务）实现WorkQueue的方法即可替换
+
+用法：
+    python -m my_agent.work_queue enqueue QUEUE.db 教材.pdf 16 [32 ...] [--lane interactive]
+    python -m my_agent.work_queue work QUEUE.db [--processes 4] [--exit-when-empty]
+    python -m my_agent.work_queue status QUEUE.db
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+from my_agent.agent import TeachingAgent
+from my_agent.config import RUN_TIMEOUT
+from my_agent.utils.deadline import CancelToken
+from my_agent.utils.pdf_utils import extract_text_from_pdf
+from my_agent.utils.prepare_cache import file_hash
+
+WORK_LEASE_SECONDS = float(os.getenv("WORK_LEASE_SECONDS", "120"))  # 租约时长，超过未续租视为工作进程已崩溃
+WORK_HEARTBEAT_SECONDS = float(os.getenv("WORK_HEARTBEAT_SECONDS", "30"))  # 续租间隔，应明显小于租约时长
+WORK_MAX_ATTEMPTS = int(os.getenv("WORK_MAX_ATTEMPTS", "3"))  # 每个任务最多领取次数，超过后标记失败
+WORK_POLL_SECONDS = float(os.getenv("WORK_POLL_SECONDS", "5"))  # 队列为空时的轮询间隔
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+INTERACTIVE, BULK = 0, 1  # 优先级通道，数值小的先被领取
+LANES = {"interactive": INTERACTIVE, "bulk": BULK}
+
+# 可作为检查点的节点及其输出字段：三者齐全时回收的任务直接从设计活动继续
+CHECKPOINT_FIELDS = {
+    "process_textbook": "textbook_content",
+    "generate_objectives": "objectives",
+    "analyze_knowledge": "knowledge_points"
+}
+EXTRACT_STAGE = "extract"  # 提取的原始教材内容
+RESULT_FIELDS = ("objectives", "knowledge_points", "activities", "variant_activities", "assessment")
+
+
+def job_key(digest: str, total_hours: List[int]) -> str:
+    """任务ID：教材内容哈希加课时，相同教材和课时的任务ID相同"""
+    return f"{digest[:16]}-{'-'.join(str(hours) for hours in total_hours)}"
+
+
+@dataclass
+class WorkItem:
+    """领取到的任务"""
+    job_id: str
+    pdf_path: str
+    total_hours: List[int]
+    attempts: int
+    checkpoint: Dict[str, Any] = field(default_factory=dict)  # 阶段名到已保存结果的映射
+
+
+class WorkQueue(ABC):
+    """工作队列接口：领取、续租、检查点和结果都以(任务, 工作进程)校验租约，租约已被他人接管时返回False"""
+
+    @abstractmethod
+    def enqueue(self, pdf_path: str, total_hours: List[int], priority: int = BULK) -> str:
+        """
+        添加任务，返回任务ID
+
+        同一教材和课时已在队列中时不重复添加：待处理的任务按较高的优先级领取，已失败的任务重新排队。
+        """
+
+    @abstractmethod
+    def claim(self, worker_id: str, lease_seconds: float = WORK_LEASE_SECONDS,
+              priorities: Optional[List[int]] = None) -> Optional[WorkItem]:
+        """领取一个待处理或租约已过期的任务（先按优先级，再按添加顺序），可限定优先级，没有时返回None"""
+
+    @abstractmethod
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: float = WORK_LEASE_SECONDS) -> bool:
+        """续租"""
+
+    @abstractmethod
+    def save_stage(self, job_id: str, worker_id: str, stage: str, result: Any) -> bool:
+        """保存阶段结果作为检查点"""
+
+    @abstractmethod
+    def complete(self, job_id: str, worker_id: str, result: Dict[str, Any]) -> bool:
+        """标记任务完成并保存结果"""
+
+    @abstractmethod
+    def fail(self, job_id: str, worker_id: str, error: str) -> bool:
+        """任务失败：未超过最大尝试次数时放回队列，否则标记失败"""
+
+    @abstractmethod
+    def result(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """已完成任务的结果，未完成时返回None"""
+
+    @abstractmethod
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """任务的状态和已完成的阶段，任务不存在时返回None"""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        """各状态的任务数和回收次数"""
+
+
+class SQLiteWorkQueue(WorkQueue):
+    """基于SQLite文件的工作队列，同一台机器上的多个进程可同时使用，队列文件须在本地磁盘上"""
+
+    def __init__(self, path: str, max_attempts: int = WORK_MAX_ATTEMPTS):
+        """
+        Args:
+            path: 数据库文件路径
+            max_attempts: 每个任务最多领取次数
+        """
+        self.path = path
+        self.max_attempts = max_attempts
+        with self._transaction() as db:
+            db.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY, pdf_path TEXT NOT NULL, total_hours TEXT NOT NULL,
+                status TEXT NOT NULL, worker TEXT, lease_until REAL, attempts INTEGER NOT NULL DEFAULT 0,
+                reclaims INTEGER NOT NULL DEFAULT 0, result TEXT, error TEXT, created REAL, updated REAL,
+                priority INTEGER NOT NULL DEFAULT 1)""")
+            # 兼容没有优先级列的旧队列文件
+            if "priority" not in [row[1] for row in db.execute("PRAGMA table_info(jobs)")]:
+                db.execute(f"ALTER TABLE jobs ADD COLUMN priority INTEGER NOT NULL DEFAULT {BULK}")
+            db.execute("""CREATE TABLE IF NOT EXISTS stages (
+                job_id TEXT NOT NULL, stage TEXT NOT NULL, result TEXT NOT NULL, worker TEXT, updated REAL,
+                PRIMARY KEY (job_id, stage))""")
+            db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, priority, created)")
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """每次操作使用独立连接并立即加写锁，续租线程和工作线程互不干扰"""
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+        finally:
+            db.close()
+
+    def enqueue(self, pdf_path: str, total_hours: List[int], priority: int = BULK) -> str:
+        total_hours = sorted(set(total_hours))
+        job_id = job_key(file_hash(pdf_path), total_hours)
+        now = time.time()
+        with self._transaction() as db:
+            db.execute("INSERT OR IGNORE INTO jobs (id, pdf_path, total_hours, status, priority, created, updated) "
+                       "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                       (job_id, os.path.abspath(pdf_path), json.dumps(total_hours), PENDING, priority, now, now))
+            db.execute("UPDATE jobs SET priority = MIN(priority, ?) WHERE id = ?", (priority, job_id))
+            db.execute("UPDATE jobs SET status = ?, attempts = 0, error = NULL, updated = ? WHERE id = ? AND status = ?",
+                       (PENDING, now, job_id, FAILED))
+        return job_id
+
+    def claim(self, worker_id: str, lease_seconds: float = WORK_LEASE_SECONDS,
+              priorities: Optional[List[int]] = None) -> Optional[WorkItem]:
+        now = time.time()
+        with self._transaction() as db:
+            # 租约过期且已用完尝试次数的任务不再回收
+            db.execute("UPDATE jobs SET status = ?, worker = NULL, error = ?, updated = ? "
+                       "WHERE status = ? AND lease_until < ? AND attempts >= ?",
+                       (FAILED, f"工作进程{self.max_attempts}次未能完成（租约过期）", now,
+                        RUNNING, now, self.max_attempts))
+            lanes = "" if priorities is None else f" AND priority IN ({', '.join('?' for _ in priorities)})"
+            row = db.execute("SELECT id, pdf_path, total_hours, status, attempts FROM jobs "
+                             f"WHERE (status = ? OR (status = ? AND lease_until < ?)){lanes} "
+                             "ORDER BY priority, created LIMIT 1",
+                             (PENDING, RUNNING, now, *(priorities or []))).fetchone()
+            if row is None:
+                return None
+            job_id, pdf_path, total_hours, status, attempts = row
+            reclaimed = status == RUNNING
+            db.execute("UPDATE jobs SET status = ?, worker = ?, lease_until = ?, attempts = attempts + 1, "
+                       "reclaims = reclaims + ?, updated = ? WHERE id = ?",
+                       (RUNNING, worker_id, now + lease_seconds, int(reclaimed), now, job_id))
+            checkpoint = {stage: json.loads(result) for stage, result in
+                          db.execute("SELECT stage, result FROM stages WHERE job_id = ?", (job_id,))}
+        if reclaimed:
+            print(f"回收任务{job_id}（租约已过期），已有检查点: {', '.join(checkpoint) or '无'}")
+        return WorkItem(job_id, pdf_path, json.loads(total_hours), attempts + 1, checkpoint)
+
+    @staticmethod
+    def _owned(db: sqlite3.Connection, job_id: str, worker_id: str) -> bool:
+        return db.execute("SELECT 1 FROM jobs WHERE id = ? AND worker = ? AND status = ?",
+                          (job_id, worker_id, RUNNING)).fetchone() is not None
+
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: float = WORK_LEASE_SECONDS) -> bool:
+        now = time.time()
+        with self._transaction() as db:
+            return db.execute("UPDATE jobs SET lease_until = ?, updated = ? WHERE id = ? AND worker = ? AND status = ?",
+                              (now + lease_seconds, now, job_id, worker_id, RUNNING)).rowcount == 1
+
+    def save_stage(self, job_id: str, worker_id: str, stage: str, result: Any) -> bool:
+        with self._transaction() as db:
+            if not self._owned(db, job_id, worker_id):
+                return False
+            db.execute("INSERT OR REPLACE INTO stages (job_id, stage, result, worker, updated) VALUES (?, ?, ?, ?, ?)",
+                       (job_id, stage, json.dumps(result, ensure_ascii=False), worker_id, time.time()))
+            return True
+
+    def complete(self, job_id: str, worker_id: str, result: Dict[str, Any]) -> bool:
+        with self._transaction() as db:
+            return db.execute("UPDATE jobs SET status = ?, result = ?, error = NULL, lease_until = NULL, updated = ? "
+                              "WHERE id = ? AND worker = ? AND status = ?",
+                              (DONE, json.dumps(result, ensure_ascii=False, default=str), time.time(),
+                               job_id, worker_id, RUNNING)).rowcount == 1
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> bool:
+        with self._transaction() as db:
+            return db.execute("UPDATE jobs SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, "
+                              "worker = NULL, lease_until = NULL, error = ?, updated = ? "
+                              "WHERE id = ? AND worker = ? AND status = ?",
+                              (self.max_attempts, FAILED, PENDING, error, time.time(),
+                               job_id, worker_id, RUNNING)).rowcount == 1
+
+    def result(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """已完成任务的结果"""
+        with self._transaction() as db:
+            row = db.execute("SELECT result FROM jobs WHERE id = ? AND status = ?", (job_id, DONE)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._transaction() as db:
+            row = db.execute("SELECT status, priority, attempts, error, total_hours, updated FROM jobs WHERE id = ?",
+                             (job_id,)).fetchone()
+            stages = [stage[0] for stage in
+                      db.execute("SELECT stage FROM stages WHERE job_id = ? ORDER BY updated", (job_id,))]
+        if row is None:
+            return None
+        status, priority, attempts, error, total_hours, updated = row
+        return {"job_id": job_id, "status": status, "priority": priority, "attempts": attempts, "error": error,
+                "total_hours": json.loads(total_hours), "stages": stages, "updated": updated}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._transaction() as db:
+            counts = dict(db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            reclaims = db.execute("SELECT COALESCE(SUM(reclaims), 0) FROM jobs").fetchone()[0]
+            failures = db.execute("SELECT id, error FROM jobs WHERE status = ?", (FAILED,)).fetchall()
+        return {
+            **{status: counts.get(status, 0) for status in (PENDING, RUNNING, DONE, FAILED)},
+            "reclaims": reclaims,
+            "errors": dict(failures)
+        }
+
+
+class QueueWorker:
+    """从工作队列领取教材并运行教学代理的工作进程"""
+
+    def __init__(self, work_queue: WorkQueue, worker_id: Optional[str] = None,
+                 agent_options: Optional[Dict[str, Any]] = None, lease_seconds: float = WORK_LEASE_SECONDS,
+                 heartbeat_seconds: float = WORK_HEARTBEAT_SECONDS):
+        """
+        Args:
+            work_queue: 工作队列
+            worker_id: 工作进程标识，默认为主机名、进程号加随机后缀
+            agent_options: 创建TeachingAgent的参数（fast_mode、summary_ratio、save_metrics）
+            lease_seconds: 租约时长
+            heartbeat_seconds: 续租间隔
+        """
+        self.queue = work_queue
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.agent = TeachingAgent(**(agent_options or {}))
+        self.lease_seconds = lease_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+
+    def _heartbeat(self, item: WorkItem, token: CancelToken, stop: threading.Event, lost: threading.Event) -> None:
+        """定期续租；租约已被其他进程接管时取消本次运行"""
+        while not stop.wait(self.heartbeat_seconds):
+            if not self.queue.heartbeat(item.job_id, self.worker_id, self.lease_seconds):
+                lost.set()
+                token.cancel(f"任务{item.job_id}的租约已失效")
+                return
+
+    def _resume_state(self, item: WorkItem) -> Optional[Dict[str, Any]]:
+        """检查点齐全时返回可直接继续的与课时无关阶段结果"""
+        checkpoint = item.checkpoint
+        if "generate_objectives" not in checkpoint or "analyze_knowledge" not in checkpoint:
+            return None
+        textbook_content = checkpoint.get("process_textbook") or checkpoint.get(EXTRACT_STAGE)
+        if textbook_content is None:
+            return None
+        return {"textbook_content": textbook_content, "objectives": checkpoint["generate_objectives"],
+                "knowledge_points": checkpoint["analyze_knowledge"]}
+
+    def process(self, item: WorkItem) -> bool:
+        """
+        处理一个任务
+
+        Returns:
+            bool: 是否完成；失败或租约已被接管时返回False
+        """
+        print(f"\n=== 工作进程{self.worker_id}处理任务{item.job_id}（第{item.attempts}次）===")
+        token = CancelToken(RUN_TIMEOUT)
+        stop, lost = threading.Event(), threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(item, token, stop, lost), daemon=True)
+        heartbeat.start()
+
+        def on_stage(stage: str, output: Dict[str, Any]) -> None:
+            # 每个完成的节点都记录下来作为进度，可作为检查点的节点同时保存其结果；
+            # 输出中没有该字段时不保存，避免用空值覆盖已有的检查点
+            if output.get("error"):
+                return
+            name = CHECKPOINT_FIELDS.get(stage)
+            if name is None:
+                self.queue.save_stage(item.job_id, self.worker_id, stage, None)
+            elif name in output:
+                self.queue.save_stage(item.job_id, self.worker_id, stage, output[name])
+
+        try:
+            resume = self._resume_state(item)
+            textbook_content = None
+            if resume is None:
+                textbook_content = item.checkpoint.get(EXTRACT_STAGE)
+                if textbook_content is None:
+                    textbook_content = extract_text_from_pdf(item.pdf_path)
+                    self.queue.save_stage(item.job_id, self.worker_id, EXTRACT_STAGE, textbook_content)
+            state = self.agent.run(item.pdf_path, item.total_hours, cancel_token=token,
+                                   textbook_content=textbook_content, resume=resume, on_stage=on_stage)
+            error = state.get("error")
+        except Exception as e:
+            error = str(e)
+        finally:
+            stop.set()
+            heartbeat.join()
+
+        if lost.is_set():
+            print(f"警告：{token.reason}，放弃本次结果")
+            return False
+        if error:
+            self.queue.fail(item.job_id, self.worker_id, error)
+            print(f"错误：任务{item.job_id}失败 - {error}")
+            return False
+        return self.queue.complete(item.job_id, self.worker_id, {key: state.get(key) for key in RESULT_FIELDS})
+
+    def run(self, exit_when_empty: bool = False, max_jobs: Optional[int] = None) -> int:
+        """
+        循环领取并处理任务
+
+        Args:
+            exit_when_empty: 队列中没有可领取的任务时退出，否则持续轮询
+            max_jobs: 最多处理的任务数
+
+        Returns:
+            int: 完成的任务数
+        """
+        completed = processed = 0
+        while max_jobs is None or processed < max_jobs:
+            item = self.queue.claim(self.worker_id, self.lease_seconds)
+            if item is None:
+                if exit_when_empty:
+                    break
+                time.sleep(WORK_POLL_SECONDS)
+                continue
+            processed += 1
+            completed += self.process(item)
+        return completed
+
+
+def _work(path: str, exit_when_empty: bool) -> None:
+    """单个工作进程的入口"""
+    worker = QueueWorker(SQLiteWorkQueue(path))
+    print(f"工作进程{worker.worker_id}完成{worker.run(exit_when_empty)}个任务")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="工作队列（单机多进程）")
+    commands = parser.add_subparsers(dest="command", required=True)
+    enqueue = commands.add_parser("enqueue", help="添加教材")
+    enqueue.add_argument("queue_path")
+    enqueue.add_argument("pdf_path")
+    enqueue.add_argument("total_hours", type=int, nargs="+")
+    enqueue.add_argument("--lane", choices=list(LANES), default="bulk", help="优先级通道")
+    work = commands.add_parser("work", help="启动工作进程")
+    work.add_argument("queue_path")
+    work.add_argument("--processes", type=int, default=1, help="本机启动的工作进程数")
+    work.add_argument("--exit-when-empty", action="store_true", help="队列为空时退出")
+    status = commands.add_parser("status", help="查看队列状态")
+    status.add_argument("queue_path")
+    args = parser.parse_args()
+
+    if args.command == "enqueue":
+        print(SQLiteWorkQueue(args.queue_path).enqueue(args.pdf_path, args.total_hours, LANES[args.lane]))
+    elif args.command == "work":
+        SQLiteWorkQueue(args.queue_path)
+        processes = [multiprocessing.Process(target=_work, args=(args.queue_path, args.exit_when_empty))
+                     for _ in range(max(1, args.processes))]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+    elif args.command == "status":
+        print(json.dumps(SQLiteWorkQueue(args.queue_path).stats(), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+离线测试用的替身模型客户端
+按提示词返回固定的紧凑格式结果，接口与智谱SDK客户端的chat.completions.create相同，并记录每次调用的阶段
+"""
+import json
+import threading
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional
+from unittest import mock
+
+from my_agent.config import LLM_PROVIDER
+from my_agent.utils import providers
+
+OBJECTIVES = {"o": {"k": [["记忆", "记住名句", "能背诵"]], "a": [["模仿", "仿写", "能仿写"]],
+                    "e": [["感知", "感受美", "有共鸣"]]}}
+KNOWLEDGE = {"kp": {"b": [["名句记忆", "内容", 0, 1, [], ["知识：记忆"], "朗读"],
+                          ["意境理解", "内容", 1, 1, ["名句记忆"], ["知识：理解"], "讨论"]],
+                    "a": [["诗词创作", "内容", 2, 2, ["意境理解"], ["能力：仿写"], "创作"]],
+                    "k": ["意境理解"], "d": ["诗词创作"]}}
+
+
+def _activities(count: int) -> Dict[str, Any]:
+    return {"a": [{"t": f"活动{i}", "w": i + 1, "y": i % 5, "f": "重点", "m": "讲授",
+                   "p": [["导入", 5, ["提问"], ["课件"]], ["发展", 30, ["讨论"], ["课件"]], ["总结", 10, ["归纳"], ["课件"]]],
+                   "h": "亮点", "e": "效果", "q": "问题", "c": "第一章"} for i in range(count)]}
+
+
+def _item(name: str, weight: str) -> Dict[str, Any]:
+    return {"ty": "测验", "n": name, "ds": "说明", "ob": ["知识：记忆"], "kp": ["名句记忆"],
+            "cr": ["优", "良", "中", "差"], "w": weight, "tm": "课后", "tl": ["问卷"], "fb": "反馈"}
+
+
+ASSESSMENT = {"f": [_item("课堂问答", "0.2"), _item("作业", "0.3")], "s": [_item("期末考试", "0.5")], "w": ["0.5", "0.5"]}
+
+# 提示词中的标志语到阶段和结果的映射，按顺序匹配
+STAGES = [
+    ("一次性完成完整的教学大纲", "full_plan", {**OBJECTIVES, **KNOWLEDGE, **_activities(6), **ASSESSMENT}),
+    ("教学目标设计专家", "objectives", OBJECTIVES),
+    ("知识点分析专家", "knowledge", KNOWLEDGE),
+    ("设计教学活动", "activities", _activities(4)),
+    ("评估方案设计专家", "assessment", ASSESSMENT),
+]
+
+
+def classify(messages: List[Dict[str, str]]) -> str:
+    """按最后一条消息判断请求所属的阶段"""
+    text = messages[-1]["content"]
+    for marker, stage, _ in STAGES:
+        if marker in text:
+            return stage
+    raise ValueError(f"无法识别的提示词: {text[:50]}")
+
+
+class StubClient:
+    """替身模型客户端，fail_stages中的阶段抛出异常"""
+
+    def __init__(self, fail_stages: Optional[List[str]] = None):
+        self.fail_stages = set(fail_stages or [])
+        self.calls: List[str] = []
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model: str, messages: List[Dict[str, str]], **kwargs: Any) -> Any:
+        stage = classify(messages)
+        with self._lock:
+            self.calls.append(stage)
+        if stage in self.fail_stages:
+            raise RuntimeError(f"{stage}调用失败")
+        content = json.dumps(next(result for _, name, result in STAGES if name == stage), ensure_ascii=False)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(index=0, finish_reason="stop",
+                                     message=SimpleNamespace(role="assistant", content=content))],
+            usage=SimpleNamespace(prompt_tokens=100, completion_tokens=50, total_tokens=150)
+        )
+
+
+@contextmanager
+def use_client(client: StubClient) -> Iterator[StubClient]:
+    """在上下文中让配置的服务商使用替身客户端"""
+    with mock.patch.dict(providers._clients, {LLM_PROVIDER: client}):
+        yield client
+
+
+def textbook(pdf_path: str) -> Dict[str, Any]:
+    """替代PDF提取的固定教材内容"""
+    return {"title": "唐诗选读", "chapters": [{"page_number": 1, "content": "床前明月光，疑是地上霜。举头望明月，低头思故乡。"}]}
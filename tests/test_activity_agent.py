@@ -0,0 +1,52 @@
+"""
+按教学单元并发设计活动的测试：一个单元失败时立即结束，不等待其余单元的调用
+
+用法：python -m unittest discover tests
+"""
+import threading
+import time
+import unittest
+
+from my_agent.agents.activity_agent import design_activities
+from my_agent.utils.compact_schema import expand_knowledge
+from my_agent.utils.exceptions import LLMGenerationError
+from tests.stub_llm import KNOWLEDGE, StubClient, use_client
+
+SLOW_CALL_SECONDS = 3
+
+
+class FailFirstBlockClient(StubClient):
+    """第1单元立即失败，其余单元的调用一直等到测试结束"""
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def create(self, model, messages, **kwargs):
+        if "本单元是第1单元" in messages[-1]["content"]:
+            raise RuntimeError("第1单元调用失败")
+        self.release.wait(SLOW_CALL_SECONDS)
+        return super().create(model, messages, **kwargs)
+
+
+class DesignActivitiesTest(unittest.TestCase):
+
+    def test_first_failure_does_not_wait_for_other_blocks(self):
+        client = FailFirstBlockClient()
+        self.addCleanup(client.release.set)
+        start = time.monotonic()
+        with use_client(client):
+            with self.assertRaises(LLMGenerationError) as raised:
+                design_activities(expand_knowledge(KNOWLEDGE), 16, max_workers=2)
+        self.assertLess(time.monotonic() - start, SLOW_CALL_SECONDS / 2)
+        self.assertIn("第1单元", str(raised.exception))
+
+    def test_all_blocks_succeed(self):
+        with use_client(StubClient()) as client:
+            result = design_activities(expand_knowledge(KNOWLEDGE), 16)
+        self.assertEqual(client.calls.count("activities"), 4)  # 16课时分为4个单元
+        self.assertTrue(result["activities"])
+
+
+if __name__ == "__main__":
+    unittest.main()
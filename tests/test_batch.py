@@ -0,0 +1,93 @@
+"""
+批量生成的离线测试：结果导入与回放
+用替身模型客户端在本地完成每一批请求，不访问网络
+
+用法：python -m unittest discover tests
+"""
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from my_agent.agent import TeachingAgent
+from my_agent.batch import BatchRunner
+from my_agent.utils.batch import BatchSession, batch_scope, fulfill_batch, read_jsonl
+from tests.stub_llm import StubClient, textbook
+
+MAX_ROUNDS = 10
+
+
+class BatchRunnerTest(unittest.TestCase):
+
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._dir = tempfile.TemporaryDirectory()
+        os.chdir(self._dir.name)  # 生成的大纲写在工作目录下
+        self.pdf_path = os.path.join(self._dir.name, "唐诗选读.pdf")
+        with open(self.pdf_path, "wb") as f:
+            f.write(b"%PDF-1.4 test")
+        for target, value in (("extract_text_from_pdf", mock.Mock(side_effect=textbook)),
+                              ("is_valid_pdf", mock.Mock(return_value=True))):
+            patcher = mock.patch(f"my_agent.agent.{target}", value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.work_dir = os.path.join(self._dir.name, "work")
+        self.agent = TeachingAgent(save_metrics=False)
+
+    def tearDown(self):
+        os.chdir(self._cwd)
+        self._dir.cleanup()
+
+    def test_rounds_ingest_and_replay(self):
+        client = StubClient()
+        runner = BatchRunner(self.work_dir, agent=self.agent)
+        runner.add(self.pdf_path, [16, 32])
+
+        submitted = set()
+        for round_number in range(1, MAX_ROUNDS + 1):
+            requests_path = runner.step()
+            if requests_path is None:
+                break
+            request_ids = {line["custom_id"] for line in read_jsonl(requests_path)}
+            # 已导入结果的请求直接回放，不会再次提交
+            self.assertFalse(request_ids & submitted)
+            self.assertFalse(request_ids & set(runner.results))
+            submitted |= request_ids
+
+            results_path = os.path.join(self.work_dir, f"results_{round_number:03d}.jsonl")
+            self.assertEqual(fulfill_batch(requests_path, results_path, client=client), len(request_ids))
+            # 下一轮由新进程继续：导入结果后从工作目录恢复状态
+            runner = BatchRunner(self.work_dir, agent=self.agent)
+            self.assertEqual(runner.ingest(results_path), len(request_ids))
+        else:
+            self.fail(f"{MAX_ROUNDS}轮后仍未完成")
+
+        self.assertEqual(runner.status(), {"done": 1})
+        self.assertEqual(len(client.calls), len(submitted))
+
+        # 全部结果已导入时整门课程完全回放，不产生新的请求
+        reloaded = BatchRunner(self.work_dir, agent=self.agent)
+        self.assertEqual(set(reloaded.results), submitted)
+        session = BatchSession(reloaded.results)
+        with batch_scope(session):
+            state = self.agent.run(self.pdf_path, [16, 32])
+        self.assertEqual(session.pending, {})
+        self.assertIsNone(state.get("error"))
+        self.assertEqual(sorted(state["variant_activities"]), [16, 32])
+        self.assertEqual(len(client.calls), len(submitted))
+
+    def test_failed_request_fails_course(self):
+        runner = BatchRunner(self.work_dir, agent=self.agent)
+        runner.add(self.pdf_path, 16)
+        requests_path = runner.step()
+        results_path = os.path.join(self.work_dir, "results_001.jsonl")
+        fulfill_batch(requests_path, results_path, client=StubClient(fail_stages=["objectives"]))
+        self.assertTrue(all("error" in line for line in read_jsonl(results_path)))
+
+        runner.ingest(results_path)
+        self.assertIsNone(runner.step())
+        self.assertEqual(runner.status(), {"failed": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
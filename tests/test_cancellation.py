@@ -0,0 +1,127 @@
+"""
+运行取消时归还资源的测试：被放弃的调用立即归还并发名额和熔断试探名额，流式请求的连接被关闭
+
+用法：python -m unittest discover tests
+"""
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+
+from my_agent.utils.circuit_breaker import HALF_OPEN, CircuitBreaker
+from my_agent.utils.concurrency import AdaptiveLimiter
+from my_agent.utils.deadline import CancelToken, run_scope
+from my_agent.utils.exceptions import RunCancelledError
+from my_agent.utils.providers import _StreamingCompletions
+
+CANCEL_AFTER_SECONDS = 0.1
+
+
+class FakeResponse:
+    def __init__(self):
+        self.closed = threading.Event()
+
+    def close(self):
+        self.closed.set()
+
+
+class FakeStream:
+    """逐块返回内容的流式响应，关闭后停止"""
+
+    def __init__(self, text, delay=0.0):
+        self.text = text
+        self.delay = delay
+        self.response = FakeResponse()
+
+    def __iter__(self):
+        for char in self.text:
+            if self.response.closed.wait(self.delay):
+                raise ConnectionError("连接已关闭")
+            yield SimpleNamespace(model="stub", usage=None,
+                                  choices=[SimpleNamespace(delta=SimpleNamespace(content=char), finish_reason=None)])
+        yield SimpleNamespace(model="stub", usage=None,
+                              choices=[SimpleNamespace(delta=SimpleNamespace(content=None), finish_reason="stop")])
+        yield SimpleNamespace(model="stub", usage=SimpleNamespace(prompt_tokens=7, completion_tokens=3), choices=[])
+
+
+class FakeCompletions:
+    def __init__(self, stream):
+        self.stream = stream
+        self.kwargs = None
+
+    def create(self, **kwargs):
+        self.kwargs = kwargs
+        return self.stream
+
+
+class CancellationTest(unittest.TestCase):
+
+    def _abandon(self, func):
+        """在运行中执行func，稍后取消运行，返回调用方放弃等待的耗时"""
+        token = CancelToken()
+        threading.Timer(CANCEL_AFTER_SECONDS, token.cancel).start()
+        start = time.monotonic()
+        with run_scope(token), self.assertRaises(RunCancelledError):
+            token.run(func)
+        return time.monotonic() - start
+
+    def test_abandoned_call_returns_limiter_slot(self):
+        limiter = AdaptiveLimiter(initial=1, maximum=1)
+        finished = threading.Event()
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def call():
+            with limiter.slot("stage", "model"):
+                release.wait(5)
+            finished.set()
+
+        self._abandon(call)
+        self.assertEqual(limiter.stats()["in_flight"], 0)
+        with limiter.slot("stage", "model"):  # 名额已归还，不必等被放弃的调用结束
+            pass
+
+        release.set()
+        self.assertTrue(finished.wait(1))
+        self.assertEqual(limiter.stats()["in_flight"], 0)  # 被放弃的调用结束时不会重复归还
+
+    def test_abandoned_probe_returns_probe_slot(self):
+        breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=0.01, half_open_probes=1,
+                                 open_mode="fail")
+        with self.assertRaises(ConnectionError), breaker.guard():
+            raise ConnectionError("refused")
+        time.sleep(0.02)
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def probe():
+            with breaker.guard():
+                release.wait(5)
+
+        self._abandon(probe)
+        self.assertEqual(breaker.state, HALF_OPEN)
+        self.assertEqual(breaker.probes, 0)
+        with breaker.guard():  # 下一个请求可以继续试探
+            pass
+        self.assertEqual(breaker.probes, 0)
+
+    def test_streaming_request_is_closed_on_cancel(self):
+        stream = FakeStream("x" * 100, delay=0.05)
+        completions = _StreamingCompletions(FakeCompletions(stream))
+        elapsed = self._abandon(lambda: completions.create(model="stub", messages=[]))
+        self.assertLess(elapsed, 1)
+        self.assertTrue(stream.response.closed.is_set())
+
+    def test_streaming_response_is_assembled(self):
+        fake = FakeCompletions(FakeStream("教学大纲"))
+        response = _StreamingCompletions(fake).create(model="stub", messages=[], temperature=0.3)
+        self.assertTrue(fake.kwargs["stream"])
+        self.assertEqual(fake.kwargs["extra_body"], {"stream_options": {"include_usage": True}})
+        self.assertEqual(response.choices[0].message.content, "教学大纲")
+        self.assertEqual(response.choices[0].finish_reason, "stop")
+        self.assertEqual(response.usage.prompt_tokens, 7)
+        self.assertTrue(fake.stream.response.closed.is_set())
+
+
+if __name__ == "__main__":
+    unittest.main()
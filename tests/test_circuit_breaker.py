@@ -0,0 +1,54 @@
+"""
+熔断器的状态转换测试
+
+用法：python -m unittest discover tests
+"""
+import time
+import unittest
+
+from my_agent.utils.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, is_outage
+
+
+class ReadTimeout(Exception):
+    """与httpx超时异常同名的替身"""
+
+
+class CircuitBreakerTest(unittest.TestCase):
+
+    def _fail(self, breaker: CircuitBreaker, error: BaseException) -> None:
+        with self.assertRaises(type(error)):
+            with breaker.guard():
+                raise error
+
+    def _open(self) -> CircuitBreaker:
+        breaker = CircuitBreaker("test", failure_threshold=2, reset_seconds=0.05, half_open_probes=1, open_mode="fail")
+        for _ in range(2):
+            self._fail(breaker, ConnectionError("refused"))
+        self.assertEqual(breaker.state, OPEN)
+        time.sleep(0.06)
+        return breaker
+
+    def test_timeouts_are_outages(self):
+        self.assertTrue(is_outage(ReadTimeout("read timed out")))
+        self.assertTrue(is_outage(TimeoutError()))
+        self.assertFalse(is_outage(ValueError("bad request")))
+
+    def test_failed_probe_does_not_close(self):
+        breaker = self._open()
+        self._fail(breaker, ValueError("bad request"))
+        self.assertEqual(breaker.state, HALF_OPEN)
+        self.assertEqual(breaker.probes, 0)
+
+        self._fail(breaker, ReadTimeout("read timed out"))
+        self.assertEqual(breaker.state, OPEN)
+
+    def test_successful_probe_closes(self):
+        breaker = self._open()
+        with breaker.guard():
+            pass
+        self.assertEqual(breaker.state, CLOSED)
+        self.assertEqual(breaker.failures, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
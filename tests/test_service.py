@@ -0,0 +1,158 @@
+"""
+任务服务的离线测试：重复提交去重、优先级通道、课时校验、失败任务重新排队、重启后继续
+用替身模型客户端和临时目录中的任务库，不访问网络
+
+用法：python -m unittest discover tests
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+import urllib.error
+import urllib.request
+from unittest import mock
+from urllib.parse import quote
+
+from my_agent.service import JobService, create_server
+from my_agent.work_queue import BULK, DONE, FAILED, INTERACTIVE, PENDING, RUNNING
+from tests.stub_llm import StubClient, textbook, use_client
+
+PDF = b"%PDF-1.4 test"
+WAIT_SECONDS = 30
+
+
+class JobServiceTest(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        # 清理按注册的逆序执行，临时目录在工作线程停止后才删除
+        self.addCleanup(self._dir.cleanup)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(self._dir.name)  # 生成的大纲写在工作目录下
+        self.store_dir = os.path.join(self._dir.name, "service")
+        self.release = threading.Event()  # 批量任务提取教材时等待，直到测试放行
+        self.addCleanup(self.release.set)
+        extract = mock.patch("my_agent.work_queue.extract_text_from_pdf", side_effect=self._extract)
+        extract.start()
+        self.addCleanup(extract.stop)
+        client = use_client(StubClient())
+        self.client = client.__enter__()
+        self.addCleanup(client.__exit__, None, None, None)
+
+    def _extract(self, pdf_path):
+        if "批量" in os.path.basename(pdf_path):
+            self.release.wait(WAIT_SECONDS)
+        return textbook(pdf_path)
+
+    def _service(self, workers=0, interactive_workers=0, start=False) -> JobService:
+        service = JobService(self.store_dir, workers=workers, interactive_workers=interactive_workers)
+        if start:
+            service.start()
+
+            def stop():
+                self.release.set()
+                service.stop()
+                for thread in service._threads:
+                    thread.join(WAIT_SECONDS)
+            self.addCleanup(stop)
+        return service
+
+    def _server(self, service: JobService) -> str:
+        server = create_server("127.0.0.1", 0, service)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    def _post(self, url: str, data: bytes = PDF):
+        request = urllib.request.Request(url, data=data, method="POST")
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    def _wait(self, service: JobService, job_id: str, status: str) -> None:
+        deadline = time.monotonic() + WAIT_SECONDS
+        while service.queue.status(job_id)["status"] != status:
+            if time.monotonic() > deadline:
+                self.fail(f"任务{job_id}未进入{status}状态: {service.queue.status(job_id)}")
+            time.sleep(0.02)
+
+    def test_duplicate_submission_returns_same_job(self):
+        base = self._server(self._service())
+        status, first = self._post(f"{base}/jobs?hours=32,16&name={quote('唐诗选读.pdf')}")
+        self.assertEqual(status, 202)
+        self.assertFalse(first["duplicate"])
+
+        # 课时顺序和重复不影响任务ID
+        status, second = self._post(f"{base}/jobs?hours=16,32,16")
+        self.assertEqual(status, 200)
+        self.assertTrue(second["duplicate"])
+        self.assertEqual(second["job_id"], first["job_id"])
+        self.assertEqual(second["total_hours"], [16, 32])
+
+    def test_invalid_hours_are_rejected(self):
+        service = self._service()
+        base = self._server(service)
+        for hours in ("10", "16,30", "0", ""):
+            status, body = self._post(f"{base}/jobs?hours={hours}")
+            self.assertEqual(status, 400, hours)
+            self.assertIn("总课时无效", body["error"])
+        status, _ = self._post(f"{base}/jobs?hours=16", data=b"not a pdf")
+        self.assertEqual(status, 400)
+        self.assertEqual(service.queue.stats()[PENDING], 0)
+
+    def test_bulk_backlog_does_not_block_interactive(self):
+        service = self._service(workers=1, interactive_workers=1, start=True)
+        backlog = [service.submit(PDF + str(i).encode(), [16], "bulk", f"批量{i}.pdf")[0]["job_id"]
+                   for i in range(3)]
+        self._wait(service, backlog[0], RUNNING)  # 通用工作线程被批量任务占用
+
+        job, _ = service.submit(PDF, [16], "interactive", "唐诗选读.pdf")
+        self._wait(service, job["job_id"], DONE)
+        stats = service.queue.stats()
+        self.assertEqual((stats[RUNNING], stats[PENDING]), (1, 2))  # 批量任务仍在积压
+
+        self.release.set()
+        for job_id in backlog:
+            self._wait(service, job_id, DONE)
+
+    def test_resubmit_upgrades_priority(self):
+        service = self._service()
+        job, _ = service.submit(PDF, [16], "bulk")
+        self.assertEqual(job["priority"], BULK)
+        job, duplicate = service.submit(PDF, [16], "interactive")
+        self.assertTrue(duplicate)
+        self.assertEqual(job["priority"], INTERACTIVE)
+
+    def test_failed_job_is_requeued(self):
+        service = self._service()
+        job_id = service.submit(PDF, [16])[0]["job_id"]
+        for _ in range(service.queue.max_attempts):
+            self.assertEqual(service.queue.claim("worker").job_id, job_id)
+            service.queue.fail(job_id, "worker", "调用失败")
+        self.assertEqual(service.queue.status(job_id)["status"], FAILED)
+
+        job, duplicate = service.submit(PDF, [16])
+        self.assertFalse(duplicate)  # 失败的任务不算重复，重新排队
+        self.assertEqual((job["job_id"], job["status"], job["attempts"]), (job_id, PENDING, 0))
+
+    def test_restarted_service_finishes_queued_job(self):
+        job_id = self._service().submit(PDF, [16], name="唐诗选读.pdf")[0]["job_id"]
+
+        # 重启：新的服务实例使用同一任务库，启动后处理重启前提交的任务
+        service = self._service(workers=1, start=True)
+        base = self._server(service)
+        self._wait(service, job_id, DONE)
+        with urllib.request.urlopen(f"{base}/jobs/{job_id}/result") as response:
+            body = json.loads(response.read())
+        self.assertEqual(body["job_id"], job_id)
+        self.assertTrue(body["result"]["objectives"])
+        self.assertEqual(self.client.calls.count("objectives"), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
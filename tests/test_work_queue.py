@@ -0,0 +1,213 @@
+"""
+工作队列的离线测试：租约过期回收、检查点续跑、多个工作进程并发领取
+用替身模型客户端和临时目录中的SQLite队列，不访问网络
+
+用法：python -m unittest discover tests
+"""
+import multiprocessing
+import os
+import queue
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from my_agent.work_queue import DONE, EXTRACT_STAGE, PENDING, RUNNING, QueueWorker, SQLiteWorkQueue, _work
+from tests.stub_llm import StubClient, textbook, use_client
+
+PROCESS_TIMEOUT = 60
+CRASH_LEASE_SECONDS = 1
+
+
+class SlowClient(StubClient):
+    """每次调用稍作等待，让多个工作进程的任务交错执行"""
+
+    def create(self, model, messages, **kwargs):
+        time.sleep(0.05)
+        return super().create(model, messages, **kwargs)
+
+
+class HangingClient(StubClient):
+    """设计活动时通知测试进程，然后一直等待，模拟处理中途崩溃的工作进程"""
+
+    def __init__(self, events):
+        super().__init__()
+        self.events = events
+
+    def create(self, model, messages, **kwargs):
+        if "设计教学活动" in messages[-1]["content"]:
+            self.events.put(("hang", os.getpid()))
+            time.sleep(PROCESS_TIMEOUT)
+        return super().create(model, messages, **kwargs)
+
+
+def _record(events, name):
+    """包装队列方法，把成功的领取和完成发送给测试进程"""
+    method = getattr(SQLiteWorkQueue, name)
+
+    def wrapper(self, *args, **kwargs):
+        result = method(self, *args, **kwargs)
+        if name == "claim" and result is not None:
+            events.put((name, result.job_id, args[0]))
+        elif name == "complete" and result:
+            events.put((name, args[0], args[1]))
+        return result
+    return wrapper
+
+
+def _run_worker(path, events):
+    """工作进程入口：使用替身客户端运行_work，记录领取和完成的任务"""
+    with mock.patch("my_agent.work_queue.extract_text_from_pdf", side_effect=textbook), \
+            mock.patch.object(SQLiteWorkQueue, "claim", _record(events, "claim")), \
+            mock.patch.object(SQLiteWorkQueue, "complete", _record(events, "complete")), \
+            use_client(SlowClient()):
+        _work(path, True)
+
+
+def _run_hanging_worker(path, events):
+    """工作进程入口：领取任务后在设计活动时挂起，等待测试进程结束它"""
+    with mock.patch("my_agent.work_queue.extract_text_from_pdf", side_effect=textbook), \
+            use_client(HangingClient(events)):
+        QueueWorker(SQLiteWorkQueue(path), worker_id="crashed", agent_options={"save_metrics": False},
+                    lease_seconds=CRASH_LEASE_SECONDS, heartbeat_seconds=0.2).run(exit_when_empty=True)
+
+
+class WorkQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._dir = tempfile.TemporaryDirectory()
+        os.chdir(self._dir.name)  # 生成的大纲写在工作目录下
+        self.pdf_path = os.path.join(self._dir.name, "唐诗选读.pdf")
+        with open(self.pdf_path, "wb") as f:
+            f.write(b"%PDF-1.4 test")
+        self.queue = SQLiteWorkQueue(os.path.join(self._dir.name, "queue.db"), max_attempts=3)
+        extract = mock.patch("my_agent.work_queue.extract_text_from_pdf", side_effect=textbook)
+        self.extract = extract.start()
+        self.addCleanup(extract.stop)
+
+    def tearDown(self):
+        os.chdir(self._cwd)
+        self._dir.cleanup()
+
+    def _worker(self, worker_id: str) -> QueueWorker:
+        return QueueWorker(self.queue, worker_id=worker_id, agent_options={"save_metrics": False},
+                           lease_seconds=5, heartbeat_seconds=1)
+
+    def test_expired_lease_is_reclaimed(self):
+        job_id = self.queue.enqueue(self.pdf_path, [16])
+        first = self.queue.claim("crashed", lease_seconds=0.05)
+        self.assertEqual(first.job_id, job_id)
+        self.assertTrue(self.queue.save_stage(job_id, "crashed", EXTRACT_STAGE, textbook(self.pdf_path)))
+        self.assertIsNone(self.queue.claim("other"))  # 租约有效期内不能被领取
+
+        time.sleep(0.1)
+        second = self.queue.claim("other")
+        self.assertEqual(second.job_id, job_id)
+        self.assertEqual(second.attempts, 2)
+        self.assertIn(EXTRACT_STAGE, second.checkpoint)
+
+        # 原工作进程的租约已被接管，续租和提交结果都被拒绝
+        self.assertFalse(self.queue.heartbeat(job_id, "crashed"))
+        self.assertFalse(self.queue.complete(job_id, "crashed", {}))
+        self.assertTrue(self.queue.heartbeat(job_id, "other"))
+        self.assertEqual(self.queue.stats()["reclaims"], 1)
+
+    def test_resume_skips_finished_stages(self):
+        job_id = self.queue.enqueue(self.pdf_path, [16, 32])
+
+        # 第一次在设计活动时失败，此前的阶段已作为检查点保存
+        with use_client(StubClient(fail_stages=["activities"])) as client:
+            self.assertFalse(self._worker("first").process(self.queue.claim("first")))
+        self.assertIn("objectives", client.calls)
+        status = self.queue.status(job_id)
+        self.assertEqual(status["status"], PENDING)
+        for stage in (EXTRACT_STAGE, "generate_objectives", "analyze_knowledge"):
+            self.assertIn(stage, status["stages"])
+        # 未做预摘要时process_textbook不输出教材内容，不能用空值覆盖检查点
+        self.assertNotIn("process_textbook", status["stages"])
+
+        # 重新领取后从检查点继续：不再提取教材，也不再生成目标和分析知识点
+        self.extract.reset_mock()
+        with use_client(StubClient()) as client:
+            item = self.queue.claim("second")
+            self.assertEqual(item.attempts, 2)
+            self.assertTrue(self._worker("second").process(item))
+        self.extract.assert_not_called()
+        self.assertNotIn("objectives", client.calls)
+        self.assertNotIn("knowledge", client.calls)
+        self.assertIn("activities", client.calls)
+
+        self.assertEqual(self.queue.status(job_id)["status"], DONE)
+        result = self.queue.result(job_id)
+        self.assertTrue(result["objectives"])
+        self.assertEqual(sorted(result["variant_activities"]), ["16", "32"])
+
+    def _events(self, events, count):
+        """收集工作进程发送的事件"""
+        received = []
+        for _ in range(count):
+            try:
+                received.append(events.get(timeout=PROCESS_TIMEOUT))
+            except queue.Empty:
+                self.fail(f"等待工作进程超时，已收到: {received}")
+        return received
+
+    def test_processes_complete_each_job_once(self):
+        job_ids = set()
+        for i in range(6):
+            pdf_path = os.path.join(self._dir.name, f"教材{i}.pdf")
+            with open(pdf_path, "wb") as f:
+                f.write(f"%PDF-1.4 {i}".encode())
+            job_ids.add(self.queue.enqueue(pdf_path, [16]))
+
+        events = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=_run_worker, args=(self.queue.path, events)) for _ in range(3)]
+        for process in processes:
+            process.start()
+        received = self._events(events, 2 * len(job_ids))
+        for process in processes:
+            process.join(PROCESS_TIMEOUT)
+            self.assertEqual(process.exitcode, 0)
+
+        claims = [(job_id, worker) for kind, job_id, worker in received if kind == "claim"]
+        completes = [(job_id, worker) for kind, job_id, worker in received if kind == "complete"]
+        # 每个任务只被领取一次，并由领取它的工作进程完成
+        self.assertEqual(sorted(job_id for job_id, _ in claims), sorted(job_ids))
+        self.assertEqual(sorted(completes), sorted(claims))
+        stats = self.queue.stats()
+        self.assertEqual((stats[DONE], stats["reclaims"]), (len(job_ids), 0))
+        for job_id in job_ids:
+            self.assertEqual(self.queue.status(job_id)["attempts"], 1)
+
+    def test_killed_process_job_is_reclaimed(self):
+        job_id = self.queue.enqueue(self.pdf_path, [16])
+        events = multiprocessing.Queue()
+        process = multiprocessing.Process(target=_run_hanging_worker, args=(self.queue.path, events))
+        process.start()
+        self._events(events, 1)  # 工作进程已保存检查点，正在设计活动
+        process.kill()
+        process.join(PROCESS_TIMEOUT)
+
+        status = self.queue.status(job_id)
+        self.assertEqual(status["status"], RUNNING)
+        self.assertIn("analyze_knowledge", status["stages"])
+        self.assertIsNone(self.queue.claim("other"))  # 租约到期前不能被领取
+
+        time.sleep(CRASH_LEASE_SECONDS + 0.1)
+        with use_client(StubClient()) as client:
+            item = self.queue.claim("other")
+            self.assertEqual((item.job_id, item.attempts), (job_id, 2))
+            self.assertTrue(self._worker("other").process(item))
+        self.assertNotIn("objectives", client.calls)  # 从被终止进程保存的检查点继续
+        self.assertEqual(self.queue.status(job_id)["status"], DONE)
+        self.assertEqual(self.queue.stats()["reclaims"], 1)
+
+    def test_duplicate_hours_map_to_one_job(self):
+        first = self.queue.enqueue(self.pdf_path, [32, 16])
+        self.assertEqual(self.queue.enqueue(self.pdf_path, [16, 32, 16]), first)
+        self.assertEqual(self.queue.stats()[PENDING], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()